@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy
+import pandas
+
+WORD_BITS = 64
+
+
+def word_columns(words: int) -> list[str]:
+    """
+    :param words: 64-bit words of a bitmask
+    :return: columns cast(compact=True) holds them in: amenities, then amenities_1, amenities_2, ...
+    """
+    return ['amenities'] + [f'amenities_{i}' for i in range(1, words)]
+
+
+class AmenityIndex:
+    """
+    Amenities of each listing as a bitset over the amenities vocabulary, for filtering and as a multi-hot feature
+    matrix.
+
+    Bit i of a row is set when the listing has vocabulary[i]; rows are split into 64-bit words, so the vocabulary can
+    grow past 64 amenities. Listings whose amenities were rejected by clean() match no query.
+    """
+
+    def __init__(self, bits: numpy.ndarray, present: numpy.ndarray, vocabulary: list[str]):
+        """
+        :param bits: uint64 array of shape (rows, words)
+        :param present: rows that have amenities
+        :param vocabulary: amenity of each bit
+        """
+        self.bits = bits
+        self.present = present
+        self.vocabulary = vocabulary
+        self._positions = {amenity: i for i, amenity in enumerate(vocabulary)}
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    @property
+    def words(self) -> int:
+        return self.bits.shape[1]
+
+    @classmethod
+    def from_lists(cls, amenities: pandas.Series) -> AmenityIndex:
+        """
+        :param amenities: amenities column from clean(), a list per row or None
+        :return: index over the sorted vocabulary of the column
+        """
+        present = amenities.notna().to_numpy()
+        lists = amenities.to_numpy(dtype=object)[present]
+        lengths = numpy.fromiter((len(x) for x in lists), dtype='int64', count=len(lists))
+        codes, vocabulary = pandas.factorize(pandas.Series([a for x in lists for a in x], dtype=object), sort=True)
+
+        bits = numpy.zeros((len(amenities), max(-(-len(vocabulary) // WORD_BITS), 1)), dtype='uint64')
+        rows = numpy.repeat(numpy.flatnonzero(present), lengths)
+        shifts = (codes % WORD_BITS).astype('uint64')
+        numpy.bitwise_or.at(bits, (rows, codes // WORD_BITS), numpy.left_shift(numpy.uint64(1), shifts))
+        return cls(bits, present, list(vocabulary))
+
+    @classmethod
+    def from_bitmask(cls, bitmask: pandas.Series | pandas.DataFrame, vocabulary: list[str]) -> AmenityIndex:
+        """
+        :param bitmask: amenities column from cast(compact=True), or its word_columns() where the vocabulary takes
+        more than one word
+        :param vocabulary: its vocabulary, df.attrs['amenities']
+        :return: index over the same vocabulary
+        """
+        bitmask = bitmask.to_frame() if isinstance(bitmask, pandas.Series) else bitmask
+        present = bitmask.iloc[:, 0].notna().to_numpy()
+        bits = bitmask.to_numpy(dtype='uint64', na_value=0).reshape(len(bitmask), -1)
+        return cls(bits, present, list(vocabulary))
+
+    def _words(self, amenities: Iterable[str]) -> numpy.ndarray | None:
+        # query bitset; None when an amenity is not in the vocabulary
+        words = numpy.zeros(self.words, dtype='uint64')
+        for amenity in amenities:
+            if amenity not in self._positions:
+                return None
+            position = self._positions[amenity]
+            words[position // WORD_BITS] |= numpy.uint64(1) << numpy.uint64(position % WORD_BITS)
+        return words
+
+    def mask(self, all_of: Iterable[str] = (), any_of: Iterable[str] = (),
+             none_of: Iterable[str] = ()) -> numpy.ndarray:
+        """
+        Filters listings by amenities, e.g. mask(all_of=['parking', 'pool'], none_of=['wood floors'])
+        :param all_of: amenities a listing must all have (AND); one outside the vocabulary matches nothing
+        :param any_of: amenities a listing must have at least one of (OR), if any are given
+        :param none_of: amenities a listing must not have (NOT)
+        :return: boolean mask of the matching rows
+        """
+        matches = self.present.copy()
+        all_of, any_of, none_of = list(all_of), list(any_of), list(none_of)
+
+        required = self._words(all_of)
+        if required is None:
+            return numpy.zeros(len(self), dtype=bool)
+        if required.any():
+            matches &= ((self.bits & required) == required).all(axis=1)
+
+        if any_of:
+            wanted = self._words(amenity for amenity in any_of if amenity in self._positions)
+            matches &= ((self.bits & wanted) != 0).any(axis=1)
+
+        excluded = self._words(amenity for amenity in none_of if amenity in self._positions)
+        if excluded.any():
+            matches &= ((self.bits & excluded) == 0).all(axis=1)
+
+        return matches
+
+    def filter(self, df: pandas.DataFrame, **query) -> pandas.DataFrame:
+        """
+        :param df: dataframe the index was built from
+        :param query: all_of, any_of and none_of as for mask()
+        :return: the matching rows of df
+        """
+        return df[self.mask(**query)]
+
+    def multi_hot(self, sparse: bool = True):
+        """
+        :param sparse: return a scipy CSR matrix instead of a dense array
+        :return: uint8 matrix with a row per listing and a column per amenity of the vocabulary
+        """
+        # little-endian bytes of each word hold bits 0-7, 8-15, ... so unpacking them little-endian keeps bit order
+        unpacked = numpy.unpackbits(self.bits.astype('<u8').view('uint8'), axis=1, bitorder='little')
+        dense = numpy.ascontiguousarray(unpacked[:, :len(self.vocabulary)])
+        if not sparse:
+            return dense
+
+        from scipy import sparse as scipy_sparse
+        return scipy_sparse.csr_matrix(dense)
+
+    def frequencies(self) -> pandas.Series:
+        """
+        :return: listings per amenity, most common first
+        """
+        counts = self.multi_hot(sparse=False).sum(axis=0, dtype='int64')
+        return pandas.Series(counts, index=self.vocabulary, name='listings').sort_values(ascending=False)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import random
+import tempfile
+from pathlib import Path
+
+import httpx
+import pandas
+from ucimlrepo import dotdict
+
+from source.dataset_cache import DatasetCache, DatasetCacheMiss, _dataset
+
+# Dataset metadata endpoint of the UCI repository, which ucimlrepo.fetch_ucirepo() asks too
+API_BASE_URL = 'https://archive.ics.uci.edu/api/dataset'
+
+# Responses worth asking again for: rate limiting and server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DatasetNotFoundError(LookupError):
+    """Raised when the repository has no dataset of an id, or no data file for it."""
+
+
+async def _retry(attempt, retries: int, backoff: float, what: str):
+    """
+    Awaits attempt() until it succeeds, sleeping backoff * 2**n (with jitter) between tries
+    :param attempt: coroutine function making one try
+    :param retries: tries after the first one
+    :param backoff: seconds before the first retry
+    :param what: what is fetched, for the error message
+    :return: what attempt() returns
+    """
+    for n in range(retries + 1):
+        try:
+            return await attempt()
+        except httpx.TransportError as error:
+            failure = f'{type(error).__name__}: {error}'
+        except httpx.HTTPStatusError as error:
+            if error.response.status_code not in RETRY_STATUSES:
+                raise ConnectionError(f'error fetching {what}: HTTP {error.response.status_code}') from error
+            failure = f'HTTP {error.response.status_code}'
+        if n < retries:
+            await asyncio.sleep(backoff * 2 ** n * random.uniform(0.5, 1.5))
+    raise ConnectionError(f'error fetching {what} after {retries + 1} tries: {failure}')
+
+
+async def _metadata(client: httpx.AsyncClient, limit: asyncio.Semaphore, api_url: str, repo_id: int, retries: int,
+                    backoff: float) -> dict:
+    async def attempt():
+        async with limit:
+            response = await client.get(api_url, params={'id': repo_id})
+        response.raise_for_status()
+        return response.json()
+
+    data = await _retry(attempt, retries, backoff, f'metadata of dataset {repo_id}')
+    # the API reports a missing dataset in the body, with HTTP 200
+    if data['status'] != 200:
+        raise DatasetNotFoundError(data.get('message', 'Dataset not found in repository'))
+    return data['data']
+
+
+async def _download(client: httpx.AsyncClient, limit: asyncio.Semaphore, url: str, path: Path, retries: int,
+                    backoff: float) -> None:
+    # streams the body to a partial file, renamed once complete; a retry starts the file over
+    partial = path.with_name(f'{path.name}.{os.getpid()}.partial')
+
+    async def attempt():
+        async with limit, client.stream('GET', url) as response:
+            response.raise_for_status()
+            with open(partial, 'wb') as file:
+                async for block in response.aiter_bytes(1 << 20):
+                    file.write(block)
+
+    try:
+        await _retry(attempt, retries, backoff, url)
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def _read(path: Path, metadata: dict, repo_id: int) -> dotdict:
+    # the dataset fetch_ucirepo would have built from the same download
+    df = pandas.read_csv(path)
+    if df.empty:
+        raise DatasetNotFoundError(f'Error reading data csv file for "{metadata["name"]}" dataset (id={repo_id}).')
+    metadata = dict(metadata)
+    variables = pandas.DataFrame.from_records(metadata.pop('variables'))
+    return _dataset(df, metadata, variables)
+
+
+async def _fetch_one(client: httpx.AsyncClient, limit: asyncio.Semaphore, api_url: str, repo_id: int,
+                     directory: Path, retries: int, backoff: float) -> dotdict:
+    metadata = await _metadata(client, limit, api_url, repo_id, retries, backoff)
+    if not metadata.get('data_url'):
+        raise DatasetNotFoundError(f'"{metadata["name"]}" dataset (id={repo_id}) exists in the repository, '
+                                   f'but is not available for import.')
+    path = directory / f'{repo_id}.csv'
+    await _download(client, limit, metadata['data_url'], path, retries, backoff)
+    # parse in a thread, so the other downloads go on meanwhile
+    return await asyncio.to_thread(_read, path, metadata, repo_id)
+
+
+async def fetch_datasets(repo_ids, cache: DatasetCache | bool = True, concurrency: int = 4, retries: int = 3,
+                         backoff: float = 0.5, client: httpx.AsyncClient | None = None, api_url: str = API_BASE_URL,
+                         download_directory=None, timeout: float = 30.0) -> dict[int, dotdict]:
+    """
+    Loads several datasets from the UCI ML Repository at once: metadata and data files are fetched concurrently
+    over one pooled HTTP client, and each data file is streamed to disk rather than held in memory
+    :param repo_ids: Dataset IDs for UCI ML Repository
+    :param cache: DatasetCache to load the datasets from and store them in, True for the default DatasetCache(), or
+    False to always fetch
+    :param concurrency: most requests in flight at once
+    :param retries: tries after the first for a request that fails to connect, times out or gets a 429 or 5xx
+    :param backoff: seconds before the first retry, doubling with each one
+    :param client: HTTP client to use and leave open, e.g. one pointed at a local stand-in server; a new one by default
+    :param api_url: dataset metadata endpoint
+    :param download_directory: where to keep the downloaded CSV files; a temporary directory by default
+    :param timeout: seconds to wait for a connection or for each block of a response
+    :return: datasets as returned by fetch_ucirepo, by repo id in the order given
+    """
+    repo_ids = list(dict.fromkeys(repo_ids))
+    if cache is True:
+        cache = DatasetCache()
+
+    datasets = {}
+    if cache:
+        for repo_id in repo_ids:
+            if cache.offline or cache.is_fresh(repo_id):
+                datasets[repo_id] = await asyncio.to_thread(cache.load, repo_id)
+            if cache.offline and datasets[repo_id] is None:
+                raise DatasetCacheMiss(f'dataset {repo_id} is not in the cache at {cache.directory} (offline mode)')
+    missing = [repo_id for repo_id in repo_ids if datasets.get(repo_id) is None]
+
+    if missing:
+        limit = asyncio.Semaphore(concurrency)
+        # a temporary directory only when no download_directory is given
+        keep = download_directory is not None
+        with contextlib.nullcontext(download_directory) if keep else tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            directory.mkdir(parents=True, exist_ok=True)
+            own_client = client is None
+            if own_client:
+                client = httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency), timeout=timeout,
+                                           follow_redirects=True)
+            try:
+                tasks = [asyncio.create_task(_fetch_one(client, limit, api_url, repo_id, directory, retries, backoff))
+                         for repo_id in missing]
+                try:
+                    fetched = await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+            finally:
+                if own_client:
+                    await client.aclose()
+
+        for repo_id, dataset in zip(missing, fetched):
+            if cache:
+                await asyncio.to_thread(cache.store, repo_id, dataset)
+                dataset = await asyncio.to_thread(cache.load, repo_id, False)
+            datasets[repo_id] = dataset
+
+    return {repo_id: datasets[repo_id] for repo_id in repo_ids}
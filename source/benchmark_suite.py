@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas
+
+from source import wrangling_utils
+from source.synthetic import make_listings
+
+DEFAULT_HISTORY = Path('data') / 'benchmark_history.jsonl'
+
+# Most milliseconds importing each module may take in a fresh interpreter, by `python -X importtime`. The cleaning
+# modules are bound by pandas and numpy, about 160 ms of their import on their own; the rest load them on first use.
+IMPORT_BUDGETS_MS = {
+    'source.api': 25,
+    'source.cli': 25,
+    'source.wrangling_utils': 250,
+    'source.streaming': 300,
+}
+
+
+def _best_time(func, repeat: int) -> float:
+    # normalizer caches and canonical cities persist across calls; start every run cold so results don't depend on
+    # what ran before
+    best = float('inf')
+    for _ in range(repeat):
+        for cache in wrangling_utils.NORMALIZER_CACHES.values():
+            cache.clear()
+        wrangling_utils.CITY_LOOKUP.canonical.clear()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=(10_000, 100_000), repeat: int = 3, seed: int = 0, dirty: float = 0.1, row_wise: bool = True,
+              cleaners: bool = True) -> pandas.DataFrame:
+    """
+    Times clean(), cast() and every clean_* function on synthetic listings; needs no network
+    :param sizes: rows of each synthetic frame, e.g. (10_000, 1_000_000, 10_000_000)
+    :param repeat: runs per benchmark, the fastest is kept
+    :param seed: seed of make_listings()
+    :param dirty: share of dirty values, as for make_listings()
+    :param row_wise: also time the row-wise engine, which is slow on large frames
+    :param cleaners: also time each column's cleaners on their own
+    :return: seconds and rows per second of each benchmark and size
+    """
+    results = []
+
+    def record(benchmark: str, rows: int, func) -> None:
+        seconds = _best_time(func, repeat)
+        results.append({'benchmark': benchmark, 'rows': rows, 'seconds': seconds, 'rows_per_second': rows / seconds})
+
+    for rows in sizes:
+        uci_df = make_listings(rows, seed=seed, dirty=dirty)
+        if row_wise:
+            record('clean', rows, lambda: wrangling_utils.clean(uci_df))
+        record('clean_vectorized', rows, lambda: wrangling_utils.clean(uci_df, vectorized=True))
+        clean_uci_df, _ = wrangling_utils.clean(uci_df, vectorized=True)
+        record('cast', rows, lambda: wrangling_utils.cast(clean_uci_df))
+        record('cast_compact', rows, lambda: wrangling_utils.cast(clean_uci_df, compact=True))
+
+        if not cleaners:
+            continue
+        for col, row_cleaner in wrangling_utils.ROW_CLEANERS.items():
+            if row_cleaner is None:
+                continue
+            values = uci_df[col]
+            if row_wise:
+                record(row_cleaner.__name__, rows, lambda: values.apply(row_cleaner))
+            column_cleaner = wrangling_utils.COLUMN_CLEANERS[col]
+            record(column_cleaner.__name__, rows, lambda: column_cleaner(values))
+
+    return pandas.DataFrame(results)
+
+
+def _import_us(module: str) -> int:
+    # cumulative microseconds of the module's own line in the -X importtime report of a fresh interpreter
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [str(Path(__file__).resolve().parent.parent),
+                                                                      os.environ.get('PYTHONPATH')]))}
+    report = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True,
+                            text=True, check=True, env=env).stderr
+    for line in report.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise ValueError(f'{module} is not in the import time report')
+
+
+def import_times(budgets=None, repeat: int = 5) -> pandas.DataFrame:
+    """
+    Times importing each module with `python -X importtime`, in a fresh interpreter every run
+    :param budgets: most milliseconds per module; IMPORT_BUDGETS_MS by default
+    :param repeat: runs per module, the fastest is kept
+    :return: milliseconds, budget and whether it is exceeded, per module
+    """
+    budgets = IMPORT_BUDGETS_MS if budgets is None else budgets
+    results = []
+    for module, budget in budgets.items():
+        milliseconds = min(_import_us(module) for _ in range(repeat)) / 1000
+        results.append({'module': module, 'milliseconds': milliseconds, 'budget_ms': budget,
+                        'over_budget': milliseconds > budget})
+    return pandas.DataFrame(results)
+
+
+def load_history(path=DEFAULT_HISTORY) -> pandas.DataFrame:
+    """
+    :param path: JSON lines file written by append_history()
+    :return: every recorded result, oldest first; empty if there is no history yet
+    """
+    if not Path(path).exists():
+        return pandas.DataFrame(columns=['run_at', 'commit', 'host', 'python', 'benchmark', 'rows', 'seconds',
+                                         'rows_per_second'])
+    return pandas.read_json(path, lines=True, dtype={'commit': str})
+
+
+def append_history(results: pandas.DataFrame, path=DEFAULT_HISTORY) -> None:
+    """
+    Appends the results of a run to the history, tagged with the time, git commit, host and Python version
+    :param results: from run_suite()
+    :param path: JSON lines file
+    """
+    run = {
+        'run_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as file:
+        for record in results.to_dict(orient='records'):
+            file.write(json.dumps({**run, **record}) + '\n')
+
+
+def compare(results: pandas.DataFrame, history: pandas.DataFrame, threshold: float = 0.25,
+            window: int = 5) -> pandas.DataFrame:
+    """
+    Compares results with the recent history of the same benchmark and size on this host
+    :param results: from run_suite()
+    :param history: from load_history(), without the results themselves
+    :param threshold: slowdown over the baseline that counts as a regression, 0.25 for 25%
+    :param window: recent runs the baseline is the median of
+    :return: results with baseline_seconds, ratio and regressed; no baseline is never a regression
+    """
+    history = history[history['host'] == platform.node()]
+    baselines = (
+        history.groupby(['benchmark', 'rows'])['seconds']
+        .agg(lambda seconds: seconds.tail(window).median())
+        .rename('baseline_seconds')
+    )
+    compared = results.join(baselines, on=['benchmark', 'rows'])
+    compared['ratio'] = compared['seconds'] / compared['baseline_seconds']
+    compared['regressed'] = compared['ratio'] > 1 + threshold
+    return compared
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks the wrangling pipeline on synthetic listings.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000], help='rows per synthetic frame')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the fastest is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dirty', type=float, default=0.1, help='share of dirty values')
+    parser.add_argument('--threshold', type=float, default=0.25, help='slowdown that fails the run, 0.25 for 25%%')
+    parser.add_argument('--history', type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument('--no-save', action='store_true', help="don't add this run to the history")
+    parser.add_argument('--no-row-wise', action='store_true', help='skip the row-wise engine')
+    parser.add_argument('--no-cleaners', action='store_true', help='skip timing each clean_* function')
+    parser.add_argument('--imports', action='store_true',
+                        help='only check module import times against IMPORT_BUDGETS_MS')
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        times = import_times(repeat=args.repeat)
+        print(times.to_string(index=False))
+        over = times[times['over_budget']]
+        if len(over):
+            print(f'{len(over)} modules over their import budget: {", ".join(over["module"])}', file=sys.stderr)
+            return 1
+        return 0
+
+    results = run_suite(args.sizes, args.repeat, args.seed, args.dirty, row_wise=not args.no_row_wise,
+                        cleaners=not args.no_cleaners)
+    compared = compare(results, load_history(args.history), args.threshold)
+    print(compared.to_string(index=False))
+    if not args.no_save:
+        append_history(results, args.history)
+
+    regressed = compared[compared['regressed']]
+    if len(regressed):
+        print(f'{len(regressed)} benchmarks regressed by more than {args.threshold:.0%}: '
+              f'{", ".join(regressed["benchmark"] + "@" + regressed["rows"].astype(str))}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
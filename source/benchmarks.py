@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import tempfile
+import time
+from pathlib import Path
+
+import duckdb
+import numpy
+import pandas
+
+from source import duckdb_loader, wrangling_utils
+from source.amenities import AmenityIndex
+from source.city_lookup import CityLookup
+from source.dedup import find_duplicates
+from source.rent_cube import QUANTILES, ROLLUPS, read_rollup, update_cube
+from source.spatial import SpatialIndex, haversine_km
+from source.synthetic import make_listings, make_reposts
+
+
+def _best_time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_column_cleaners(uci_df: pandas.DataFrame, repeat: int = 3) -> pandas.DataFrame:
+    """
+    Times the row-wise clean_* functions against their vectorized clean_*_column counterparts
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :param repeat: runs per cleaner, the fastest is kept
+    :return: seconds per column for both engines and the speedup
+    """
+    rows = []
+    for col, row_cleaner in wrangling_utils.ROW_CLEANERS.items():
+        column_cleaner = wrangling_utils.COLUMN_CLEANERS[col]
+        if row_cleaner is None:
+            continue
+
+        values = uci_df[col]
+        row_wise = _best_time(lambda: values.apply(row_cleaner), repeat)
+        vectorized = _best_time(lambda: column_cleaner(values), repeat)
+        rows.append({
+            'column': col,
+            'row_wise_seconds': row_wise,
+            'vectorized_seconds': vectorized,
+            'speedup': row_wise / vectorized,
+        })
+
+    return pandas.DataFrame(rows)
+
+
+def benchmark_row_cleaners(uci_df: pandas.DataFrame, columns=('price_display', 'address', 'cityname'),
+                           repeat: int = 3) -> pandas.DataFrame:
+    """
+    Times row-wise cleaners on their raw column, without memoization
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :param columns: columns whose cleaner to time
+    :param repeat: runs per cleaner, the fastest is kept
+    :return: seconds and microseconds per row for each cleaner
+    """
+    rows = []
+    for col in columns:
+        values = uci_df[col]
+        seconds = _best_time(lambda: values.apply(wrangling_utils.ROW_CLEANERS[col]), repeat)
+        rows.append({'column': col, 'seconds': seconds, 'us_per_row': seconds / len(values) * 1e6})
+
+    return pandas.DataFrame(rows)
+
+
+def benchmark_parallel_clean(uci_df: pandas.DataFrame, workers=(1, 2, 4, 8, 16), vectorized: bool = False,
+                             repeat: int = 1) -> pandas.DataFrame:
+    """
+    Times clean() across process pool sizes
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :param workers: pool sizes to time
+    :param vectorized: engine to run in each worker
+    :param repeat: runs per pool size, the fastest is kept
+    :return: seconds per pool size, the speedup over one worker and the parallel efficiency
+    """
+    rows = []
+    for count in workers:
+        seconds = _best_time(lambda: wrangling_utils.clean(uci_df, vectorized=vectorized, workers=count), repeat)
+        rows.append({'workers': count, 'seconds': seconds})
+
+    results = pandas.DataFrame(rows)
+    results['speedup'] = results['seconds'].iloc[0] / results['seconds']
+    results['efficiency'] = results['speedup'] / results['workers'] * results['workers'].iloc[0]
+    return results
+
+
+def benchmark_normalizer_cache(uci_df: pandas.DataFrame, repeat: int = 3) -> pandas.DataFrame:
+    """
+    Times the row-wise cleaners of the memoized columns with their caches off and on
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :param repeat: runs per column, the fastest is kept; the cache is cleared before each
+    :return: seconds per column uncached and cached, the speedup and the hit rate
+    """
+    rows = []
+    for col, cache in wrangling_utils.NORMALIZER_CACHES.items():
+        values = uci_df[col]
+        row_cleaner = wrangling_utils.ROW_CLEANERS[col]
+        memoized = wrangling_utils._memoized(row_cleaner, cache)
+
+        def cached():
+            cache.clear()
+            values.apply(memoized)
+
+        uncached = _best_time(lambda: values.apply(row_cleaner), repeat)
+        cached_seconds = _best_time(cached, repeat)
+        rows.append({
+            'column': col,
+            'uncached_seconds': uncached,
+            'cached_seconds': cached_seconds,
+            'speedup': uncached / cached_seconds,
+            'hit_rate': cache.hit_rate,
+        })
+
+    return pandas.DataFrame(rows)
+
+
+def benchmark_numeric_cleaners(rows: int = 100_000, dirty=(0.0, 0.5), seed: int = 0,
+                               repeat: int = 3) -> pandas.DataFrame:
+    """
+    Times the numeric cleaners of both engines on synthetic listings, clean and with a share of dirty values
+    :param rows: rows of synthetic listings
+    :param dirty: shares of dirty values to time; ids are made text with the same share of dirty ones
+    :param seed: seed of make_listings()
+    :param repeat: runs per column, the fastest is kept
+    :return: rows per second of each column's row-wise and vectorized cleaner, and its rejection rate
+    """
+    results = []
+    for share in dirty:
+        uci_df = make_listings(rows, seed=seed, dirty=share)
+        ids = uci_df['id'].astype(str).astype(object)
+        ids[numpy.random.default_rng(seed).random(rows) < share] = 'Thumbnail'
+        uci_df['id'] = ids
+
+        for col in ('id', 'price', 'bathrooms', 'bedrooms', 'latitude', 'longitude'):
+            values = uci_df[col]
+            row_cleaner, column_cleaner = wrangling_utils.ROW_CLEANERS[col], wrangling_utils.COLUMN_CLEANERS[col]
+            _, rejections = column_cleaner(values)
+            results.append({
+                'column': col,
+                'dirty': share,
+                'rejection_rate': len(rejections) / rows,
+                'row_wise_rows_per_second': rows / _best_time(lambda: values.apply(row_cleaner), repeat),
+                'vectorized_rows_per_second': rows / _best_time(lambda: column_cleaner(values), repeat),
+            })
+
+    return pandas.DataFrame(results)
+
+
+def benchmark_city_lookup(uci_df: pandas.DataFrame, counties=(10, 300, 3_000), repeat: int = 3) -> pandas.DataFrame:
+    """
+    Times the county rule over the distinct city names as the county table grows, scanning the table for each name
+    against CityLookup's automaton, and the whole city cleaner with that table
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :param counties: sizes of the county table; made-up counties are added to COUNTY_TO_CITY after its own
+    :param repeat: runs per size, the fastest is kept
+    :return: seconds per size for the scan, the automaton and _city_names(), and the automaton's speedup
+    """
+    names = wrangling_utils._as_str(uci_df['cityname']).str.strip().drop_duplicates().reset_index(drop=True)
+    lowered = names.str.lower().tolist()
+    rows = []
+    for size in counties:
+        table = dict(wrangling_utils.COUNTY_TO_CITY)
+        for i in range(size - len(table)):
+            table[f'county {i} county'] = f'City {i}'
+        lookup = CityLookup(table, wrangling_utils.ABBREV_MAP, wrangling_utils.US_STATE_NAMES)
+
+        def scan():
+            return [next((city for county, city in table.items() if county in name), None) for name in lowered]
+
+        scan_seconds = _best_time(scan, repeat)
+        automaton_seconds = _best_time(lambda: [lookup.county_city(name) for name in lowered], repeat)
+        rows.append({
+            'counties': len(table),
+            'names': len(names),
+            'scan_seconds': scan_seconds,
+            'automaton_seconds': automaton_seconds,
+            'city_names_seconds': _best_time(lambda: wrangling_utils._city_names(names, lookup), repeat),
+            'speedup': scan_seconds / automaton_seconds,
+        })
+
+    return pandas.DataFrame(rows)
+
+
+def benchmark_amenity_query(clean_uci_df: pandas.DataFrame, amenities=('parking', 'pool'), repeat: int = 5) -> dict:
+    """
+    Times an AND query over amenities as a substring scan of the cast() strings and with an AmenityIndex
+    :param clean_uci_df: dataframe from clean()
+    :param amenities: amenities the listings must all have
+    :param repeat: runs per method, the fastest is kept
+    :return: seconds for both methods and the speedup
+    """
+    text = wrangling_utils.cast(clean_uci_df)['amenities']
+    index = AmenityIndex.from_lists(clean_uci_df['amenities'])
+
+    def scan():
+        matches = text.notna()
+        for amenity in amenities:
+            matches &= text.str.contains(amenity, regex=False)
+        return matches
+
+    substring = _best_time(scan, repeat)
+    bitset = _best_time(lambda: index.mask(all_of=amenities), repeat)
+    return {'substring_seconds': substring, 'bitset_seconds': bitset, 'speedup': substring / bitset}
+
+
+def benchmark_duckdb_load(clean_uci_df: pandas.DataFrame, rows: int = 10_000) -> dict:
+    """
+    Times load_listings() against inserting the same listings one row at a time, like DataFrame.to_sql
+    :param clean_uci_df: dataframe from clean()
+    :param rows: listings to load, the row-at-a-time insert is slow
+    :return: seconds for both methods and the speedup
+    """
+    listings = wrangling_utils.cast(clean_uci_df.iloc[:rows])
+    listings = listings[listings['id'].notna()].drop_duplicates('id')
+    records = listings.astype(object).where(listings.notna(), None).itertuples(index=False)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        duckdb_loader.load_listings(listings, Path(directory) / 'bulk.duckdb')
+        bulk = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with duckdb.connect(str(Path(directory) / 'naive.duckdb')) as connection:
+            duckdb_loader.create_listings_table(connection)
+            placeholders = ', '.join('?' * len(listings.columns))
+            connection.executemany(f'INSERT INTO {duckdb_loader.LISTINGS_TABLE} VALUES ({placeholders})',
+                                   [list(record) for record in records])
+        naive = time.perf_counter() - start
+
+    return {'rows': len(listings), 'row_insert_seconds': naive, 'bulk_seconds': bulk, 'speedup': naive / bulk}
+
+
+def benchmark_spatial_index(clean_uci_df: pandas.DataFrame, sizes=(10_000, 100_000, 1_000_000), queries: int = 1_000,
+                            k: int = 10, radius_km: float = 5.0, brute_queries: int = 20,
+                            seed: int = 0) -> pandas.DataFrame:
+    """
+    Times SpatialIndex k-nearest and radius queries against a brute-force haversine scan of every listing
+    :param clean_uci_df: dataframe from clean(); its coordinates are resampled with jitter up to each size
+    :param sizes: listings to index
+    :param queries: query points per batch, drawn from the listings
+    :param k: neighbours per k-nearest query
+    :param radius_km: distance of the radius queries
+    :param brute_queries: query points the brute force is timed on, it is slow
+    :param seed: random seed
+    :return: build seconds and microseconds per query point for both methods, per size
+    """
+    rng = numpy.random.default_rng(seed)
+    coordinates = clean_uci_df[['latitude', 'longitude']].astype('float64').dropna().to_numpy()
+
+    rows = []
+    for size in sizes:
+        points = coordinates[rng.integers(len(coordinates), size=size)] + rng.normal(0, 0.05, size=(size, 2))
+        lat, lon = points[:, 0], points[:, 1]
+        query = rng.integers(size, size=queries)
+
+        start = time.perf_counter()
+        index = SpatialIndex(lat, lon)
+        build = time.perf_counter() - start
+
+        knn = _best_time(lambda: index.knn(lat[query], lon[query], k=k), 1) / queries
+        radius = _best_time(lambda: index.radius(lat[query], lon[query], radius_km), 1) / queries
+
+        def brute_force():
+            for i in query[:brute_queries]:
+                distances = haversine_km(lat[i], lon[i], lat, lon)
+                nearest = numpy.argpartition(distances, k)[:k]
+                nearest[numpy.argsort(distances[nearest])]
+                numpy.flatnonzero(distances <= radius_km)
+
+        brute = _best_time(brute_force, 1) / min(brute_queries, queries)
+        rows.append({
+            'points': size,
+            'build_seconds': build,
+            'brute_force_us': brute * 1e6,
+            'knn_us': knn * 1e6,
+            'radius_us': radius * 1e6,
+            'knn_speedup': brute / knn,
+        })
+    return pandas.DataFrame(rows)
+
+
+def benchmark_dedup(sizes=(10_000, 100_000, 1_000_000), share: float = 0.2, thresholds=(0.8,), seed: int = 0,
+                    **kwargs) -> pandas.DataFrame:
+    """
+    Measures find_duplicates() on synthetic listings with known reposts (make_reposts())
+    :param sizes: listings, reposts included
+    :param share: share of reposts
+    :param thresholds: similarity thresholds to run at
+    :param seed: seed of make_reposts()
+    :param kwargs: further arguments of find_duplicates(), e.g. num_perm
+    :return: per size and threshold: recall (reposts put in their original's cluster), precision (listings put in
+    another's cluster that are reposts of the same original) and listings per second
+    """
+    rows = []
+    for size in sizes:
+        uci_df, originals = make_reposts(size, share=share, seed=seed)
+        clean_uci_df, _ = wrangling_utils.clean(uci_df, vectorized=True)
+        positions = numpy.arange(size)
+        reposts = originals != positions
+        for threshold in thresholds:
+            start = time.perf_counter()
+            clusters = find_duplicates(clean_uci_df, threshold=threshold, **kwargs).to_numpy()
+            seconds = time.perf_counter() - start
+            found = clusters != positions
+            rows.append({
+                'listings': size,
+                'threshold': threshold,
+                'recall': (clusters[reposts] == clusters[originals[reposts]]).mean(),
+                'precision': (originals[found] == originals[clusters[found]]).mean() if found.any() else 1.0,
+                'rows_per_second': size / seconds,
+            })
+    return pandas.DataFrame(rows)
+
+
+def benchmark_rent_cube(sizes=(100_000, 1_000_000), chunk_rows: int = 10_000, seed: int = 0) -> pandas.DataFrame:
+    """
+    Times the dashboard rollups computed from the listings against reading them from the rent cube, and the cost of
+    adding a chunk of new listings to the cube
+    :param sizes: rows of synthetic listings
+    :param chunk_rows: rows of the chunk added to the built cube
+    :param seed: seed of make_listings()
+    :return: per size: seconds to group every rollup from the frame, to read every rollup table, to build the cube and
+    to add a chunk to it
+    """
+    rows = []
+    for size in sizes:
+        clean_uci_df, _ = wrangling_utils.clean(make_listings(size + chunk_rows, seed=seed), vectorized=True)
+        listings = wrangling_utils.cast(clean_uci_df, copy=False)
+        listings, chunk = listings.iloc[:size], listings.iloc[size:]
+
+        def from_listings():
+            prices = listings.assign(price=listings['price'].where(listings['price'] > 0))
+            for dims in ROLLUPS.values():
+                groups = prices.groupby(list(dims), dropna=False)['price']
+                groups.agg(['count', 'mean', 'min', 'max'])
+                for q in QUANTILES.values():
+                    groups.quantile(q, interpolation='lower')
+
+        with tempfile.TemporaryDirectory() as directory:
+            cube = Path(directory) / 'cube.duckdb'
+            build = _best_time(lambda: update_cube(listings, cube), 1)
+            add = _best_time(lambda: update_cube(chunk, cube), 1)
+            read = _best_time(lambda: [read_rollup(name, cube) for name in ROLLUPS], 3)
+        rows.append({
+            'listings': size,
+            'group_listings_seconds': _best_time(from_listings, 3),
+            'read_rollups_seconds': read,
+            'build_cube_seconds': build,
+            'add_chunk_seconds': add,
+        })
+    return pandas.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    from source.api import UcIrvineAPI, UcIrvineDatasetIDs
+
+    uci = UcIrvineAPI.fetch_dataset(repo_id=UcIrvineDatasetIDs.Apartment_For_Rent_Classified.value)
+    uci_df = uci.data.original.reset_index()
+    print(benchmark_column_cleaners(uci_df).to_string(index=False))
+    print(benchmark_row_cleaners(uci_df).to_string(index=False))
+    print(benchmark_normalizer_cache(uci_df).to_string(index=False))
+    print(benchmark_city_lookup(uci_df).to_string(index=False))
+    print(benchmark_numeric_cleaners().to_string(index=False))
+    print(benchmark_parallel_clean(uci_df).to_string(index=False))
+    clean_uci_df, _ = wrangling_utils.clean(uci_df, vectorized=True)
+    print(benchmark_amenity_query(clean_uci_df))
+    print(benchmark_duckdb_load(clean_uci_df))
+    print(benchmark_spatial_index(clean_uci_df).to_string(index=False))
+    print(benchmark_dedup().to_string(index=False))
+    print(benchmark_rent_cube().to_string(index=False))
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy
+import pandas
+
+
+class _Automaton:
+    """
+    Aho-Corasick automaton over a list of patterns: finds which patterns occur in a text in one pass over it, however
+    many patterns there are.
+    """
+
+    def __init__(self, patterns: list[str]):
+        """
+        :param patterns: substrings to look for; a pattern's rank is its position in the list
+        """
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        # lowest rank of the patterns ending at each node, including those ending at its fail nodes
+        self._rank: list[int | None] = [None]
+
+        for rank, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                if ch not in self._goto[node]:
+                    self._goto[node][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._rank.append(None)
+                node = self._goto[node][ch]
+            if self._rank[node] is None:
+                self._rank[node] = rank
+
+        # breadth first, so a node's fail node is done before the node
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[child] = fail if fail != child else 0
+                queue.append(child)
+            self._rank[node] = self._min(self._rank[node], self._rank[self._fail[node]])
+
+    @staticmethod
+    def _min(a: int | None, b: int | None) -> int | None:
+        return b if a is None else a if b is None else min(a, b)
+
+    def first(self, text: str) -> int | None:
+        """
+        :param text: text to search
+        :return: lowest rank of the patterns occurring in the text, None if none does
+        """
+        goto, fail, ranks = self._goto, self._fail, self._rank
+        best = ranks[0]
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            rank = ranks[node]
+            if rank is not None and (best is None or rank < best):
+                best = rank
+                if best == 0:
+                    break
+        return best
+
+
+class CityLookup:
+    """
+    The city rules of clean_city_name(), compiled so their cost doesn't grow with the tables: counties are matched with
+    one automaton pass over the name, abbreviations and state names are hash lookups. Alongside them, a canonical-city
+    dictionary keeps the result of the distinct raw names normalized most recently, and can be saved and loaded again
+    to skip normalizing known names at all.
+    """
+
+    def __init__(self, county_to_city: dict[str, str], abbreviations: dict[str, str], state_names,
+                 canonical: dict[str, tuple[str | None, bool]] | None = None, maxsize: int = 100_000):
+        """
+        :param county_to_city: lowercase county names, mapped to their city when the name contains them; the first
+        one in the dict wins
+        :param abbreviations: expansions of a lowercase leading token, e.g. "st" -> "saint"
+        :param state_names: lowercase state names that are not a city on their own
+        :param canonical: (city, rejected) of raw stripped names, as made by normalize(), least recently used first
+        :param maxsize: names the canonical-city dictionary keeps, least recently used first out; 0 keeps none
+        """
+        self.county_to_city = dict(county_to_city)
+        self.abbreviations = dict(abbreviations)
+        self.state_names = frozenset(state_names)
+        self.maxsize = maxsize
+        self.canonical = OrderedDict() if canonical is None else OrderedDict(canonical)
+        # the lookup is shared by every clean() in the process; the lock guards the canonical-city dictionary
+        self._lock = threading.Lock()
+        self._evict()
+        self._cities = list(self.county_to_city.values())
+        self._counties = _Automaton(list(self.county_to_city))
+
+    def __len__(self) -> int:
+        return len(self.canonical)
+
+    def __getstate__(self) -> dict:
+        # locks don't pickle
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _evict(self) -> None:
+        while len(self.canonical) > self.maxsize:
+            self.canonical.popitem(last=False)
+
+    def county_city(self, s_lower: str) -> str | None:
+        """
+        :param s_lower: lowercase city name
+        :return: city of the first county in county_to_city the name contains, None if it contains none
+        """
+        rank = self._counties.first(s_lower)
+        return None if rank is None else self._cities[rank]
+
+    def normalize(self, raw: pandas.Series, normalizer) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Looks names up in the canonical-city dictionary, normalizing and adding the ones it doesn't have yet; safe
+        across threads, with the unknown names normalized outside the lock
+        :param raw: stripped raw names
+        :param normalizer: called with the unknown names as a Series, returns their cities and a rejected mask
+        :return: city names (None where missing or rejected) and a rejected mask
+        """
+        keys = raw.tolist()
+        with self._lock:
+            known = {key: self.canonical[key] for key in dict.fromkeys(keys) if key in self.canonical}
+            for key in known:
+                self.canonical.move_to_end(key)
+        unknown = [key for key in dict.fromkeys(keys) if key not in known]
+        if unknown:
+            cities, rejected = normalizer(pandas.Series(unknown, dtype=object))
+            found = dict(zip(unknown, zip(cities.tolist(), rejected.tolist())))
+            known.update(found)
+            if self.maxsize:
+                with self._lock:
+                    self.canonical.update(found)
+                    self._evict()
+
+        entries = [known[key] for key in keys]
+        cities = numpy.empty(len(entries), dtype=object)
+        cities[:] = [city for city, _ in entries]
+        return cities, numpy.fromiter((rejected for _, rejected in entries), dtype=bool, count=len(entries))
+
+    def save(self, path) -> None:
+        """
+        Writes the tables and the canonical-city dictionary to a JSON file, replacing it whole
+        :param path: file to write
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f'{path.name}.{os.getpid()}.partial')
+        with self._lock:
+            canonical = dict(self.canonical)
+        partial.write_text(json.dumps({
+            'county_to_city': list(self.county_to_city.items()),
+            'abbreviations': self.abbreviations,
+            'state_names': sorted(self.state_names),
+            'canonical': canonical,
+        }))
+        os.replace(partial, path)
+
+    @staticmethod
+    def load(path, maxsize: int = 100_000) -> CityLookup:
+        """
+        :param path: file written by save()
+        :param maxsize: names the canonical-city dictionary keeps; the most recently used of the saved ones are kept
+        :return: the saved lookup, with the tables it was saved with
+        """
+        saved = json.loads(Path(path).read_text())
+        return CityLookup(dict(saved['county_to_city']), saved['abbreviations'], saved['state_names'],
+                          {raw: (city, rejected) for raw, (city, rejected) in saved['canonical'].items()}, maxsize)
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Only the standard library is imported up front, so --help and argument errors come back at once; pandas and the
+# cleaning modules are imported once there is work to do
+
+# Input that fetches the UCI dataset (through the dataset cache) instead of reading a file
+UCI = 'uci'
+
+
+def read_raw(path: str, **read_csv_kwargs):
+    """
+    :param path: raw CSV or Parquet file, or 'uci' for the UCI apartment listings
+    :param read_csv_kwargs: passed on to pandas.read_csv
+    :return: raw dataframe
+    """
+    if path == UCI:
+        from source.api import UcIrvineAPI, UcIrvineDatasetIDs
+        return UcIrvineAPI.fetch_dataset(repo_id=UcIrvineDatasetIDs.Apartment_For_Rent_Classified.value).data.original
+
+    import pandas
+
+    from source import streaming
+    return pandas.concat(streaming.read_chunks(path, chunksize=1_000_000, **read_csv_kwargs), ignore_index=True)
+
+
+def export(clean_uci_df, destination, overwrite: bool = False) -> str:
+    """
+    Writes cleaned listings to where the destination's suffix says:
+
+        .duckdb or .db   upserted into the listings table (duckdb_loader.load_listings)
+        .parquet         one Parquet file
+        .csv             one CSV file
+        anything else    a snapshot directory (snapshots.write_snapshot), as rent_service.py serves
+    :param clean_uci_df: dataframe from cast()
+    :param destination: file or directory to write
+    :param overwrite: replace a snapshot already in the directory
+    :return: what was written
+    """
+    destination = Path(destination)
+    suffix = destination.suffix
+    if suffix in {'.duckdb', '.db'}:
+        from source.duckdb_loader import load_listings
+        counts = load_listings(clean_uci_df, destination)
+        return f'{destination}: ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+    if suffix == '.parquet':
+        import duckdb
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with duckdb.connect() as connection:
+            connection.register('listings', clean_uci_df)
+            escaped = str(destination).replace("'", "''")
+            connection.execute(f"COPY listings TO '{escaped}' (FORMAT PARQUET)")
+        return f'{destination}: {len(clean_uci_df)} rows'
+    if suffix == '.csv':
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        clean_uci_df.to_csv(destination, index=False)
+        return f'{destination}: {len(clean_uci_df)} rows'
+
+    from source.snapshots import write_snapshot
+    manifest = write_snapshot(clean_uci_df, destination, overwrite=overwrite)
+    return f'{destination}: snapshot of {manifest["rows"]} rows'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Cleans, casts and exports the raw listings in one go.',
+        epilog='e.g. python -m source.cli data/apartments_for_rent_classified_100K.csv data/apartments.duckdb '
+               '--sep ";" --encoding cp1252')
+    parser.add_argument('input', help=f'raw CSV or Parquet file, or "{UCI}" to fetch the UCI dataset')
+    parser.add_argument('output', type=Path,
+                        help='.duckdb/.db (upsert), .parquet, .csv, or a directory for a snapshot')
+    parser.add_argument('--workers', type=int, default=1, help='processes to clean in, per chunk with --stream')
+    parser.add_argument('--row-wise', action='store_true', help='clean row by row instead of by column')
+    parser.add_argument('--stream', type=int, metavar='ROWS',
+                        help='clean a file chunk by chunk into .duckdb or a directory of Parquet parts, '
+                             'holding one chunk in memory')
+    parser.add_argument('--rejections', type=Path, help='write the rejected values to this Parquet file')
+    parser.add_argument('--overwrite', action='store_true', help='replace a snapshot already in the output')
+    parser.add_argument('--sep', help='CSV delimiter, ";" for the UCI file')
+    parser.add_argument('--encoding', help='CSV encoding, cp1252 for the UCI file')
+    args = parser.parse_args(argv)
+    if args.stream and args.input == UCI:
+        parser.error(f'--stream reads a file, not "{UCI}"')
+    if args.stream and args.output.suffix in {'.parquet', '.csv'}:
+        parser.error(f'--stream writes .duckdb/.db or a directory of Parquet parts, not one {args.output.suffix} file')
+    read_csv_kwargs = {key: value for key, value in (('sep', args.sep), ('encoding', args.encoding)) if value}
+
+    from source import wrangling_utils
+    from source.rejections import RejectionLedger
+
+    start = time.perf_counter()
+    ledger = RejectionLedger()
+    if args.stream:
+        from source.streaming import stream_clean
+        rows = stream_clean(args.input, args.output, chunksize=args.stream, vectorized=not args.row_wise,
+                            ledger=ledger, workers=args.workers, **read_csv_kwargs)
+        written = f'{args.output}: {rows} rows'
+    else:
+        raw = read_raw(args.input, **read_csv_kwargs)
+        cleaned, ledger = wrangling_utils.clean(raw, vectorized=not args.row_wise, ledger=ledger,
+                                                workers=args.workers)
+        written = export(wrangling_utils.cast(cleaned, copy=False), args.output, args.overwrite)
+    if args.rejections:
+        ledger.to_parquet(args.rejections)
+
+    print(f'{written} ({len(ledger)} rejected values) in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+import numpy
+import pandas
+
+# duckdb and ucimlrepo are imported on first use, when a dataset is read, stored or fetched, not with the module
+if TYPE_CHECKING:
+    from ucimlrepo import dotdict
+
+# Type tags of object columns that hold more than text, e.g. where read_csv parsed some chunks of a column as numbers
+_STR, _FLOAT, _INT, _BOOL, _NONE = range(5)
+
+
+class DatasetCacheMiss(LookupError):
+    """Raised in offline mode when a dataset is not in the cache."""
+
+
+def default_cache_directory() -> Path:
+    """
+    :return: $UCI_CACHE_DIR, or ~/.cache/ucimlrepo
+    """
+    return Path(os.environ.get('UCI_CACHE_DIR', Path.home() / '.cache' / 'ucimlrepo'))
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while block := file.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode(df: pandas.DataFrame) -> tuple[pandas.DataFrame, list[dict]]:
+    """
+    Lays a dataframe out for Parquet, keeping the exact Python values of its object columns
+    :param df: dataframe to store
+    :return: columns to write, named c0, c1, ..., and how to restore each original column
+    """
+    encoded = {}
+    columns = []
+    for i, (name, values) in enumerate(df.items()):
+        key = f'c{i}'
+        column = {'name': name, 'dtype': str(values.dtype), 'key': key, 'encoding': 'plain'}
+        columns.append(column)
+        if values.dtype != object:
+            encoded[key] = values.to_numpy()
+            continue
+
+        objects = values.to_numpy()
+        tags = numpy.array([
+            _NONE if x is None
+            else _STR if isinstance(x, str)
+            else _BOOL if isinstance(x, (bool, numpy.bool_))
+            else _INT if isinstance(x, (int, numpy.integer))
+            else _FLOAT if isinstance(x, float)
+            else -1
+            for x in objects
+        ], dtype='int8')
+        if (tags == -1).any():
+            bad = objects[numpy.argmax(tags == -1)]
+            raise TypeError(f'cannot cache {type(bad).__name__} values of column {name!r}')
+
+        is_str = tags == _STR
+        text = numpy.where(is_str, objects, None)
+        # read_csv text columns hold strings and NaN only
+        if ((tags == _STR) | ((tags == _FLOAT) & pandas.isna(values).to_numpy())).all():
+            column['encoding'] = 'text'
+            encoded[key] = text
+            continue
+
+        column['encoding'] = 'mixed'
+        is_float, is_int = tags == _FLOAT, (tags == _INT) | (tags == _BOOL)
+        floats = numpy.full(len(objects), numpy.nan)
+        floats[is_float] = objects[is_float].astype('float64')
+        ints = numpy.zeros(len(objects), dtype='int64')
+        ints[is_int] = objects[is_int].astype('int64')
+        encoded[key] = text
+        encoded[f'{key}_type'] = tags.astype('uint8')
+        encoded[f'{key}_float'] = floats
+        encoded[f'{key}_int'] = ints
+
+    return pandas.DataFrame(encoded, index=pandas.RangeIndex(len(df))), columns
+
+
+def _decode(stored: pandas.DataFrame, columns: list[dict]) -> pandas.DataFrame:
+    """
+    Inverse of _encode
+    """
+    decoded = {}
+    for column in columns:
+        key = column['key']
+        values = stored[key]
+        if column['encoding'] == 'plain':
+            decoded[column['name']] = values.astype(column['dtype'])
+        elif column['encoding'] == 'text':
+            decoded[column['name']] = values.where(values.notna(), numpy.nan).astype(object)
+        else:
+            tags = stored[f'{key}_type'].to_numpy()
+            objects = values.to_numpy(dtype=object)
+            objects[tags == _FLOAT] = stored[f'{key}_float'].to_numpy(dtype=object)[tags == _FLOAT]
+            ints = stored[f'{key}_int'].to_numpy()
+            objects[tags == _INT] = ints.astype(object)[tags == _INT]
+            objects[tags == _BOOL] = ints.astype(bool).astype(object)[tags == _BOOL]
+            objects[tags == _NONE] = None
+            decoded[column['name']] = pandas.Series(objects, dtype=object)
+    return pandas.DataFrame(decoded)
+
+
+def _fetch_ucirepo(**kwargs):
+    from ucimlrepo import fetch_ucirepo
+    return fetch_ucirepo(**kwargs)
+
+
+def _dataset(df: pandas.DataFrame, metadata: dict, variables: pandas.DataFrame) -> dotdict:
+    # the same layout as ucimlrepo.fetch_ucirepo
+    from ucimlrepo import dotdict
+
+    roles = {role: variables.loc[variables['role'] == role, 'name'].tolist() for role in ('ID', 'Feature', 'Target')}
+    metadata = dict(metadata)
+    metadata['additional_info'] = dotdict(metadata['additional_info']) if metadata.get('additional_info') else None
+    metadata['intro_paper'] = dotdict(metadata['intro_paper']) if metadata.get('intro_paper') else None
+    return dotdict({
+        'data': dotdict({
+            'ids': df[roles['ID']] if roles['ID'] else None,
+            'features': df[roles['Feature']] if roles['Feature'] else None,
+            'targets': df[roles['Target']] if roles['Target'] else None,
+            'original': df,
+            'headers': df.columns,
+        }),
+        'metadata': dotdict(metadata),
+        'variables': variables,
+    })
+
+
+class DatasetCache:
+    """
+    On-disk cache of UCI datasets, one directory per repo id.
+
+    The data is a Parquet file named after its SHA-256, next to a manifest.json with the metadata, variable info,
+    column layout, checksum and fetch time. The manifest is replaced last, so an interrupted store leaves the previous
+    entry in place.
+    """
+
+    def __init__(self, directory=None, ttl: float | None = None, offline: bool | None = None,
+                 fetcher: Callable | None = None):
+        """
+        :param directory: cache root; default_cache_directory() by default
+        :param ttl: seconds before an entry is fetched again, None to keep entries until invalidated
+        :param offline: never fetch, only load from the cache; $UCI_OFFLINE=1 by default
+        :param fetcher: called as fetcher(id=repo_id) to fetch a dataset; ucimlrepo.fetch_ucirepo by default
+        """
+        self.directory = Path(directory) if directory is not None else default_cache_directory()
+        self.ttl = ttl
+        self.offline = offline if offline is not None else os.environ.get('UCI_OFFLINE') == '1'
+        self.fetcher = fetcher if fetcher is not None else _fetch_ucirepo
+
+    def _manifest_path(self, repo_id: int) -> Path:
+        return self.directory / str(repo_id) / 'manifest.json'
+
+    def _manifest(self, repo_id: int) -> dict | None:
+        try:
+            return json.loads(self._manifest_path(repo_id).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def is_fresh(self, repo_id: int) -> bool:
+        """
+        :return: whether the cache holds the dataset and it is younger than the ttl
+        """
+        manifest = self._manifest(repo_id)
+        if manifest is None:
+            return False
+        return self.ttl is None or time.time() - manifest['fetched_at'] < self.ttl
+
+    def load(self, repo_id: int, verify: bool = True) -> dotdict | None:
+        """
+        Loads a dataset from the cache, whatever its age
+        :param repo_id: Dataset ID for UCI ML Repository
+        :param verify: check the data file against its checksum
+        :return: dataset as returned by fetch_ucirepo, None if not cached or the data file is corrupt
+        """
+        manifest = self._manifest(repo_id)
+        if manifest is None:
+            return None
+
+        path = self._manifest_path(repo_id).parent / manifest['data_file']
+        if not path.exists() or (verify and _sha256(path) != manifest['sha256']):
+            return None
+
+        import duckdb
+
+        with duckdb.connect() as connection:
+            stored = connection.execute('SELECT * FROM read_parquet(?)', [str(path)]).df()
+        df = _decode(stored, manifest['columns'])
+        variables = pandas.DataFrame.from_records(manifest['variables'])
+        return _dataset(df, manifest['metadata'], variables)
+
+    def store(self, repo_id: int, dataset) -> None:
+        """
+        Adds a dataset to the cache, replacing any older entry; also how to seed the cache from a local fixture
+        :param repo_id: Dataset ID for UCI ML Repository
+        :param dataset: dataset as returned by fetch_ucirepo
+        """
+        import duckdb
+
+        entry = self._manifest_path(repo_id).parent
+        entry.mkdir(parents=True, exist_ok=True)
+        stored, columns = _encode(dataset.data.original)
+
+        partial = entry / f'data.{os.getpid()}.partial'
+        with duckdb.connect() as connection:
+            connection.register('stored', stored)
+            escaped = str(partial).replace("'", "''")
+            connection.execute(f"COPY stored TO '{escaped}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+        checksum = _sha256(partial)
+        data_file = f'{checksum}.parquet'
+        os.replace(partial, entry / data_file)
+
+        manifest = {
+            'repo_id': repo_id,
+            'data_file': data_file,
+            'sha256': checksum,
+            'fetched_at': time.time(),
+            'columns': columns,
+            'metadata': dataset.metadata,
+            'variables': dataset.variables.to_dict('records'),
+        }
+        partial = entry / f'manifest.{os.getpid()}.partial'
+        partial.write_text(json.dumps(manifest, default=str))
+        os.replace(partial, self._manifest_path(repo_id))
+
+        for old in entry.glob('*.parquet'):
+            if old.name != data_file:
+                old.unlink()
+
+    def invalidate(self, repo_id: int | None = None) -> None:
+        """
+        Drops a dataset from the cache
+        :param repo_id: Dataset ID for UCI ML Repository, None for every dataset
+        """
+        entries = [self.directory / str(repo_id)] if repo_id is not None else list(self.directory.glob('*'))
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            for file in entry.iterdir():
+                file.unlink()
+            entry.rmdir()
+
+    def fetch(self, repo_id: int) -> dotdict:
+        """
+        Loads a dataset from the cache, fetching and caching it first when missing, stale or corrupt
+        :param repo_id: Dataset ID for UCI ML Repository
+        :return: dataset as returned by fetch_ucirepo
+        """
+        if self.offline or self.is_fresh(repo_id):
+            dataset = self.load(repo_id)
+            if dataset is not None:
+                return dataset
+            if self.offline:
+                raise DatasetCacheMiss(f'dataset {repo_id} is not in the cache at {self.directory} (offline mode)')
+
+        self.store(repo_id, self.fetcher(id=repo_id))
+        return self.load(repo_id, verify=False)
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import numpy
+import pandas
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Text a listing is compared by: the same apartment reposted keeps most of these, while its id and price change
+DEDUP_COLUMNS = ('title', 'body', 'address', 'cityname')
+
+_EMPTY = numpy.uint32(0xFFFFFFFF)
+# Odd multipliers: of the rolling shingle hash, and of the densified bins' distance to the bin they borrow from
+_SHINGLE_BASE = numpy.uint64(1_000_003)
+_BORROWED = numpy.uint32(0x9E3779B1)
+# Candidate pairs a band has to find at the threshold similarity, when choosing the bands
+_RECALL = 0.95
+
+
+def listing_text(clean_uci_df: pandas.DataFrame, columns=DEDUP_COLUMNS) -> pandas.Series:
+    """
+    Text of each listing for comparison: the columns joined, lowercased, with punctuation and runs of whitespace made
+    single spaces
+    :param clean_uci_df: dataframe from clean() or cast()
+    :param columns: columns to join; those missing from the frame are left out
+    :return: text per row
+    """
+    parts = [clean_uci_df[col].astype(object).where(clean_uci_df[col].notna(), '').astype(str)
+             for col in columns if col in clean_uci_df]
+    if not parts:
+        raise KeyError(f'none of the columns {list(columns)} are in the frame')
+    text = parts[0].str.cat(parts[1:], sep=' ') if len(parts) > 1 else parts[0]
+    return text.str.lower().str.replace(r'[\W_]+', ' ', regex=True).str.strip()
+
+
+def _mix(z: numpy.ndarray) -> numpy.ndarray:
+    # splitmix64 finalizer: spreads every input bit over the whole 64-bit hash; uint64 arithmetic wraps around
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return z ^ (z >> numpy.uint64(31))
+
+
+def _shingles(texts: list[str], k: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # hashes of the k-character windows of each text, and the text each one is from, without a Python loop over them
+    padded = [text.ljust(k, '\0') for text in texts]
+    lengths = numpy.fromiter(map(len, padded), dtype='int64', count=len(padded))
+    codes = numpy.frombuffer('\0'.join(padded).encode('utf-32-le'), dtype='<u4').astype('uint64')
+
+    windows = len(codes) - k + 1
+    hashes = numpy.zeros(windows, dtype='uint64')
+    for j in range(k):
+        hashes = hashes * _SHINGLE_BASE + codes[j:j + windows]
+
+    # windows that start in a text and end in it too; the joining NULs keep the others out
+    counts = lengths - k + 1
+    starts = numpy.cumsum(lengths + 1) - (lengths + 1)
+    firsts = numpy.cumsum(counts) - counts
+    docs = numpy.repeat(numpy.arange(len(padded)), counts)
+    positions = starts[docs] + numpy.arange(counts.sum()) - firsts[docs]
+    return hashes[positions], docs
+
+
+def _densify(signatures: numpy.ndarray) -> numpy.ndarray:
+    # an empty bin takes the value of the next non-empty one to its right (wrapping around), offset by how far that is,
+    # so two texts agree on it about as often as on a bin of their own
+    num_perm = signatures.shape[1]
+    empty = signatures == _EMPTY
+    if not empty.any():
+        return signatures
+    bins = numpy.arange(num_perm)
+    filled = numpy.where(empty, 3 * num_perm, bins)
+    donors = numpy.concatenate([filled, filled + num_perm], axis=1)
+    donors = numpy.minimum.accumulate(donors[:, ::-1], axis=1)[:, ::-1][:, :num_perm]
+    borrowed = (signatures[numpy.arange(len(signatures))[:, None], donors % num_perm]
+                + (donors - bins).astype('uint32') * _BORROWED)
+    return numpy.where(empty, borrowed, signatures)
+
+
+def minhash_signatures(texts, num_perm: int = 128, k: int = 5, seed: int = 0,
+                       batch_size: int = 20_000) -> numpy.ndarray:
+    """
+    MinHash signatures of the character k-shingles of each text: the share of positions where two signatures agree
+    estimates the Jaccard similarity of the two texts' shingle sets.
+
+    Signatures are one-permutation MinHash: each shingle is hashed once, into one of num_perm bins, and a bin keeps its
+    smallest hash; bins no shingle fell into are filled from their neighbours. That costs one hash per shingle rather
+    than num_perm, and runs in NumPy over batches of texts.
+    :param texts: text per listing, e.g. from listing_text()
+    :param num_perm: signature length
+    :param k: characters per shingle
+    :param seed: hash seed; signatures are only comparable under the same seed, num_perm and k
+    :param batch_size: texts hashed at once, bounding memory
+    :return: uint32 array of shape (len(texts), num_perm)
+    """
+    texts = [str(text) for text in texts]
+    signatures = numpy.empty((len(texts), num_perm), dtype='uint32')
+    salt = _mix(numpy.array([seed], dtype='uint64'))[0]
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        hashes, docs = _shingles(batch, k)
+        hashes = _mix(hashes ^ salt)
+        bins = (hashes >> numpy.uint64(32)) % numpy.uint64(num_perm)
+        values = (hashes & numpy.uint64(0xFFFFFFFF)).astype('uint32')
+        batch_signatures = numpy.full(len(batch) * num_perm, _EMPTY, dtype='uint32')
+        numpy.minimum.at(batch_signatures, docs * num_perm + bins.astype('int64'), values)
+        signatures[start:start + len(batch)] = _densify(batch_signatures.reshape(len(batch), num_perm))
+    return signatures
+
+
+def _bands(num_perm: int, threshold: float) -> int:
+    # the most rows per band (fewest chance candidates) that still make pairs at the threshold candidates _RECALL of
+    # the time
+    for rows in sorted((r for r in range(1, num_perm + 1) if num_perm % r == 0), reverse=True):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= _RECALL:
+            return bands
+    return num_perm
+
+
+def lsh_candidate_pairs(signatures: numpy.ndarray, bands: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Pairs of rows whose signatures agree on all the positions of at least one band, found by sorting each band's hash
+    instead of comparing every pair. Each row sharing a band is paired with the bucket's first row, so a bucket of m rows
+    makes m - 1 pairs rather than m²/2.
+    :param signatures: from minhash_signatures()
+    :param bands: bands to split the signatures into; must divide their length
+    :return: row positions i < j of each distinct pair
+    """
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f'{bands} bands do not divide signatures of length {num_perm}')
+    rows = num_perm // bands
+    multipliers = _mix(numpy.arange(1, rows + 1, dtype='uint64')) | numpy.uint64(1)
+
+    pairs = []
+    for band in range(bands):
+        keys = (signatures[:, band * rows:(band + 1) * rows].astype('uint64') * multipliers).sum(axis=1)
+        order = numpy.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        # each row is paired with the first row of its bucket, so rows of one bucket are never kept apart by a row
+        # between them that only shares the band
+        starts = numpy.flatnonzero(numpy.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        heads = order[numpy.repeat(starts, numpy.diff(numpy.r_[starts, n]))]
+        same = heads != order
+        pairs.append(numpy.minimum(heads, order)[same] * n + numpy.maximum(heads, order)[same])
+    pairs = numpy.unique(numpy.concatenate(pairs)) if pairs else numpy.empty(0, dtype='int64')
+    return pairs // n, pairs % n
+
+
+def find_duplicates(clean_uci_df: pandas.DataFrame, threshold: float = 0.8, num_perm: int = 128,
+                    bands: int | None = None, k: int = 5, columns=DEDUP_COLUMNS, seed: int = 0,
+                    batch_size: int = 20_000) -> pandas.Series:
+    """
+    Clusters near-duplicate listings, e.g. the same apartment posted again with a new id and a reworded title.
+
+    The text of each listing (listing_text()) gets a MinHash signature, LSH banding over the signatures proposes
+    candidate pairs, and the pairs whose signatures agree on at least threshold of their positions are joined into
+    clusters, transitively. Keep the first listing of each cluster with
+
+        df[find_duplicates(df) == numpy.arange(len(df))]
+    :param clean_uci_df: dataframe from clean() or cast()
+    :param threshold: estimated Jaccard similarity of the shingle sets for two listings to be duplicates
+    :param num_perm: signature length; longer is more accurate and slower
+    :param bands: LSH bands; by default chosen so pairs at the threshold are candidates 95% of the time
+    :param k: characters per shingle
+    :param columns: columns compared
+    :param seed: hash seed
+    :param batch_size: listings hashed at once
+    :return: cluster id per row, the row position of the cluster's first listing; listings with none of the columns'
+    text are never duplicates
+    """
+    text = listing_text(clean_uci_df, columns)
+    n = len(text)
+    # a listing with no text has no shingles of its own, and would match every other one as padding does; it stays a
+    # cluster of its own, out of the LSH buckets
+    rows = numpy.flatnonzero(text.to_numpy(dtype=object) != '')
+    signatures = minhash_signatures(text.iloc[rows], num_perm, k, seed, batch_size)
+    first, second = lsh_candidate_pairs(signatures, bands or _bands(num_perm, threshold))
+
+    # verify the candidates in slices, bounding the memory of the comparison
+    keep = numpy.zeros(len(first), dtype=bool)
+    step = max(1, (1 << 24) // num_perm)
+    for start in range(0, len(first), step):
+        i, j = first[start:start + step], second[start:start + step]
+        keep[start:start + step] = (signatures[i] == signatures[j]).mean(axis=1) >= threshold
+
+    graph = coo_matrix((numpy.ones(keep.sum(), dtype='int8'), (rows[first[keep]], rows[second[keep]])), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    firsts = numpy.full(labels.max() + 1 if n else 0, n, dtype='int64')
+    numpy.minimum.at(firsts, labels, numpy.arange(n))
+    return pandas.Series(firsts[labels], index=clean_uci_df.index, name='cluster')
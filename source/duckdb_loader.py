@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import duckdb
+import pandas
+
+from source import wrangling_utils
+
+DEFAULT_DATABASE = Path('data') / 'apartments.duckdb'
+LISTINGS_TABLE = 'listings'
+
+# DuckDB column type for each cast() dtype
+DUCKDB_TYPES = {
+    'Int64': 'BIGINT',
+    'string': 'VARCHAR',
+    'boolean': 'BOOLEAN',
+    'Float64': 'DOUBLE',
+}
+
+
+def _sql_identifier(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def listings_schema() -> dict[str, str]:
+    """
+    :return: DuckDB type of each column, following wrangling_utils.CAST_DTYPES
+    """
+    return {col: DUCKDB_TYPES[dtype] for col, dtype in wrangling_utils.CAST_DTYPES.items()}
+
+
+def create_listings_table(connection: duckdb.DuckDBPyConnection, table: str = LISTINGS_TABLE) -> None:
+    """
+    Creates the listings table, keyed on id, unless it exists
+    :param connection: DuckDB connection
+    :param table: table name
+    """
+    columns = ', '.join(f'{_sql_identifier(col)} {sql_type}' for col, sql_type in listings_schema().items())
+    connection.execute(f'CREATE TABLE IF NOT EXISTS {_sql_identifier(table)} ({columns}, PRIMARY KEY (id))')
+
+
+def load_listings(df: pandas.DataFrame, database=DEFAULT_DATABASE, table: str = LISTINGS_TABLE) -> dict[str, int]:
+    """
+    Upserts cleaned listings into DuckDB, writing only the listings that are new or changed since the last load.
+
+    DuckDB scans the registered dataframe's column buffers in place, so nothing is copied row by row on the way in.
+    :param df: dataframe from clean() or cast()
+    :param database: DuckDB database file
+    :param table: table to upsert into, created by create_listings_table() if missing
+    :return: number of listings inserted, updated, unchanged, and skipped for having no id; for repeated ids the last
+    one counts
+    """
+    if dict(df.dtypes.astype(str)) != wrangling_utils.CAST_DTYPES:
+        df = wrangling_utils.cast(df)
+    listings = df[df['id'].notna()].drop_duplicates('id', keep='last')
+
+    Path(database).parent.mkdir(parents=True, exist_ok=True)
+    target = _sql_identifier(table)
+    columns = ', '.join(f'incoming.{_sql_identifier(col)}' for col in listings_schema())
+    changed = ' OR '.join(
+        f'incoming.{_sql_identifier(col)} IS DISTINCT FROM stored.{_sql_identifier(col)}'
+        for col in listings_schema() if col != 'id'
+    )
+    with duckdb.connect(str(database)) as connection:
+        create_listings_table(connection, table)
+        connection.register('incoming', listings)
+        connection.execute('BEGIN TRANSACTION')
+        connection.execute(f'''
+            CREATE TEMP TABLE changes AS
+            SELECT {columns}, stored.id IS NULL AS is_new
+            FROM incoming LEFT JOIN {target} AS stored ON incoming.id = stored.id
+            WHERE stored.id IS NULL OR {changed}
+        ''')
+        inserted, updated = connection.execute(
+            'SELECT count(*) FILTER (WHERE is_new), count(*) FILTER (WHERE NOT is_new) FROM changes'
+        ).fetchone()
+        connection.execute(f'INSERT OR REPLACE INTO {target} BY NAME SELECT * EXCLUDE (is_new) FROM changes')
+        connection.execute('DROP TABLE changes')
+        connection.execute('COMMIT')
+        connection.unregister('incoming')
+
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': len(listings) - inserted - updated,
+        'skipped': len(df) - len(listings),
+    }
+
+
+def read_listings(database=DEFAULT_DATABASE, table: str = LISTINGS_TABLE) -> pandas.DataFrame:
+    """
+    :param database: DuckDB database file
+    :param table: table to read
+    :return: stored listings with the cast() dtypes, ordered by id
+    """
+    with duckdb.connect(str(database), read_only=True) as connection:
+        df = connection.execute(f'SELECT * FROM {_sql_identifier(table)} ORDER BY id').df()
+    return wrangling_utils.cast(df, copy=False)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy
+import pandas
+
+from source import wrangling_utils
+from source.rejections import RejectionLedger
+from source.snapshots import _read_image, _write_image
+
+DEFAULT_STATE = Path('data') / 'cleaning_state'
+
+# Object columns hash their values by text, so 1 and '1' collide, as do None and 'None'; the cleaners tell them apart,
+# so the type of each value is hashed as well
+_TYPE_CODES = {type(None): 1, str: 2, float: 3, int: 4, bool: 5}
+
+# Columns of the stored rejections; row is the row of the stored result they belong to
+_REJECTION_DTYPES = {'row': 'Int64', 'column_name': 'string', 'value': 'string', 'reason': 'string'}
+
+
+def row_hashes(uci_df: pandas.DataFrame) -> numpy.ndarray:
+    """
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :return: uint64 hash of the raw columns clean() reads, per row; equal rows clean to equal results
+    """
+    columns = {}
+    for col in wrangling_utils.ROW_CLEANERS:
+        values = uci_df[col].to_numpy()
+        if values.dtype != object:
+            columns[col] = pandas.util.hash_array(values)
+            continue
+        # object values are hashed by their text, 1, 1.0, '1' and True apart, and told apart further by their type
+        codes, uniques = pandas.factorize(values)
+        if pandas.api.types.infer_dtype(uniques, skipna=False) in {'string', 'empty'}:
+            # text with missing values, as read_csv gives: each distinct text hashed once, and only the missing values,
+            # code -1, hashed and typed one by one
+            missing = numpy.flatnonzero(codes < 0)
+            hashes = pandas.util.hash_array(uniques.astype(object), categorize=False)
+            hashes = numpy.append(hashes, numpy.uint64(0))[codes]
+            hashes[missing] = pandas.util.hash_array(values[missing], categorize=False)
+            types = numpy.full(len(values), _TYPE_CODES[str], dtype='uint8')
+            types[missing] = [_TYPE_CODES.get(type(value), 0) for value in values[missing]]
+        else:
+            # factorize() takes 1, 1.0 and True for one value, so these are hashed one by one
+            hashes = pandas.util.hash_array(values, categorize=False)
+            types, uniques = pandas.factorize(numpy.frompyfunc(type, 1, 1)(values))
+            types = numpy.array([_TYPE_CODES.get(t, 0) for t in uniques], dtype='uint8')[types]
+        columns[col] = hashes
+        columns[f'{col} type'] = types
+
+    return pandas.util.hash_pandas_object(pandas.DataFrame(columns), index=False).to_numpy()
+
+
+def rules_fingerprint() -> str:
+    """
+    :return: hash of what a cleaned row depends on besides the raw row: CLEANER_VERSION, the state table, the tables of
+    the CityLookup in use (see use_city_lookup()), and the stored dtypes
+    """
+    lookup = wrangling_utils.CITY_LOOKUP
+    rules = {
+        'cleaner_version': wrangling_utils.CLEANER_VERSION,
+        'state_map': wrangling_utils.STATE_MAP,
+        'county_to_city': list(lookup.county_to_city.items()),
+        'abbreviations': lookup.abbreviations,
+        'state_names': sorted(lookup.state_names),
+        'dtypes': wrangling_utils.CAST_DTYPES,
+    }
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()
+
+
+def _read_state(state: Path, fingerprint: str) -> tuple[numpy.ndarray, pandas.DataFrame, pandas.DataFrame, int]:
+    # stored hashes, results and rejections; a store kept under other rules counts as empty, and its rows as stale
+    hashes = numpy.empty(0, dtype='uint64')
+    results = wrangling_utils.cast(pandas.DataFrame({col: [] for col in wrangling_utils.CAST_DTYPES}))
+    rejections = pandas.DataFrame({col: [] for col in _REJECTION_DTYPES}).astype(_REJECTION_DTYPES)
+    if not (state / 'rules.json').exists():
+        return hashes, results, rejections, 0
+    rules = json.loads((state / 'rules.json').read_text())
+    if rules['fingerprint'] != fingerprint:
+        return hashes, results, rejections, rules['rows']
+    return (numpy.load(state / 'hashes.npy'), _read_image(state / 'results', wrangling_utils.CAST_DTYPES, mmap=False),
+            _read_image(state / 'rejections', _REJECTION_DTYPES, mmap=False), 0)
+
+
+def _write_state(state: Path, fingerprint: str, hashes: numpy.ndarray, results: pandas.DataFrame,
+                 rejections: pandas.DataFrame) -> None:
+    # written next to the store and swapped in once complete, as write_snapshot() does
+    partial = state.with_name(f'{state.name}.{os.getpid()}.partial')
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+    try:
+        numpy.save(partial / 'hashes.npy', hashes)
+        _write_image(results.reset_index(drop=True), partial / 'results')
+        _write_image(rejections.reset_index(drop=True), partial / 'rejections')
+        (partial / 'rules.json').write_text(json.dumps({'fingerprint': fingerprint, 'rows': len(hashes)}))
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    old = state.with_name(f'{state.name}.{os.getpid()}.old')
+    if state.exists():
+        os.replace(state, old)
+    os.replace(partial, state)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _expand(targets: numpy.ndarray, positions: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Pairs each target with every row whose position is that target
+    :param targets: stored rows, e.g. of rejections
+    :param positions: stored row of each row of the run
+    :return: index into targets and the matching row of the run, per pair
+    """
+    order = numpy.argsort(positions, kind='stable')
+    starts = numpy.searchsorted(positions[order], targets, side='left')
+    counts = numpy.searchsorted(positions[order], targets, side='right') - starts
+    which = numpy.repeat(numpy.arange(len(targets)), counts)
+    offsets = numpy.arange(len(which)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return which, order[numpy.repeat(starts, counts) + offsets]
+
+
+def clean_incremental(uci_df: pandas.DataFrame, state=DEFAULT_STATE, vectorized: bool = False,
+                      ledger: RejectionLedger | None = None,
+                      prune: bool = True) -> tuple[pandas.DataFrame, RejectionLedger, dict[str, int]]:
+    """
+    cast(clean(uci_df)) that only cleans rows it has not cleaned before. The cast results are kept in a state store
+    keyed on a hash of each raw row, together with the rows' rejections, as numpy files of each column; a run hashes
+    the rows, takes the known ones from the store by position and cleans the rest. The store is discarded when it was
+    kept under other cleaning rules (rules_fingerprint()), e.g. after use_city_lookup() or a cleaner change.
+
+    Worth it when most rows were cleaned before: on 100,000 synthetic listings, a run with every row known takes about
+    half the time of clean(vectorized=True) and cast(), and one with 1% of the rows changed about 0.8 of it, as the
+    store is rewritten. A run over new rows takes about twice as long, hashing and writing the store on top of the
+    clean, so for a frame cleaned once clean(vectorized=True) is the faster choice.
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :param state: directory of the state store
+    :param vectorized: engine for the rows that need cleaning
+    :param ledger: where to record rejected values, of cached rows too; a new RejectionLedger by default
+    :param prune: drop rows of earlier runs that are not in uci_df from the state store
+    :return: cleaned and cast dataframe, the rejections by row position in uci_df, and how many rows there were,
+    were cached, and were cleaned (each distinct row once), and how many stored rows were discarded as stale
+    """
+    if ledger is None:
+        ledger = RejectionLedger()
+
+    state, fingerprint = Path(state), rules_fingerprint()
+    stored_hashes, results, rejections, stale = _read_state(state, fingerprint)
+    hashes = row_hashes(uci_df)
+    positions = pandas.Index(stored_hashes).get_indexer(hashes)
+
+    # clean each new distinct row once
+    new_hashes, first = numpy.unique(hashes[positions < 0], return_index=True)
+    new_rows = uci_df.iloc[numpy.flatnonzero(positions < 0)[first]]
+    cached = len(numpy.unique(positions[positions >= 0]))
+    kept = numpy.ones(len(stored_hashes), dtype=bool)
+    if prune:
+        kept[:] = False
+        kept[positions[positions >= 0]] = True
+
+    if len(new_rows) or not kept.all():
+        # stored rows renumbered to those kept, and the new rows after them
+        renumbered = numpy.cumsum(kept) - 1
+        results = results[kept]
+        rejections = rejections[kept[rejections['row'].to_numpy(dtype='int64')]]
+        rejections = rejections.assign(row=renumbered[rejections['row'].to_numpy(dtype='int64')])
+        if len(new_rows):
+            cleaned, new_ledger = wrangling_utils.clean(new_rows, vectorized=vectorized,
+                                                        ledger=RejectionLedger(limit=None))
+            new_rejections = new_ledger.to_frame().astype({'column_name': 'string', 'value': 'string',
+                                                            'reason': 'string'})
+            new_rejections['row'] += len(results)
+            results = pandas.concat([results, wrangling_utils.cast(cleaned, copy=False)], ignore_index=True)
+            rejections = pandas.concat([rejections, new_rejections.astype(_REJECTION_DTYPES)], ignore_index=True)
+        stored_hashes = numpy.concatenate([stored_hashes[kept], new_hashes])
+        _write_state(state, fingerprint, stored_hashes, results, rejections)
+        positions = pandas.Index(stored_hashes).get_indexer(hashes)
+
+    # every row takes the result of its hash
+    clean_uci_df = results.take(positions)
+    clean_uci_df.index = uci_df.index
+
+    # and its rejections, in row order per column like clean() records them
+    which, rows = _expand(rejections['row'].to_numpy(dtype='int64'), positions)
+    run_rejections = rejections.iloc[which].assign(row=rows).sort_values('row', kind='stable')
+    by_column = dict(tuple(run_rejections.groupby('column_name', sort=False)))
+    for col in wrangling_utils.ROW_CLEANERS:
+        if col in by_column:
+            column = by_column[col]
+            ledger.extend(col, column['row'], column['value'].to_numpy(dtype=object, na_value=None),
+                          column['reason'].to_numpy(dtype=object))
+
+    return clean_uci_df, ledger, {'rows': len(uci_df), 'cached': cached, 'cleaned': len(new_rows), 'stale': stale}
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import pandas
+
+from source import wrangling_utils
+from source.profiling import CleanProfile
+from source.rejections import RejectionLedger
+
+
+class LazyCleanFrame:
+    """
+    Raw listings whose columns are cleaned on first access and kept, so a job pays only for the columns it reads:
+
+        listings = LazyCleanFrame(uci_df)
+        rent = listings['price'] / listings['square_feet']
+        listings.cast(['price', 'state'])
+
+    Each column is cleaned exactly as clean() would clean it. Rejections go to `ledger` as columns are cleaned.
+    """
+
+    def __init__(self, uci_df: pandas.DataFrame, vectorized: bool = True, ledger: RejectionLedger | None = None,
+                 profile: CleanProfile | None = None):
+        """
+        :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset; nothing is cleaned yet
+        :param vectorized: engine for clean(); the output is identical either way
+        :param ledger: where to record rejected values; a new RejectionLedger by default
+        :param profile: where to record the cleaners' measurements, see clean()
+        """
+        self.raw = uci_df
+        self.vectorized = vectorized
+        self.ledger = RejectionLedger() if ledger is None else ledger
+        self.profile = profile
+        self._cleaned: dict[str, pandas.Series] = {}
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __contains__(self, col: str) -> bool:
+        return col in self.columns
+
+    @property
+    def columns(self) -> list[str]:
+        """
+        :return: columns that can be cleaned, in clean() order
+        """
+        return [col for col in wrangling_utils.ROW_CLEANERS if col in self.raw.columns]
+
+    @property
+    def cleaned(self) -> list[str]:
+        """
+        :return: columns cleaned so far
+        """
+        return list(self._cleaned)
+
+    def _clean(self, columns: list[str]) -> None:
+        missing = [col for col in wrangling_utils._projection(columns) if col not in self._cleaned]
+        if not missing:
+            return
+        cleaned_uci_df, _ = wrangling_utils.clean(self.raw, vectorized=self.vectorized, ledger=self.ledger,
+                                                  profile=self.profile, columns=missing)
+        self._cleaned.update(cleaned_uci_df.items())
+
+    def __getitem__(self, key):
+        """
+        :param key: a column, or a list of columns
+        :return: the cleaned column as a Series, or the cleaned columns as a dataframe in the order asked for
+        """
+        if isinstance(key, str):
+            self._clean([key])
+            return self._cleaned[key]
+        return self.clean(key)[list(key)]
+
+    def clean(self, columns=None) -> pandas.DataFrame:
+        """
+        :param columns: columns to clean, all of them by default
+        :return: cleaned dataframe of those columns in clean() order, as clean(uci_df, columns=columns) returns it
+        """
+        columns = self.columns if columns is None else list(columns)
+        self._clean(columns)
+        # the cleaned columns share the raw index already; .array skips aligning them on it again
+        return pandas.DataFrame({col: self._cleaned[col].array for col in wrangling_utils._projection(columns)},
+                                index=self.raw.index)
+
+    def cast(self, columns=None, compact: bool = False) -> pandas.DataFrame:
+        """
+        :param columns: columns to clean and cast, all of them by default
+        :param compact: see wrangling_utils.cast()
+        :return: cast dataframe of those columns
+        """
+        return wrangling_utils.cast(self.clean(columns), copy=False, compact=compact)
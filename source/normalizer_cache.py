@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded LRU of entries with hit and miss counters; safe across threads.
+
+    The counters also take lookups answered some other way, e.g. the vectorized cleaners normalizing each distinct
+    value of a column once, so `hit_rate` is the dedup ratio of the column either way.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        """
+        :param maxsize: entries to keep, least recently used first out; 0 disables the cache
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self) -> dict:
+        # the cleaners' caches are module globals that worker processes unpickle with wrangling_utils; locks don't pickle
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        """
+        :param key: hashable key
+        :return: cached entry, None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def count(self, hits: int, misses: int) -> None:
+        """
+        Counts lookups answered outside the cache
+        :param hits: lookups answered without normalizing again
+        :param misses: values normalized
+        """
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def clear(self) -> None:
+        """
+        Drops the entries and resets the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# The cleaners' caches of normalized values, keyed on the raw string
+NormalizerCache = LRUCache
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import math
+import re
+import sys
+
+import numpy
+import pandas
+
+# What float() and int() strip: str.isspace() but for \x1c-\x1f
+_SPACE = r'[^\S\x1c-\x1f]*'
+_DIGITS = r'\d(?:_?\d)*'
+
+# The strings float() and int() accept, Unicode digits and underscores included; a string they don't match makes the
+# conversion raise, so it can be turned down without trying it
+_DECIMAL = rf'(?:{_DIGITS}(?:\.(?:{_DIGITS})?)?|\.{_DIGITS})(?:[eE][+-]?{_DIGITS})?'
+FLOAT_LITERAL = re.compile(rf'{_SPACE}[+-]?(?:{_DECIMAL}|inf(?:inity)?|nan){_SPACE}', re.I)
+INT_LITERAL = re.compile(rf'{_SPACE}[+-]?{_DIGITS}{_SPACE}')
+
+# int() refuses strings of more digits
+_MAX_INT_DIGITS = sys.get_int_max_str_digits() or float('inf')
+
+
+def _fits_float(x: int) -> bool:
+    # float() of a larger int overflows
+    return x.bit_length() <= 1023
+
+
+def to_float(x) -> float | None:
+    """
+    float(x), without raising for text and numbers
+    :param x: raw value
+    :return: float(x), or None where float(x) raises
+    """
+    if type(x) is float:
+        return x
+    if isinstance(x, str):
+        # plain decimals are most of the values, and cheaper to recognize than with the full grammar
+        if x.isdecimal() or x.replace('.', '', 1).isdecimal() or FLOAT_LITERAL.fullmatch(x):
+            return float(x)
+        return None
+    if isinstance(x, (float, numpy.floating, numpy.integer)) or (isinstance(x, int) and _fits_float(x)):
+        return float(x)
+    if x is None:
+        return None
+    # neither text nor a number, e.g. bytes; rare enough to just try
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+
+def to_int(x) -> int | None:
+    """
+    int(x), without raising for text and numbers
+    :param x: raw value
+    :return: int(x), or None where int(x) raises
+    """
+    if type(x) is int:
+        return x
+    if isinstance(x, str):
+        if not (x.isdecimal() or INT_LITERAL.fullmatch(x)):
+            return None
+        if len(x) <= _MAX_INT_DIGITS:
+            return int(x)
+    elif isinstance(x, (int, numpy.integer)):
+        return int(x)
+    elif isinstance(x, (float, numpy.floating)):
+        return int(x) if math.isfinite(x) else None
+    elif x is None:
+        return None
+    # neither text nor a number, or digits past int()'s limit on their count
+    try:
+        return int(x)
+    except Exception:
+        return None
+
+
+def parse_floats(values: pandas.Series) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Vectorized float(x): strings are checked against FLOAT_LITERAL in bulk instead of converting them one by one and
+    catching what raises
+    :param values: column to parse
+    :return: parsed values (NaN where parsing failed) and a mask of the cells float(x) raises on
+    """
+    if values.dtype.kind in 'biuf':
+        return values.to_numpy(dtype='float64'), numpy.zeros(len(values), dtype=bool)
+
+    # equal keys (1, 1.0, True) convert to the same float, so parsing the distinct values is exact
+    codes, uniques = pandas.factorize(values)
+    objects = numpy.asarray(uniques, dtype=object)
+    parsed = numpy.full(len(objects), numpy.nan)
+    failed = numpy.zeros(len(objects), dtype=bool)
+
+    is_str = numpy.fromiter((isinstance(x, str) for x in objects), dtype=bool, count=len(objects))
+    text = numpy.flatnonzero(is_str)
+    literal = pandas.Series(objects[text], dtype=object).str.fullmatch(FLOAT_LITERAL).to_numpy(dtype=bool)
+    # numpy's object -> float64 cast calls float() on each value, which can't raise on a literal
+    parsed[text[literal]] = objects[text[literal]].astype('float64')
+    failed[text[~literal]] = True
+
+    for i in numpy.flatnonzero(~is_str):
+        number = to_float(objects[i])
+        if number is None:
+            failed[i] = True
+        else:
+            parsed[i] = number
+
+    missing = codes == -1
+    # the code -1 of missing values picks a padding slot, so a column with no values but None still indexes
+    row_parsed, row_failed = numpy.append(parsed, numpy.nan)[codes], numpy.append(failed, False)[codes]
+    row_parsed[missing] = numpy.nan
+    # float(nan) is nan, float(None) raises
+    row_failed[missing] = [not isinstance(x, float) for x in values.to_numpy(dtype=object)[missing]]
+    return row_parsed, row_failed
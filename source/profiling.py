@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas
+
+from source.normalizer_cache import NormalizerCache
+
+# what is recorded per column; memory is the peak over runs, the rest add up
+_TOTALS = ('runs', 'rows', 'seconds', 'rejected', 'cache_hits', 'cache_misses')
+
+
+def unmeasured(column: str, rows: int, cache: NormalizerCache | None = None):
+    """
+    Stand-in for CleanProfile.measure when clean() is not profiled
+    """
+    return nullcontext({})
+
+
+class CleanProfile:
+    """
+    Per-column wall time, throughput, peak memory, rejections and cache hits of clean() runs.
+
+    Pass one to clean(profile=...) to fill it; runs profiled into the same CleanProfile add up. Peak memory is traced
+    with tracemalloc, which slows allocation-heavy cleaners down; profile with memory=False for undistorted timings.
+    Cleaning in worker processes adds up the seconds of all workers.
+    """
+
+    def __init__(self, memory: bool = True):
+        """
+        :param memory: trace the peak memory of each cleaner
+        """
+        self.memory = memory
+        self._columns: dict[str, dict[str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def child(self) -> CleanProfile:
+        """
+        :return: empty profile with the same settings, for a chunk of the rows cleaned elsewhere before merging it back
+        """
+        return CleanProfile(self.memory)
+
+    def _record(self, column: str) -> dict[str, float]:
+        return self._columns.setdefault(column, {**dict.fromkeys(_TOTALS, 0), 'peak_memory_bytes': 0})
+
+    @contextmanager
+    def measure(self, column: str, rows: int, cache: NormalizerCache | None = None):
+        """
+        Measures cleaning a column; set 'rejected' on the yielded dict to record the number of rejected values
+        :param column: column being cleaned
+        :param rows: rows being cleaned
+        :param cache: normalizer cache the cleaner looks up, to count its hits
+        """
+        measurement = {'rejected': 0}
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.memory:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        start = time.perf_counter()
+        try:
+            yield measurement
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline if self.memory else 0
+            if tracing:
+                tracemalloc.stop()
+
+            record = self._record(column)
+            record['runs'] += 1
+            record['rows'] += rows
+            record['seconds'] += seconds
+            record['rejected'] += measurement['rejected']
+            record['peak_memory_bytes'] = max(record['peak_memory_bytes'], peak)
+            if cache is not None:
+                record['cache_hits'] += cache.hits - hits
+                record['cache_misses'] += cache.misses - misses
+
+    def merge(self, other: CleanProfile) -> None:
+        """
+        Adds the measurements of another profile, e.g. one recorded for a chunk of the rows, to this one
+        """
+        for column, theirs in other._columns.items():
+            ours = self._record(column)
+            for key in _TOTALS:
+                ours[key] += theirs[key]
+            ours['peak_memory_bytes'] = max(ours['peak_memory_bytes'], theirs['peak_memory_bytes'])
+
+    def to_frame(self) -> pandas.DataFrame:
+        """
+        :return: one row per column in cleaning order, with rows_per_second and rejection_rate; cache columns are
+        <NA> for cleaners without a cache
+        """
+        frame = pandas.DataFrame.from_dict(self._columns, orient='index', columns=[*_TOTALS, 'peak_memory_bytes'])
+        frame = frame.rename_axis('column_name').reset_index()
+        frame = frame.astype({key: 'int64' for key in (*_TOTALS, 'peak_memory_bytes') if key != 'seconds'})
+        frame['seconds'] = frame['seconds'].astype('float64')
+        frame['rows_per_second'] = frame['rows'] / frame['seconds'].where(frame['seconds'] > 0)
+        frame['rejection_rate'] = frame['rejected'] / frame['rows'].where(frame['rows'] > 0)
+
+        cached = (frame['cache_hits'] + frame['cache_misses']) > 0
+        for key in ('cache_hits', 'cache_misses'):
+            frame[key] = frame[key].astype('Int64').where(cached)
+        return frame
+
+    def to_dict(self) -> dict:
+        """
+        :return: the report as plain JSON types
+        """
+        records = self.to_frame().astype(object).where(lambda frame: frame.notna(), None).to_dict(orient='records')
+        return {'columns': records}
+
+    def to_json(self, path=None, **json_kwargs) -> str:
+        """
+        :param path: file to write the report to as well
+        :param json_kwargs: passed to json.dumps
+        :return: the report as JSON
+        """
+        text = json.dumps(self.to_dict(), **json_kwargs)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def to_prometheus(self, registry=None, namespace: str = 'clean', labels: dict[str, str] | None = None):
+        """
+        Sets Prometheus gauges with a `column_name` label from the report, e.g. to expose with prometheus_client's
+        generate_latest(registry) or push to a Pushgateway
+        :param registry: prometheus_client CollectorRegistry; a new one by default
+        :param namespace: prefix of the metric names
+        :param labels: constant labels for every sample, e.g. {'feed': '10K'}
+        :return: the registry
+        """
+        from prometheus_client import CollectorRegistry, Gauge
+
+        if registry is None:
+            registry = CollectorRegistry()
+        labels = labels or {}
+        label_names = ['column_name', *labels]
+        metrics = {
+            'rows': 'Rows cleaned',
+            'seconds': 'Wall time spent cleaning',
+            'rows_per_second': 'Rows cleaned per second',
+            'rejected': 'Values rejected',
+            'rejection_rate': 'Share of rows rejected',
+            'peak_memory_bytes': 'Peak traced memory while cleaning',
+            'cache_hits': 'Normalizer cache hits',
+            'cache_misses': 'Normalizer cache misses',
+        }
+        gauges = {
+            key: Gauge(f'column_{key}', description, label_names, namespace=namespace, registry=registry)
+            for key, description in metrics.items()
+        }
+        for record in self.to_frame().to_dict(orient='records'):
+            for key, gauge in gauges.items():
+                if not pandas.isna(record[key]):
+                    gauge.labels(column_name=record['column_name'], **labels).set(float(record[key]))
+        return registry
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import threading
+from array import array
+
+import numpy
+import pandas
+
+
+def _as_text(value) -> str | None:
+    # raw values are mixed types (str, float, lists of parts); store them uniformly as text
+    return None if value is None else str(value)
+
+
+class _ColumnRejections:
+    """
+    Columnar storage for one column's rejections: row positions, raw values as text, and reason codes
+    """
+
+    def __init__(self):
+        self.positions = array('q')
+        self.values: list[str | None] = []
+        self.reasons = array('B')
+        self.seen = 0
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+class RejectionLedger:
+    """
+    Per-run record of the values clean() rejected.
+
+    Totals per column and reason are always exact. The stored rows are bounded by `limit` per column: either the first
+    `limit` rejections are kept, or, with `sample=True`, a uniform reservoir sample of all of them. Ledgers of chunks
+    merged back (child(), merge()) keep the same first `limit`, but a different sample than one ledger over all rows.
+    """
+
+    def __init__(self, limit: int | None = 10_000, sample: bool = False, seed: int | None = 0):
+        """
+        :param limit: stored rejections per column, None for no limit
+        :param sample: keep a uniform sample of all rejections instead of the first `limit`
+        :param seed: seed for the sample
+        """
+        self.limit = limit
+        self.sample = sample
+        self.seed = seed
+        self._rng = numpy.random.default_rng(seed)
+        self._columns: dict[str, _ColumnRejections] = {}
+        self._reasons: list[str] = []
+        self._counts: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(rejections) for rejections in self._columns.values())
+
+    def __getstate__(self) -> dict:
+        # ledgers travel between worker processes; locks don't pickle
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def child(self, number: int) -> RejectionLedger:
+        """
+        :param number: chunk number, varies the seed
+        :return: empty ledger with the same policy, for recording one chunk of the rows before merging it back
+        """
+        return RejectionLedger(self.limit, self.sample, None if self.seed is None else self.seed + number)
+
+    def _reason_codes(self, reasons) -> numpy.ndarray:
+        codes, uniques = pandas.factorize(numpy.asarray(reasons, dtype=object))
+        for reason in uniques:
+            if reason not in self._reasons:
+                self._reasons.append(reason)
+        return numpy.array([self._reasons.index(reason) for reason in uniques], dtype='uint8')[codes]
+
+    def extend(self, column: str, positions, values, reasons) -> None:
+        """
+        Records rejections for a column
+        :param column: column the values were rejected from
+        :param positions: row positions of the rejected values in the raw dataframe, in row order
+        :param values: rejected values
+        :param reasons: reason for each rejection
+        """
+        positions = numpy.asarray(positions, dtype='int64')
+        if not len(positions):
+            return
+        values = numpy.asarray(values, dtype=object) if not isinstance(values, list) else values
+
+        with self._lock:
+            reason_codes = self._reason_codes(reasons)
+            for code, count in zip(*numpy.unique(reason_codes, return_counts=True)):
+                key = (column, self._reasons[code])
+                self._counts[key] = self._counts.get(key, 0) + int(count)
+
+            rejections = self._columns.setdefault(column, _ColumnRejections())
+            seen = rejections.seen
+            rejections.seen += len(positions)
+
+            # fill up to the limit
+            room = len(positions) if self.limit is None else max(self.limit - len(rejections), 0)
+            rejections.positions.extend(positions[:room].tolist())
+            rejections.values.extend(map(_as_text, values[:room]))
+            rejections.reasons.extend(reason_codes[:room].tolist())
+            if room >= len(positions) or not self.sample:
+                return
+
+            # reservoir sampling: the t-th rejection replaces a random slot with probability limit / (t + 1)
+            overflow = numpy.arange(room, len(positions))
+            slots = self._rng.integers(0, seen + overflow + 1)
+            kept = slots < self.limit
+            overflow, slots = overflow[kept], slots[kept]
+            # when a slot is hit more than once, the last hit wins
+            slots, last = numpy.unique(slots[::-1], return_index=True)
+            for slot, i in zip(slots.tolist(), overflow[::-1][last].tolist()):
+                rejections.positions[slot] = int(positions[i])
+                rejections.values[slot] = _as_text(values[i])
+                rejections.reasons[slot] = int(reason_codes[i])
+
+    def merge(self, other: RejectionLedger, offset: int = 0) -> None:
+        """
+        Adds the rejections of another ledger, e.g. one recorded for a chunk of the rows, to this one
+        :param other: ledger to add; merge chunks in row order to keep the first `limit` rejections
+        :param offset: added to the other ledger's row positions
+        """
+        with self._lock:
+            for key, count in other._counts.items():
+                self._counts[key] = self._counts.get(key, 0) + count
+
+            for column, theirs in other._columns.items():
+                ours = self._columns.setdefault(column, _ColumnRejections())
+                positions = numpy.asarray(theirs.positions, dtype='int64') + offset
+                reasons = self._reason_codes(other._reasons)[numpy.asarray(theirs.reasons, dtype='intp')]
+                seen = ours.seen
+                ours.seen += theirs.seen
+
+                if not self.sample or self.limit is None or ours.seen <= self.limit:
+                    room = len(positions) if self.limit is None else max(self.limit - len(ours), 0)
+                    ours.positions.extend(positions[:room].tolist())
+                    ours.values.extend(theirs.values[:room])
+                    ours.reasons.extend(reasons[:room].tolist())
+                    continue
+
+                # both sides hold uniform samples; draw how many of the union's sample come from each side
+                from_ours = int(self._rng.hypergeometric(seen, theirs.seen, self.limit))
+                keep_ours = numpy.sort(self._rng.choice(len(ours), from_ours, replace=False))
+                keep_theirs = numpy.sort(self._rng.choice(len(positions), self.limit - from_ours, replace=False))
+
+                merged = _ColumnRejections()
+                merged.seen = ours.seen
+                merged.positions.extend([ours.positions[i] for i in keep_ours] + positions[keep_theirs].tolist())
+                merged.values.extend([ours.values[i] for i in keep_ours] + [theirs.values[i] for i in keep_theirs])
+                merged.reasons.extend([ours.reasons[i] for i in keep_ours] + reasons[keep_theirs].tolist())
+                self._columns[column] = merged
+
+    def counts(self) -> pandas.DataFrame:
+        """
+        :return: exact number of rejections per column and reason, in the order of to_frame()
+        """
+        columns, reasons = self._ordered({column for column, _ in self._counts}, {reason for _, reason in self._counts})
+        return pandas.DataFrame(
+            [(column, reason, self._counts[column, reason])
+             for column in columns for reason in reasons if (column, reason) in self._counts],
+            columns=['column_name', 'reason', 'count'],
+        )
+
+    def values(self, column: str) -> list[str | None]:
+        """
+        :return: stored rejected values of a column in row order
+        """
+        frame = self.to_frame()
+        return frame.loc[frame['column_name'] == column, 'value'].tolist()
+
+    @staticmethod
+    def _ordered(columns, reasons) -> tuple[list[str], list[str]]:
+        # columns and reasons in the order of the cleaners and of wrangling_utils.REASONS, not in the order they were
+        # first rejected, which differs between a whole clean() and chunks merged back; any others follow, by name
+        from source.wrangling_utils import REASONS, ROW_CLEANERS
+
+        def ordered(names, order):
+            positions = {name: i for i, name in enumerate(order)}
+            return sorted(names, key=lambda name: (positions.get(name, len(positions)), name))
+
+        return ordered(columns, ROW_CLEANERS), ordered(reasons, REASONS)
+
+    def to_frame(self) -> pandas.DataFrame:
+        """
+        :return: stored rejections, one row each, ordered by column, as in wrangling_utils.ROW_CLEANERS, then row
+        position
+        """
+        columns, reasons = self._ordered(self._columns, self._reasons)
+        frames = []
+        for column in columns:
+            rejections = self._columns[column]
+            frames.append(pandas.DataFrame({
+                'column_name': column,
+                'row': numpy.asarray(rejections.positions, dtype='int64'),
+                'value': pandas.Series(rejections.values, dtype=object),
+                'reason': pandas.Categorical.from_codes(numpy.asarray(rejections.reasons), categories=self._reasons),
+            }).sort_values('row', kind='stable'))
+
+        if not frames:
+            return pandas.DataFrame({
+                'column_name': pandas.Categorical([]),
+                'row': pandas.Series(dtype='int64'),
+                'value': pandas.Series(dtype=object),
+                'reason': pandas.Categorical([]),
+            })
+
+        frame = pandas.concat(frames, ignore_index=True)
+        frame['column_name'] = pandas.Categorical(frame['column_name'], categories=columns)
+        frame['reason'] = pandas.Categorical(frame['reason'].astype(object), categories=reasons)
+        return frame
+
+    def to_parquet(self, path) -> None:
+        """
+        Writes the stored rejections to a Parquet file
+        :param path: file to write
+        """
+        # imported here, so clean() doesn't load DuckDB unless rejections are exported
+        import duckdb
+
+        frame = self.to_frame()
+        with duckdb.connect() as connection:
+            connection.register('rejections', frame)
+            escaped = str(path).replace("'", "''")
+            connection.execute(f"COPY rejections TO '{escaped}' (FORMAT PARQUET)")
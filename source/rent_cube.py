@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+
+import duckdb
+import pandas
+
+from source import wrangling_utils
+from source.duckdb_loader import listings_schema
+
+DEFAULT_CUBE = Path('data') / 'rent_cube.duckdb'
+
+# Finest grouping of the cube; every rollup groups by some of these
+DIMENSIONS = ('state', 'cityname', 'bedrooms', 'bathrooms', 'pets_allowed', 'price_type')
+
+# Rollup tables (rollup_<name>) and their grouping; prices of different price_types don't mix
+ROLLUPS = {
+    'national': ('price_type',),
+    'state': ('state', 'price_type'),
+    'city': ('state', 'cityname', 'price_type'),
+    'state_bedrooms': ('state', 'bedrooms', 'price_type'),
+    'city_bedrooms': ('state', 'cityname', 'bedrooms', 'price_type'),
+    'bedrooms_bathrooms': ('bedrooms', 'bathrooms', 'price_type'),
+    'state_pets': ('state', 'pets_allowed', 'price_type'),
+}
+
+# Quantiles in the rollups, by column suffix; the value of rank floor(q * (n - 1)), as numpy's 'lower' method
+QUANTILES = {'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+# Relative error of the sketched quantiles: a value x is counted in bucket ceil(log(x) / log(gamma)), and a bucket
+# reads back as the value at most this far from everything in it
+SKETCH_ACCURACY = 0.01
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+# Sketched metric and its SQL expression over the listings; only positive values are sketched
+_METRICS = {'price': 'price', 'price_per_sqft': 'CASE WHEN square_feet > 0 THEN price / square_feet END'}
+
+
+def _sql_string(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _sql_identifier(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _keys(dims) -> str:
+    return ', '.join(_sql_identifier(col) for col in dims)
+
+
+def _matches(left: str, right: str, dims) -> str:
+    # join condition on the grouping columns that pairs NULL with NULL, as GROUP BY does
+    return ' AND '.join(f'{left}.{key} IS NOT DISTINCT FROM {right}.{key}' for key in map(_sql_identifier, dims))
+
+
+def _create_cube(connection: duckdb.DuckDBPyConnection) -> None:
+    schema = listings_schema()
+    dims = ', '.join(f'{_sql_identifier(col)} {schema[col]}' for col in DIMENSIONS)
+    connection.execute(f'CREATE TABLE IF NOT EXISTS cube_cells (cell INTEGER PRIMARY KEY, {dims}, listings BIGINT, '
+                       f'price_count BIGINT, price_sum DOUBLE, price_min DOUBLE, price_max DOUBLE, '
+                       f'price_per_sqft_count BIGINT, price_per_sqft_sum DOUBLE)')
+    connection.execute('CREATE TABLE IF NOT EXISTS cube_sketches (cell INTEGER, metric VARCHAR, bucket INTEGER, '
+                       'count BIGINT, PRIMARY KEY (cell, metric, bucket))')
+    # the rollups kept up to date, and their grouping
+    connection.execute('CREATE TABLE IF NOT EXISTS cube_rollups (name VARCHAR PRIMARY KEY, dims VARCHAR[])')
+    # ids of the listings counted, so a listing added again is not counted twice
+    connection.execute('CREATE TABLE IF NOT EXISTS cube_ids (id BIGINT PRIMARY KEY)')
+    # what the update in progress added: the cells it touched, and its sketch buckets by cell
+    connection.execute('CREATE OR REPLACE TEMP TABLE touched (cell INTEGER)')
+    connection.execute(f'CREATE OR REPLACE TEMP TABLE new_sketches ({dims}, metric VARCHAR, bucket INTEGER, '
+                       f'count BIGINT)')
+
+
+def _add_chunk(connection: duckdb.DuckDBPyConnection, chunk: pandas.DataFrame) -> int:
+    # the chunk's cells and sketch buckets are added to the cube's in place, new cells taking the next free ids; only
+    # the first of the listings of an id is counted, and listings without an id are counted each time
+    keys = _keys(DIMENSIONS)
+    ratio = _METRICS['price_per_sqft']
+    connection.register('incoming', chunk)
+    connection.execute('''
+        CREATE OR REPLACE TEMP TABLE chunk AS
+        SELECT * FROM incoming
+        WHERE id IS NULL OR NOT EXISTS (SELECT 1 FROM cube_ids WHERE cube_ids.id = incoming.id)
+        QUALIFY id IS NULL OR row_number() OVER (PARTITION BY id) = 1
+    ''')
+    connection.unregister('incoming')
+    connection.execute('INSERT INTO cube_ids SELECT id FROM chunk WHERE id IS NOT NULL')
+    connection.execute(f'''
+        CREATE OR REPLACE TEMP TABLE chunk_cells AS
+        WITH grouped AS (
+            SELECT {keys}, count(*) AS listings, count(price) AS price_count, coalesce(sum(price), 0) AS price_sum,
+                min(price) AS price_min, max(price) AS price_max, count({ratio}) AS price_per_sqft_count,
+                coalesce(sum({ratio}), 0) AS price_per_sqft_sum
+            FROM chunk GROUP BY ALL
+        ),
+        known AS (
+            SELECT grouped.*, cube_cells.cell
+            FROM grouped LEFT JOIN cube_cells ON {_matches('grouped', 'cube_cells', DIMENSIONS)}
+        )
+        SELECT * REPLACE (coalesce(cell, (SELECT coalesce(max(cell), 0) FROM cube_cells)
+                                         + row_number() OVER (PARTITION BY cell IS NULL))::INTEGER AS cell)
+        FROM known
+    ''')
+    columns = f'cell, {keys}, listings, price_count, price_sum, price_min, price_max, price_per_sqft_count, ' \
+              f'price_per_sqft_sum'
+    connection.execute(f'''
+        INSERT INTO cube_cells ({columns}) SELECT {columns} FROM chunk_cells
+        ON CONFLICT (cell) DO UPDATE SET
+            listings = cube_cells.listings + excluded.listings,
+            price_count = cube_cells.price_count + excluded.price_count,
+            price_sum = cube_cells.price_sum + excluded.price_sum,
+            price_min = least(cube_cells.price_min, excluded.price_min),
+            price_max = greatest(cube_cells.price_max, excluded.price_max),
+            price_per_sqft_count = cube_cells.price_per_sqft_count + excluded.price_per_sqft_count,
+            price_per_sqft_sum = cube_cells.price_per_sqft_sum + excluded.price_per_sqft_sum
+    ''')
+    connection.execute('CREATE OR REPLACE TEMP TABLE chunk_sketches AS ' + ' UNION ALL '.join(
+        f"SELECT {keys}, '{metric}' AS metric, ceil(ln({value}) / ln({_GAMMA}))::INTEGER AS bucket, "
+        f"count(*) AS count FROM chunk WHERE {value} > 0 GROUP BY ALL"
+        for metric, value in _METRICS.items()
+    ))
+    connection.execute(f'''
+        INSERT INTO cube_sketches (cell, metric, bucket, count)
+        SELECT chunk_cells.cell, chunk_sketches.metric, chunk_sketches.bucket, chunk_sketches.count
+        FROM chunk_sketches JOIN chunk_cells ON {_matches('chunk_sketches', 'chunk_cells', DIMENSIONS)}
+        ON CONFLICT (cell, metric, bucket) DO UPDATE SET count = cube_sketches.count + excluded.count
+    ''')
+    connection.execute('INSERT INTO new_sketches SELECT * FROM chunk_sketches')
+    connection.execute('INSERT INTO touched SELECT cell FROM chunk_cells')
+    added, = connection.execute('SELECT count(*) FROM chunk').fetchone()
+    return added
+
+
+def _rollup_query(dims, scope: str, sketch: str) -> str:
+    # statistics of the groups of the cells in scope, from their sums and the groups' sketch, in which a quantile q is
+    # the first bucket whose running count passes rank q * (n - 1)
+    keys = _keys(dims)
+    buckets = ', '.join(
+        f"min(bucket) FILTER (WHERE metric = '{metric}' AND running > {q} * (total - 1)) "
+        f'AS {_sql_identifier(f"{metric}_{suffix}")}'
+        for metric in _METRICS for suffix, q in QUANTILES.items()
+    )
+    values = ', '.join(
+        f'2 * pow({_GAMMA}, quantiles.{_sql_identifier(f"{metric}_{suffix}")}) / ({_GAMMA} + 1) '
+        f'AS {_sql_identifier(f"{metric}_{suffix}")}'
+        for metric in _METRICS for suffix in QUANTILES
+    )
+    return f'''
+        WITH groups AS (
+            SELECT {keys}, sum(listings)::BIGINT AS listings, sum(price_count)::BIGINT AS priced_listings,
+                sum(price_sum) / nullif(sum(price_count), 0) AS price_mean, min(price_min) AS price_min,
+                max(price_max) AS price_max,
+                sum(price_per_sqft_sum) / nullif(sum(price_per_sqft_count), 0) AS price_per_sqft_mean
+            FROM cube_cells {scope} GROUP BY ALL
+        ),
+        ranked AS (
+            SELECT *, sum(count) OVER (PARTITION BY {keys}, metric ORDER BY bucket) AS running,
+                sum(count) OVER (PARTITION BY {keys}, metric) AS total
+            FROM {sketch}
+        ),
+        quantiles AS (
+            SELECT {keys}, {buckets} FROM ranked GROUP BY ALL
+        )
+        SELECT groups.*, {values}
+        FROM groups LEFT JOIN quantiles ON {_matches('groups', 'quantiles', dims)}
+    '''
+
+
+def _build_rollup(connection: duckdb.DuckDBPyConnection, name: str, dims) -> None:
+    # the rollup and its sketch (sketch_<name>, the buckets summed per group) from the whole cube
+    table, sketch = _sql_identifier(f'rollup_{name}'), _sql_identifier(f'sketch_{name}')
+    connection.execute(f'CREATE OR REPLACE TABLE {sketch} AS SELECT {_keys(dims)}, metric, bucket, '
+                       f'sum(count)::BIGINT AS count FROM cube_sketches JOIN cube_cells USING (cell) GROUP BY ALL')
+    connection.execute(f'CREATE OR REPLACE TABLE {table} AS {_rollup_query(dims, "", sketch)}')
+    connection.execute('INSERT OR REPLACE INTO cube_rollups VALUES (?, ?)', [name, list(dims)])
+
+
+def _refresh_rollup(connection: duckdb.DuckDBPyConnection, name: str, dims) -> None:
+    # only the groups of the touched cells changed: their sketch buckets and the update's are summed, and their rows
+    # recomputed
+    table, sketch = _sql_identifier(f'rollup_{name}'), _sql_identifier(f'sketch_{name}')
+    keys = _keys(dims)
+    connection.execute(f'CREATE OR REPLACE TEMP TABLE touched_groups AS SELECT DISTINCT {keys} FROM cube_cells '
+                       f'WHERE cell IN (SELECT cell FROM touched)')
+
+    def touched(relation: str) -> str:
+        return f'EXISTS (SELECT 1 FROM touched_groups WHERE {_matches(relation, "touched_groups", dims)})'
+
+    connection.execute(f'''
+        CREATE OR REPLACE TEMP TABLE touched_sketch AS
+        SELECT {keys}, metric, bucket, sum(count)::BIGINT AS count
+        FROM (
+            SELECT * FROM {sketch} WHERE {touched(sketch)}
+            UNION ALL BY NAME
+            SELECT {keys}, metric, bucket, count FROM new_sketches
+        )
+        GROUP BY ALL
+    ''')
+    connection.execute(f'DELETE FROM {sketch} WHERE {touched(sketch)}')
+    connection.execute(f'INSERT INTO {sketch} BY NAME SELECT * FROM touched_sketch')
+    connection.execute(f'DELETE FROM {table} WHERE {touched(table)}')
+    scope = f'WHERE {touched("cube_cells")}'
+    connection.execute(f'INSERT INTO {table} {_rollup_query(dims, scope, "touched_sketch")}')
+
+
+def update_cube(chunks: pandas.DataFrame | Iterable[pandas.DataFrame], cube=DEFAULT_CUBE,
+                rollups: dict[str, tuple] | None = None) -> dict[str, int]:
+    """
+    Adds cleaned listings to the rent cube and brings its rollup tables up to date, so dashboards read counts, means
+    and quantiles of price and price per square foot from small tables instead of grouping the listings.
+
+    The cube keeps, per combination of DIMENSIONS, counts and sums and a sketch of each metric: counts per log-sized
+    bucket, which add up across chunks and give the quantiles within SKETCH_ACCURACY. New listings are added to these
+    in place, and each rollup only recomputes the groups they fall in, from its own sketch summed per group, so an
+    update costs in the new listings and the groups they touch rather than in all the listings seen before. A listing
+    is counted once per id, as first added; listings without an id are counted each time they are added.
+    :param chunks: dataframe from clean() or cast(), or an iterable of them, e.g. streaming.clean_chunks()
+    :param cube: DuckDB database file of the cube
+    :param rollups: rollups to add to the cube, as ROLLUPS, built in full from the cube; the rollups already in it
+    are kept up to date either way
+    :return: listings added, not counting ids already in the cube, and rows of the cube's cells and sketches
+    """
+    if isinstance(chunks, pandas.DataFrame):
+        chunks = [chunks]
+    rollups = ROLLUPS if rollups is None else rollups
+    for name, dims in rollups.items():
+        unknown = [col for col in dims if col not in DIMENSIONS]
+        if unknown:
+            raise KeyError(f'rollup {name!r} groups by {unknown}, which are not cube dimensions')
+
+    Path(cube).parent.mkdir(parents=True, exist_ok=True)
+    added = 0
+    columns = ['id', *DIMENSIONS, 'price', 'square_feet']
+    with duckdb.connect(str(cube)) as connection:
+        _create_cube(connection)
+        connection.execute('BEGIN TRANSACTION')
+        for chunk in chunks:
+            if len(chunk):
+                added += _add_chunk(connection, chunk[columns].astype({col: wrangling_utils.CAST_DTYPES[col]
+                                                                       for col in columns}))
+
+        kept = dict(connection.execute('SELECT name, dims FROM cube_rollups').fetchall())
+        for name, dims in kept.items():
+            if name not in rollups or tuple(rollups[name]) == tuple(dims):
+                _refresh_rollup(connection, name, dims)
+        for name, dims in rollups.items():
+            if name not in kept or tuple(kept[name]) != tuple(dims):
+                _build_rollup(connection, name, dims)
+        connection.execute('COMMIT')
+        cells, = connection.execute('SELECT count(*) FROM cube_cells').fetchone()
+        buckets, = connection.execute('SELECT count(*) FROM cube_sketches').fetchone()
+    return {'added': added, 'cells': cells, 'sketch_buckets': buckets}
+
+
+def read_rollup(name: str, cube=DEFAULT_CUBE) -> pandas.DataFrame:
+    """
+    :param name: rollup, a key of ROLLUPS
+    :param cube: DuckDB database file of the cube
+    :return: the rollup's table: listings, priced_listings, and price_* and price_per_sqft_* statistics per group
+    """
+    with duckdb.connect(str(cube), read_only=True) as connection:
+        tables = {table for table, in connection.execute('SHOW TABLES').fetchall()}
+        if f'rollup_{name}' not in tables:
+            raise KeyError(f'no rollup {name!r} in {cube}')
+        return connection.execute(f'SELECT * FROM {_sql_identifier(f"rollup_{name}")} ORDER BY ALL').df()
+
+
+def export_rollups(directory, cube=DEFAULT_CUBE) -> list[Path]:
+    """
+    Writes each rollup table of the cube to <directory>/<name>.parquet, for dashboards that read Parquet
+    :param directory: directory to write to
+    :param cube: DuckDB database file of the cube
+    :return: files written
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    with duckdb.connect(str(cube), read_only=True) as connection:
+        tables = sorted(table for table, in connection.execute('SHOW TABLES').fetchall()
+                        if table.startswith('rollup_'))
+        for table in tables:
+            path = directory / f'{table.removeprefix("rollup_")}.parquet'
+            connection.execute(f'COPY {_sql_identifier(table)} TO {_sql_string(path)} (FORMAT PARQUET)')
+            paths.append(path)
+    return paths
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy
+import pandas
+
+from source.rent_service import LATENCY_TARGETS_MS, fixture_listings
+from source.snapshots import write_snapshot
+
+
+def make_queries(listings: pandas.DataFrame, count: int = 1_000, seed: int = 0) -> list[dict]:
+    """
+    Queries like the service gets: half by city, bedrooms and square feet, half by a point near a listing
+    :param listings: cleaned listings the service answers from
+    :param count: distinct queries
+    :param seed: random seed
+    :return: query per element
+    """
+    rng = numpy.random.default_rng(seed)
+    listings = listings.dropna(subset=['cityname', 'latitude', 'longitude'])
+    picks = listings.iloc[rng.integers(0, len(listings), count)]
+    queries = []
+    for i, row in enumerate(picks.itertuples(index=False)):
+        query = {'bedrooms': int(row.bedrooms) if pandas.notna(row.bedrooms) else None,
+                 'square_feet': float(rng.integers(4, 20) * 100)}
+        if i % 2:
+            query.update(latitude=float(row.latitude) + rng.normal(0, 0.01),
+                         longitude=float(row.longitude) + rng.normal(0, 0.01),
+                         radius_km=float(rng.choice([2.0, 5.0, 10.0])))
+        else:
+            query.update(city=row.cityname, state=row.state)
+        queries.append({field: value for field, value in query.items() if pandas.notna(value)})
+    return queries
+
+
+def _connect(address) -> http.client.HTTPConnection:
+    # no Nagle delay between a request's headers and its body
+    connection = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+    connection.connect()
+    connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return connection
+
+
+def _request(connection: http.client.HTTPConnection, method: str, path: str, body=None):
+    data = None if body is None else json.dumps(body).encode()
+    connection.request(method, path, body=data, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    payload = response.read()
+    if response.status >= 400:
+        raise RuntimeError(f'{method} {path} answered {response.status}: {payload[:200]!r}')
+    return json.loads(payload)
+
+
+def run_load(url: str, queries: list[dict], concurrency: int = 8, duration: float = 10.0, batch: int = 1,
+             reload_every: float | None = None, snapshots: list | None = None) -> dict:
+    """
+    Sends queries to a running service from concurrent keep-alive clients for a while, each request timed from sending
+    to the full answer
+    :param url: service address, e.g. http://127.0.0.1:8765
+    :param queries: queries to cycle through
+    :param concurrency: clients sending at once
+    :param duration: seconds to send for
+    :param batch: queries per request; above 1 they are POSTed as a list, and a request's latency is its batch's
+    :param reload_every: seconds between POST /reload, to check lookups carry on through reloads
+    :param snapshots: snapshots to reload, in turn; the service's default snapshot by default
+    :return: requests, errors, throughput, latency percentiles in ms and whether they meet LATENCY_TARGETS_MS, reloads
+    and the versions answered from
+    """
+    address = urlparse(url)
+    deadline = time.perf_counter() + duration
+    latencies, errors, versions = [], [], set()
+    lock = threading.Lock()
+
+    def client(number: int):
+        connection = _connect(address)
+        mine, seen, position = [], set(), number * 7919
+        while time.perf_counter() < deadline:
+            chosen = [queries[(position + i) % len(queries)] for i in range(batch)]
+            position += batch
+            start = time.perf_counter()
+            try:
+                answer = _request(connection, 'POST', '/comparables', chosen if batch > 1 else chosen[0])
+            except Exception as error:
+                with lock:
+                    errors.append(repr(error))
+                connection.close()
+                connection = _connect(address)
+                continue
+            mine.append(time.perf_counter() - start)
+            seen.update(item['version'] for item in (answer if batch > 1 else [answer]))
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            versions.update(seen)
+
+    reloads = 0
+
+    def reloader():
+        nonlocal reloads
+        connection = _connect(address)
+        while time.perf_counter() + reload_every < deadline:
+            time.sleep(reload_every)
+            body = {'snapshot': str(snapshots[reloads % len(snapshots)])} if snapshots else {}
+            _request(connection, 'POST', '/reload', body)
+            reloads += 1
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(concurrency)]
+    if reload_every:
+        threads.append(threading.Thread(target=reloader))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = numpy.array(latencies) * 1000
+    percentiles = {name: float(numpy.percentile(latencies, float(name[1:]))) if len(latencies) else None
+                   for name in LATENCY_TARGETS_MS}
+    return {
+        'requests': len(latencies),
+        'lookups': len(latencies) * batch,
+        'errors': len(errors),
+        'first_errors': errors[:3],
+        'requests_per_sec': len(latencies) / elapsed,
+        'latency_ms': percentiles,
+        'targets_ms': LATENCY_TARGETS_MS,
+        'meets_targets': all(percentiles[name] is not None and percentiles[name] <= target
+                             for name, target in LATENCY_TARGETS_MS.items()),
+        'reloads': reloads,
+        'versions': sorted(versions),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    address = urlparse(url)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'the service exited with {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection(address.hostname, address.port, timeout=1)
+            _request(connection, 'GET', '/health')
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f'the service at {url} did not come up in {timeout:.0f}s')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Load-tests the rent lookup service against its latency targets.')
+    parser.add_argument('--url', help='running service; by default one is started on fixture snapshots')
+    parser.add_argument('--fixture', type=int, default=20_000, help='listings per fixture snapshot')
+    parser.add_argument('--queries', type=int, default=1_000, help='distinct queries to cycle through')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--batch', type=int, default=1, help='queries per request')
+    parser.add_argument('--reload-every', type=float, metavar='SECONDS', help='hot-reload a snapshot this often')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        process, snapshots = None, None
+        fixture = fixture_listings(args.fixture)
+        url = args.url
+        if url is None:
+            # two fixture snapshots to alternate between on reload
+            snapshots = [Path(scratch) / f'fixture-{seed}' for seed in (0, 1)]
+            for seed, directory in enumerate(snapshots):
+                write_snapshot(fixture if seed == 0 else fixture_listings(args.fixture, seed=seed), directory)
+            port = _free_port()
+            url = f'http://127.0.0.1:{port}'
+            process = subprocess.Popen([sys.executable, '-m', 'source.rent_service', '--snapshot', str(snapshots[0]),
+                                        '--port', str(port)], stdout=subprocess.DEVNULL)
+        try:
+            if process is not None:
+                _wait_until_up(url, process)
+            result = run_load(url, make_queries(fixture, args.queries), args.concurrency, args.duration, args.batch,
+                              args.reload_every, snapshots)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    print(json.dumps(result, indent=2))
+    return 0 if result['meets_targets'] and not result['errors'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
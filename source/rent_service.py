@@ -0,0 +1,525 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlparse
+
+import numpy
+import pandas
+
+from source import wrangling_utils
+from source.normalizer_cache import LRUCache
+from source.snapshots import DEFAULT_SNAPSHOT, MANIFEST, read_snapshot
+from source.spatial import SpatialIndex
+
+DEFAULT_PORT = 8765
+
+# Latency of a lookup, from the request to its answer, the service is held to under load (rent_load.py)
+LATENCY_TARGETS_MS = {'p50': 5.0, 'p99': 50.0}
+
+# Fields of a query and their types; a query names a city, a point, or both
+QUERY_FIELDS = {
+    'city': str,
+    'state': str,
+    'bedrooms': int,
+    'square_feet': float,
+    'latitude': float,
+    'longitude': float,
+    'radius_km': float,
+    'k': int,
+}
+DEFAULT_RADIUS_KM = 5.0
+DEFAULT_K = 10
+
+# Columns the index keeps
+_COLUMNS = ['id', 'price', 'square_feet', 'bedrooms', 'cityname', 'state', 'latitude', 'longitude']
+
+_log = logging.getLogger(__name__)
+
+
+def parse_query(raw: dict) -> tuple:
+    """
+    Checks a query and puts it in canonical form, so equal queries share a cache entry
+    :param raw: query fields, e.g. {'city': 'Austin', 'bedrooms': 2, 'square_feet': 900}
+    :return: sorted (field, value) pairs, with city and state lowercased
+    """
+    if not isinstance(raw, dict):
+        raise ValueError(f'a query is an object of fields, not {type(raw).__name__}')
+    unknown = sorted(set(raw) - set(QUERY_FIELDS))
+    if unknown:
+        raise ValueError(f'unknown query fields {unknown}; use {list(QUERY_FIELDS)}')
+    query = {}
+    for field, value in raw.items():
+        if value is None or value == '':
+            continue
+        try:
+            value = QUERY_FIELDS[field](value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} must be {QUERY_FIELDS[field].__name__}, not {value!r}') from None
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f'{field} must be finite, not {value!r}')
+        query[field] = value.strip().lower() if isinstance(value, str) else value
+    if ('latitude' in query) != ('longitude' in query):
+        raise ValueError('latitude and longitude go together')
+    if 'city' not in query and 'latitude' not in query:
+        raise ValueError('a query needs a city or a latitude and longitude')
+    if query.get('radius_km', DEFAULT_RADIUS_KM) <= 0 or query.get('k', DEFAULT_K) <= 0:
+        raise ValueError('radius_km and k must be positive')
+    return tuple(sorted(query.items()))
+
+
+def _number(x) -> float | None:
+    # JSON has no NaN
+    return None if x is None or numpy.isnan(x) else float(x)
+
+
+class RentIndex:
+    """
+    Priced listings held as numpy arrays for comparables queries: rows by city from one sort, and a SpatialIndex over
+    their coordinates. Immutable once built, so lookups can read it from any thread while a new one is loaded.
+    """
+
+    def __init__(self, listings: pandas.DataFrame, version: str = ''):
+        """
+        :param listings: dataframe from cast(), or clean() to be cast; listings without a positive price are left out
+        :param version: name of the data, e.g. the snapshot's write time
+        """
+        listings = wrangling_utils.cast(listings[_COLUMNS], copy=False)
+        price = listings['price'].to_numpy(dtype='float64', na_value=numpy.nan)
+        listings = listings[price > 0]
+        self.version = version
+        self.loaded_at = time.time()
+        self.ids = listings['id'].to_numpy(dtype='int64', na_value=-1)
+        self.price = price[price > 0]
+        self.square_feet = listings['square_feet'].to_numpy(dtype='float64', na_value=numpy.nan)
+        self.bedrooms = listings['bedrooms'].to_numpy(dtype='int64', na_value=-1)
+        self.latitude = listings['latitude'].to_numpy(dtype='float64', na_value=numpy.nan)
+        self.longitude = listings['longitude'].to_numpy(dtype='float64', na_value=numpy.nan)
+        self.cityname = listings['cityname'].to_numpy(dtype=object, na_value=None)
+        self.state = listings['state'].to_numpy(dtype=object, na_value=None)
+        self._states = listings['state'].str.lower().to_numpy(dtype=object, na_value=None)
+
+        # rows of each lowercase city name, sorted by row
+        codes, cities = pandas.factorize(listings['cityname'].str.lower())
+        order = numpy.argsort(codes, kind='stable')
+        bounds = numpy.searchsorted(codes[order], numpy.arange(len(cities) + 1))
+        self._cities = {city: order[bounds[i]:bounds[i + 1]] for i, city in enumerate(cities)}
+        self.spatial = SpatialIndex(self.latitude, self.longitude)
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    @classmethod
+    def from_snapshot(cls, directory=DEFAULT_SNAPSHOT) -> RentIndex:
+        """
+        :param directory: snapshot written by snapshots.write_snapshot()
+        :return: index of the snapshot's listings, versioned by its write time
+        """
+        manifest = json.loads((Path(directory) / MANIFEST).read_text())
+        return cls(read_snapshot(directory, columns=_COLUMNS), version=f'{directory}@{manifest["written_at"]}')
+
+    def query_batch(self, queries: list[tuple]) -> list[dict]:
+        """
+        Answers several queries at once; the queries with a point share one KD-tree search per radius
+        :param queries: from parse_query()
+        :return: answer per query, as query() gives
+        """
+        queries = [dict(query) for query in queries]
+        candidates = [None] * len(queries)
+        by_radius = {}
+        for i, query in enumerate(queries):
+            if 'latitude' in query:
+                by_radius.setdefault(query.get('radius_km', DEFAULT_RADIUS_KM), []).append(i)
+            else:
+                candidates[i] = (self._cities.get(query['city'], numpy.empty(0, dtype='intp')), None)
+        for radius, located in by_radius.items():
+            found = self.spatial.radius([queries[i]['latitude'] for i in located],
+                                        [queries[i]['longitude'] for i in located], radius)
+            for i, (distances, rows) in zip(located, found):
+                candidates[i] = (rows, distances)
+        return [self._answer(query, *found) for query, found in zip(queries, candidates)]
+
+    def query(self, query: dict) -> dict:
+        """
+        Comparable listings and price statistics, e.g. for {'city': 'Austin', 'bedrooms': 2, 'square_feet': 900}
+        :param query: fields of QUERY_FIELDS; listings match on city (or within radius_km of the point), state and
+        bedrooms, and the k most alike by square feet and distance are the comparables
+        :return: version, count and price statistics of the matching listings, the estimated rent for square_feet, and
+        the comparables
+        """
+        return self.query_batch([parse_query(query)])[0]
+
+    def _answer(self, query: dict, rows: numpy.ndarray, distances: numpy.ndarray | None) -> dict:
+        keep = numpy.ones(len(rows), dtype=bool)
+        if 'state' in query:
+            keep &= self._states[rows] == query['state']
+        if 'city' in query and distances is not None:
+            keep &= numpy.isin(rows, self._cities.get(query['city'], numpy.empty(0, dtype='intp')))
+        if 'bedrooms' in query:
+            keep &= self.bedrooms[rows] == query['bedrooms']
+        rows = rows[keep]
+
+        price = self.price[rows]
+        square_feet = self.square_feet[rows]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            per_sqft = price / numpy.where(square_feet > 0, square_feet, numpy.nan)
+        per_sqft = per_sqft[~numpy.isnan(per_sqft)]
+        median_per_sqft = float(numpy.median(per_sqft)) if len(per_sqft) else None
+
+        # most alike first: relative difference in square feet (unknown last), plus distance as a share of the radius
+        score = numpy.zeros(len(rows))
+        if 'square_feet' in query:
+            score += numpy.nan_to_num(numpy.abs(square_feet - query['square_feet']) / query['square_feet'],
+                                      nan=numpy.inf)
+        if distances is not None:
+            distances = distances[keep]
+            score += distances / query.get('radius_km', DEFAULT_RADIUS_KM)
+        top = numpy.argsort(score, kind='stable')[:query.get('k', DEFAULT_K)]
+
+        return {
+            'version': self.version,
+            'count': len(rows),
+            'price': {
+                'mean': float(price.mean()) if len(price) else None,
+                **{name: float(numpy.quantile(price, q)) if len(price) else None
+                   for name, q in (('p25', 0.25), ('median', 0.5), ('p75', 0.75))},
+            },
+            'price_per_sqft_median': median_per_sqft,
+            'estimate': median_per_sqft * query['square_feet']
+            if median_per_sqft is not None and 'square_feet' in query else None,
+            'comparables': [{
+                'id': int(self.ids[row]),
+                'price': float(self.price[row]),
+                'square_feet': _number(self.square_feet[row]),
+                'bedrooms': None if self.bedrooms[row] < 0 else int(self.bedrooms[row]),
+                'cityname': self.cityname[row],
+                'state': self.state[row],
+                'latitude': _number(self.latitude[row]),
+                'longitude': _number(self.longitude[row]),
+                'distance_km': None if distances is None else float(distances[i]),
+            } for i, row in zip(top, rows[top])],
+        }
+
+
+class RentService:
+    """
+    Long-running lookups over a RentIndex. Lookups go through a bounded result cache, and the misses of concurrent
+    callers are answered together: one thread takes every query waiting in the queue, up to max_batch, as one batch.
+    A new index is swapped in whole, so lookups keep being answered while it loads, each from one version.
+    """
+
+    def __init__(self, index: RentIndex, cache_size: int = 10_000, max_batch: int = 64,
+                 latency_window: int = 100_000):
+        """
+        :param index: listings to answer from
+        :param cache_size: answers to keep, least recently used first out; 0 disables the cache
+        :param max_batch: most queries answered in one batch
+        :param latency_window: latest lookups the latency percentiles are over
+        """
+        self.index = index
+        self.cache = LRUCache(cache_size)
+        self.reload_error = None
+        self.max_batch = max_batch
+        self.batches = 0
+        self.batched = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._batcher = threading.Thread(target=self._run_batches, name='rent-batcher', daemon=True)
+        self._batcher.start()
+
+    def _run_batches(self) -> None:
+        while (item := self._queue.get()) is not None:
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            index = self.index
+            try:
+                answers = index.query_batch([query for query, _ in batch])
+            except Exception:
+                # answer the queries one by one, so a query that fails fails only its own lookup
+                for query, future in batch:
+                    try:
+                        future.set_result(index.query_batch([query])[0])
+                    except Exception as error:
+                        future.set_exception(error)
+            else:
+                for (_, future), answer in zip(batch, answers):
+                    future.set_result(answer)
+            with self._lock:
+                self.batches += 1
+                self.batched += len(batch)
+
+    def lookup_many(self, queries: list[dict]) -> list[dict]:
+        """
+        :param queries: queries as RentIndex.query() takes them
+        :return: answer per query
+        """
+        start = time.perf_counter()
+        queries = [parse_query(query) for query in queries]
+        version = self.index.version
+        answers, pending = [None] * len(queries), []
+        for i, query in enumerate(queries):
+            cached = self.cache.get((version, query))
+            if cached is None:
+                future = Future()
+                self._queue.put((query, future))
+                pending.append((i, query, future))
+            else:
+                answers[i] = cached
+        for i, query, future in pending:
+            answers[i] = future.result()
+            # keyed by the version that answered, which a reload may have changed meanwhile
+            self.cache.put((answers[i]['version'], query), answers[i])
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latencies.extend([elapsed] * len(queries))
+        return answers
+
+    def lookup(self, query: dict) -> dict:
+        """
+        :param query: as RentIndex.query() takes it
+        :return: its answer
+        """
+        return self.lookup_many([query])[0]
+
+    def reload(self, index: RentIndex) -> str:
+        """
+        Swaps in a new index; lookups already batched finish on the old one
+        :param index: listings to answer from
+        :return: version of the new index
+        """
+        self.index = index
+        return index.version
+
+    def reload_snapshot(self, directory=DEFAULT_SNAPSHOT) -> str:
+        """
+        Loads a snapshot and swaps it in, answering from the old index meanwhile; one reload at a time
+        :param directory: snapshot written by snapshots.write_snapshot()
+        :return: version of the new index
+        """
+        with self._reload_lock:
+            return self.reload(RentIndex.from_snapshot(directory))
+
+    def reload_in_background(self, directory=DEFAULT_SNAPSHOT) -> None:
+        """
+        reload_snapshot() for a thread no caller waits on: a failure is logged and kept in reload_error (see stats())
+        and the old index keeps answering
+        :param directory: snapshot written by snapshots.write_snapshot()
+        """
+        try:
+            self.reload_snapshot(directory)
+        except Exception as error:
+            _log.exception('reloading %s failed; still answering from %s', directory, self.index.version)
+            self.reload_error = f'{directory}: {type(error).__name__}: {error}'
+        else:
+            self.reload_error = None
+
+    def watch(self, directory=DEFAULT_SNAPSHOT, interval: float = 5.0) -> threading.Event:
+        """
+        Reloads the snapshot whenever it is written again, checking its manifest every interval seconds; a reload that
+        fails is logged and the next write of the snapshot is loaded again
+        :param directory: snapshot to watch
+        :param interval: seconds between checks
+        :return: event to set to stop watching
+        """
+        stop = threading.Event()
+        manifest = Path(directory) / MANIFEST
+
+        # taken before returning, so a write right after the call is picked up
+        seen = manifest.stat().st_mtime_ns if manifest.exists() else None
+
+        def poll():
+            nonlocal seen
+            while not stop.wait(interval):
+                current = manifest.stat().st_mtime_ns if manifest.exists() else None
+                if current is not None and current != seen:
+                    seen = current
+                    self.reload_in_background(directory)
+
+        threading.Thread(target=poll, name='rent-watch', daemon=True).start()
+        return stop
+
+    def stats(self) -> dict:
+        """
+        :return: version and size of the index, lookup latency percentiles against LATENCY_TARGETS_MS, cache hit rate,
+        mean batch size, and the error of the last reload if it failed
+        """
+        with self._lock:
+            latencies = numpy.array(self._latencies) * 1000
+            batches, batched = self.batches, self.batched
+        percentiles = {name: float(numpy.percentile(latencies, float(name[1:]))) if len(latencies) else None
+                       for name in LATENCY_TARGETS_MS}
+        return {
+            'version': self.index.version,
+            'listings': len(self.index),
+            'lookups': len(latencies),
+            'latency_ms': percentiles,
+            'targets_ms': LATENCY_TARGETS_MS,
+            'meets_targets': all(percentiles[name] is not None and percentiles[name] <= target
+                                 for name, target in LATENCY_TARGETS_MS.items()),
+            'cache_hit_rate': self.cache.hit_rate,
+            'mean_batch': batched / batches if batches else None,
+            'reload_error': self.reload_error,
+        }
+
+    def close(self) -> None:
+        """
+        Stops the batching thread once the queries queued are answered
+        """
+        self._queue.put(None)
+        self._batcher.join()
+
+
+def fixture_listings(rows: int = 5_000, seed: int = 0) -> pandas.DataFrame:
+    """
+    :param rows: listings
+    :param seed: seed of make_listings()
+    :return: cleaned and cast synthetic listings, to run the service and its load test without the UCI data
+    """
+    # the benchmark generator is only needed to serve a fixture, not a snapshot
+    from source.synthetic import make_listings
+
+    clean_uci_df, _ = wrangling_utils.clean(make_listings(rows, seed=seed), vectorized=True)
+    return wrangling_utils.cast(clean_uci_df, copy=False)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, so clients don't pay a connection per request, and no Nagle delay between headers and body
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service: RentService
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: HTTPStatus, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _reply(self, route) -> None:
+        # a bad request gets a 400 and anything else that goes wrong a 500, so the connection is never just dropped
+        try:
+            status, body = route(urlparse(self.path))
+        except ValueError as error:
+            status, body = HTTPStatus.BAD_REQUEST, {'error': str(error)}
+        except Exception as error:
+            _log.exception('%s %s failed', self.command, self.path)
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(error).__name__}: {error}'}
+        self._send(status, body)
+
+    def _get(self, url) -> tuple[HTTPStatus, object]:
+        if url.path == '/comparables':
+            return HTTPStatus.OK, self.service.lookup(dict(parse_qsl(url.query)))
+        if url.path == '/stats':
+            return HTTPStatus.OK, self.service.stats()
+        if url.path == '/health':
+            return HTTPStatus.OK, {'version': self.service.index.version}
+        return HTTPStatus.NOT_FOUND, {'error': f'no {url.path}'}
+
+    def _post(self, url) -> tuple[HTTPStatus, object]:
+        body = self._body()
+        if url.path == '/comparables':
+            # an object is one query, a list a batch of them
+            if isinstance(body, list):
+                return HTTPStatus.OK, self.service.lookup_many(body)
+            return HTTPStatus.OK, self.service.lookup(body)
+        if url.path == '/reload':
+            directory = (body or {}).get('snapshot', str(DEFAULT_SNAPSHOT))
+            if not (Path(directory) / MANIFEST).exists():
+                raise ValueError(f'no snapshot at {directory}')
+            threading.Thread(target=self.service.reload_in_background, args=(directory,), daemon=True).start()
+            return HTTPStatus.ACCEPTED, {'reloading': directory, 'version': self.service.index.version}
+        return HTTPStatus.NOT_FOUND, {'error': f'no {url.path}'}
+
+    def do_GET(self) -> None:
+        self._reply(self._get)
+
+    def do_POST(self) -> None:
+        self._reply(self._post)
+
+
+def make_server(service: RentService, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """
+    HTTP front of a RentService, a thread per connection:
+
+        GET  /comparables?city=Austin&bedrooms=2&square_feet=900   one query
+        POST /comparables                                          a query object, or a list of them
+        POST /reload {"snapshot": "data/snapshots/listings"}       load a snapshot and swap it in
+        GET  /stats                                                latency percentiles, cache hit rate, version,
+                                                                   the error of a failed reload
+    :param service: service to answer with
+    :param host: address to listen on
+    :param port: port to listen on, 0 for any free one
+    :return: server; call serve_forever() to run it
+    """
+    handler = type('Handler', (_Handler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Serves rent comparables from the cleaned listings.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--snapshot', type=Path, default=DEFAULT_SNAPSHOT, help='snapshot to load')
+    source.add_argument('--fixture', type=int, metavar='ROWS', help='serve synthetic listings instead')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=10_000, help='answers to cache')
+    parser.add_argument('--max-batch', type=int, default=64, help='most queries answered in one batch')
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help='reload the snapshot when it changes')
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
+
+    if args.fixture:
+        index = RentIndex(fixture_listings(args.fixture), version=f'fixture-{args.fixture}')
+    else:
+        index = RentIndex.from_snapshot(args.snapshot)
+    service = RentService(index, cache_size=args.cache_size, max_batch=args.max_batch)
+    if args.watch and not args.fixture:
+        service.watch(args.snapshot, args.watch)
+
+    server = make_server(service, args.host, args.port)
+    print(f'serving {len(index)} listings ({index.version}) on http://{args.host}:{server.server_port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
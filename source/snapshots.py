@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import duckdb
+import numpy
+import pandas
+
+from source import wrangling_utils
+from source.duckdb_loader import DUCKDB_TYPES
+
+DEFAULT_SNAPSHOT = Path('data') / 'snapshots' / 'listings'
+MANIFEST = 'snapshot.json'
+
+# Row position in the snapshot, stored with every Parquet row so filtered reads come back in order
+_ROW = '__row'
+
+# Filter operators and their SQL
+_OPERATORS = {'==': '=', '=': '=', '!=': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>=', 'in': 'IN',
+              'not in': 'NOT IN'}
+
+# pandas arrays of the image's numeric columns, and the numpy dtype of their values
+_MASKED_ARRAYS = {
+    'Int64': (pandas.arrays.IntegerArray, 'int64'),
+    'Float64': (pandas.arrays.FloatingArray, 'float64'),
+    'boolean': (pandas.arrays.BooleanArray, 'bool'),
+}
+
+
+def _sql_string(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _sql_identifier(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _write_image(df: pandas.DataFrame, directory: Path) -> None:
+    # numpy files of each column, which read_snapshot() maps instead of reading: values and NA mask of the numeric
+    # columns, codes and distinct values of the text ones
+    directory.mkdir()
+    for col, values in df.items():
+        dtype = str(values.dtype)
+        if dtype in _MASKED_ARRAYS:
+            # NA is in the mask; the value under it doesn't matter
+            filler = False if dtype == 'boolean' else 0
+            numpy.save(directory / f'{col}.values.npy',
+                       values.array.to_numpy(_MASKED_ARRAYS[dtype][1], na_value=filler))
+            numpy.save(directory / f'{col}.mask.npy', values.array.isna())
+        elif dtype == 'string':
+            codes, uniques = pandas.factorize(values)
+            numpy.save(directory / f'{col}.codes.npy', codes.astype('int32'))
+            (directory / f'{col}.uniques.json').write_text(json.dumps(uniques.tolist()))
+        else:
+            raise TypeError(f'cannot snapshot the {dtype} column {col!r}; snapshots hold cast() dtypes')
+
+
+def _read_image(directory: Path, dtypes: dict[str, str], mmap: bool) -> pandas.DataFrame:
+    # copy-on-write maps: pages are read as the columns are touched, and changes to the frame stay out of the files
+    mode = 'c' if mmap else None
+    columns = {}
+    for col, dtype in dtypes.items():
+        if dtype in _MASKED_ARRAYS:
+            array = _MASKED_ARRAYS[dtype][0]
+            columns[col] = array(numpy.load(directory / f'{col}.values.npy', mmap_mode=mode),
+                                 numpy.load(directory / f'{col}.mask.npy', mmap_mode=mode))
+        else:
+            uniques = pandas.array(json.loads((directory / f'{col}.uniques.json').read_text()), dtype='string')
+            codes = numpy.load(directory / f'{col}.codes.npy', mmap_mode=mode)
+            columns[col] = uniques.take(codes, allow_fill=True)
+    return pandas.DataFrame(columns)
+
+
+def write_snapshot(df: pandas.DataFrame, directory=DEFAULT_SNAPSHOT, partition_by=('state',),
+                   overwrite: bool = False) -> dict:
+    """
+    Persists cleaned listings, so sessions and services can load them instead of cleaning the raw data again.
+
+    The snapshot is Parquet partitioned by the partition_by columns (state=California/, ...), with min/max statistics
+    per column, for read_snapshot() to skip the files and row groups a filter rules out. Next to it is an image of the
+    whole frame as numpy files, which read_snapshot() maps into memory when it reads everything.
+    :param df: dataframe from cast(), or clean() to be cast
+    :param directory: directory of the snapshot
+    :param partition_by: columns to partition by, e.g. ('state', 'price_type')
+    :param overwrite: replace a snapshot already in the directory
+    :return: manifest of the snapshot
+    """
+    if any(str(df[col].dtype) != dtype for col, dtype in wrangling_utils.CAST_DTYPES.items() if col in df):
+        df = wrangling_utils.cast(df)
+    partition_by = list(partition_by)
+    missing = [col for col in partition_by if col not in df]
+    if missing:
+        raise KeyError(f'no partition columns {missing}')
+
+    directory = Path(directory)
+    if directory.exists() and not overwrite:
+        raise FileExistsError(f'{directory} already holds a snapshot')
+    partial = directory.with_name(f'{directory.name}.{os.getpid()}.partial')
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+
+    try:
+        with duckdb.connect() as connection:
+            connection.register('snapshot', df.assign(**{_ROW: numpy.arange(len(df))}).reset_index(drop=True))
+            partitions = ', '.join(_sql_identifier(col) for col in partition_by)
+            connection.execute(f'COPY snapshot TO {_sql_string(partial / "parquet")} '
+                               f'(FORMAT PARQUET, PARTITION_BY ({partitions}), COMPRESSION ZSTD)')
+        _write_image(df.reset_index(drop=True), partial / 'image')
+
+        manifest = {
+            'written_at': time.time(),
+            'rows': len(df),
+            'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+            'partition_by': partition_by,
+            'files': sorted(str(path.relative_to(partial)) for path in (partial / 'parquet').rglob('*.parquet')),
+        }
+        (partial / MANIFEST).write_text(json.dumps(manifest, indent=1))
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    # swap the old snapshot out only once the new one is complete
+    old = directory.with_name(f'{directory.name}.{os.getpid()}.old')
+    if directory.exists():
+        os.replace(directory, old)
+    os.replace(partial, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def _where(filters, dtypes: dict[str, str]) -> tuple[str, list]:
+    # filters in pandas.read_parquet's form, as a SQL condition and its parameters
+    conditions, parameters = [], []
+    for col, op, value in filters:
+        if col not in dtypes:
+            raise KeyError(f'no column {col!r} in the snapshot')
+        if op not in _OPERATORS:
+            raise ValueError(f'unknown filter operator {op!r}; use one of {list(_OPERATORS)}')
+        if op in {'in', 'not in'}:
+            value = list(value)
+            conditions.append(f'{_sql_identifier(col)} {_OPERATORS[op]} ({", ".join("?" * len(value))})'
+                              if value else ('false' if op == 'in' else 'true'))
+            parameters.extend(value)
+        else:
+            conditions.append(f'{_sql_identifier(col)} {_OPERATORS[op]} ?')
+            parameters.append(value)
+    return ' AND '.join(conditions) or 'true', parameters
+
+
+def read_snapshot(directory=DEFAULT_SNAPSHOT, columns=None, filters=None, mmap: bool = True) -> pandas.DataFrame:
+    """
+    Loads cleaned listings written by write_snapshot(), e.g. all 2-bedroom listings in California:
+
+        read_snapshot(columns=['id', 'price'], filters=[('state', '==', 'California'), ('bedrooms', '==', 2)])
+
+    Filters are pushed down to the Parquet scan: partition values prune whole files, the column statistics prune row
+    groups, and only the columns asked for are read. Without filters, the columns are mapped from the image instead.
+    :param directory: directory of the snapshot
+    :param columns: columns to load, all by default
+    :param filters: (column, operator, value) conditions that all have to hold; operators are ==, !=, <, <=, >, >=,
+    in and not in
+    :param mmap: map the image into memory rather than reading it; only used without filters
+    :return: dataframe with the cast() dtypes, indexed by row position in the snapshot
+    """
+    directory = Path(directory)
+    manifest = json.loads((directory / MANIFEST).read_text())
+    dtypes = manifest['dtypes']
+    columns = list(dtypes) if columns is None else list(columns)
+    unknown = [col for col in columns if col not in dtypes]
+    if unknown:
+        raise KeyError(f'no columns {unknown} in the snapshot')
+
+    # an empty snapshot has no Parquet files to scan
+    if not filters or not manifest['rows']:
+        return _read_image(directory / 'image', {col: dtypes[col] for col in columns}, mmap)
+
+    where, parameters = _where(filters, dtypes)
+    # partition values are directory names; read them as the columns' own types
+    hive_types = ', '.join(f'{_sql_string(col)}: {DUCKDB_TYPES[dtypes[col]]}' for col in manifest['partition_by'])
+    selected = ', '.join(_sql_identifier(col) for col in columns + [_ROW])
+    with duckdb.connect() as connection:
+        df = connection.execute(
+            f'SELECT {selected} FROM read_parquet({_sql_string(directory / "parquet" / "**" / "*.parquet")}, '
+            f'hive_partitioning = true, hive_types = {{{hive_types}}}) WHERE {where} ORDER BY {_ROW}',
+            parameters,
+        ).df()
+
+    rows = pandas.Index(df.pop(_ROW).to_numpy())
+    df = df.astype({col: dtypes[col] for col in columns})
+    df.index = rows
+    return df
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import pickle
+from pathlib import Path
+
+import numpy
+import pandas
+from scipy.spatial import cKDTree
+
+# Mean earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> numpy.ndarray:
+    """
+    Great-circle distance, broadcasting over arrays
+    :param lat1: latitude of the first points, in degrees
+    :param lon1: longitude of the first points, in degrees
+    :param lat2: latitude of the second points, in degrees
+    :param lon2: longitude of the second points, in degrees
+    :return: distance in km
+    """
+    lat1, lon1, lat2, lon2 = (numpy.radians(numpy.asarray(x, dtype='float64')) for x in (lat1, lon1, lat2, lon2))
+    a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.sqrt(numpy.clip(a, 0.0, 1.0)))
+
+
+def _unit_vectors(latitude, longitude) -> numpy.ndarray:
+    # points on the unit sphere; the straight-line (chord) distance between two of them grows with the great-circle
+    # distance, so nearest neighbours in 3D are nearest on the earth
+    lat = numpy.radians(numpy.asarray(latitude, dtype='float64'))
+    lon = numpy.radians(numpy.asarray(longitude, dtype='float64'))
+    return numpy.column_stack([numpy.cos(lat) * numpy.cos(lon), numpy.cos(lat) * numpy.sin(lon), numpy.sin(lat)])
+
+
+def _chord_to_km(chord: numpy.ndarray) -> numpy.ndarray:
+    return 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.clip(chord / 2, 0.0, 1.0))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2 * numpy.sin(min(km / EARTH_RADIUS_KM, numpy.pi) / 2)
+
+
+class SpatialIndex:
+    """
+    KD-tree over listing coordinates for k-nearest, radius and bounding-box queries.
+
+    Queries take one point or arrays of points and answer with row positions in the coordinates the index was built
+    from; rows with a missing coordinate are left out of the index.
+    """
+
+    def __init__(self, latitude, longitude):
+        """
+        :param latitude: latitude per row, in degrees; NaN or <NA> where missing
+        :param longitude: longitude per row, in degrees
+        """
+        latitude = pandas.Series(latitude).to_numpy(dtype='float64', na_value=numpy.nan)
+        longitude = pandas.Series(longitude).to_numpy(dtype='float64', na_value=numpy.nan)
+        self.rows = numpy.flatnonzero(~(numpy.isnan(latitude) | numpy.isnan(longitude)))
+        self.latitude = latitude[self.rows]
+        self.longitude = longitude[self.rows]
+        self.tree = cKDTree(_unit_vectors(self.latitude, self.longitude))
+        # latitude order, for bounding boxes
+        self._by_latitude = numpy.argsort(self.latitude, kind='stable')
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def from_frame(cls, df: pandas.DataFrame) -> SpatialIndex:
+        """
+        :param df: dataframe from clean() or cast()
+        :return: index over its latitude and longitude
+        """
+        return cls(df['latitude'], df['longitude'])
+
+    def knn(self, latitude, longitude, k: int = 10, workers: int = 1) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        k nearest listings of each query point
+        :param latitude: query latitude, a number or an array
+        :param longitude: query longitude, a number or an array
+        :param k: neighbours per point
+        :param workers: threads to query with, -1 for all cores
+        :return: distances in km and row positions, of shape (points, k) nearest first, or (k,) for a single point;
+        when the index has fewer than k listings the rest are inf and -1
+        """
+        single = numpy.ndim(latitude) == 0
+        points = _unit_vectors(numpy.atleast_1d(latitude), numpy.atleast_1d(longitude))
+        chords, found = self.tree.query(points, k=k, workers=workers)
+        chords, found = chords.reshape(len(points), k), found.reshape(len(points), k)
+
+        missing = found >= len(self.rows)
+        distances = numpy.where(missing, numpy.inf, _chord_to_km(numpy.where(missing, 0.0, chords)))
+        rows = numpy.where(missing, -1, self.rows[numpy.where(missing, 0, found)])
+        return (distances[0], rows[0]) if single else (distances, rows)
+
+    def radius(self, latitude, longitude, radius_km: float,
+               workers: int = 1) -> tuple[numpy.ndarray, numpy.ndarray] | list[tuple[numpy.ndarray, numpy.ndarray]]:
+        """
+        Listings within a distance of each query point
+        :param latitude: query latitude, a number or an array
+        :param longitude: query longitude, a number or an array
+        :param radius_km: distance in km
+        :param workers: threads to query with, -1 for all cores
+        :return: distances in km and row positions, nearest first, for the point or for each point
+        """
+        single = numpy.ndim(latitude) == 0
+        lat, lon = numpy.atleast_1d(latitude), numpy.atleast_1d(longitude)
+        found = self.tree.query_ball_point(_unit_vectors(lat, lon), _km_to_chord(radius_km), workers=workers)
+
+        results = []
+        for i, neighbours in enumerate(found):
+            neighbours = numpy.asarray(neighbours, dtype='intp')
+            distances = haversine_km(lat[i], lon[i], self.latitude[neighbours], self.longitude[neighbours])
+            # the chord radius is exact in theory; drop float noise at the edge
+            keep = distances <= radius_km
+            order = numpy.argsort(distances[keep], kind='stable')
+            results.append((distances[keep][order], self.rows[neighbours[keep][order]]))
+        return results[0] if single else results
+
+    def bbox(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> numpy.ndarray:
+        """
+        Listings in a latitude/longitude box; min_lon > max_lon crosses the antimeridian
+        :return: row positions, in row order
+        """
+        sorted_latitude = self.latitude[self._by_latitude]
+        start = numpy.searchsorted(sorted_latitude, min_lat, side='left')
+        stop = numpy.searchsorted(sorted_latitude, max_lat, side='right')
+        band = self._by_latitude[start:stop]
+        lon = self.longitude[band]
+        if min_lon <= max_lon:
+            inside = (lon >= min_lon) & (lon <= max_lon)
+        else:
+            inside = (lon >= min_lon) | (lon <= max_lon)
+        return numpy.sort(self.rows[band[inside]])
+
+    def save(self, path) -> None:
+        """
+        Writes the index, tree included, so loading it skips the build
+        :param path: file to write
+        """
+        with open(path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path) -> SpatialIndex:
+        """
+        :param path: file written by save(); only load files you wrote, as with any pickle
+        :return: the index
+        """
+        with open(Path(path), 'rb') as file:
+            index = pickle.load(file)
+        if not isinstance(index, SpatialIndex):
+            raise TypeError(f'{path} does not hold a SpatialIndex')
+        return index
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import duckdb
+import numpy
+import pandas
+
+from source import wrangling_utils
+from source.rejections import RejectionLedger
+
+# DuckDB hands query results over in vectors of this many rows
+DUCKDB_VECTOR_SIZE = 2048
+
+
+def _sql_string(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _sql_identifier(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def read_chunks(path, chunksize: int = 100_000, **read_csv_kwargs) -> Iterator[pandas.DataFrame]:
+    """
+    Reads raw listings from a CSV or Parquet file a chunk at a time
+    :param path: CSV or Parquet file
+    :param chunksize: rows per chunk; rounded up to whole DuckDB vectors for Parquet
+    :param read_csv_kwargs: passed on to pandas.read_csv, e.g. sep=';' and encoding='cp1252' for the UCI CSV
+    :return: raw chunks, with missing values as NaN either way
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        with duckdb.connect() as connection:
+            result = connection.execute(f'SELECT * FROM read_parquet({_sql_string(path)})')
+            vectors = -(-chunksize // DUCKDB_VECTOR_SIZE)
+            while len(chunk := result.fetch_df_chunk(vectors)):
+                # DuckDB returns None for NULL text, read_csv (and the UCI loader) NaN; the cleaners treat them apart
+                for col in chunk.columns[chunk.dtypes == object]:
+                    chunk[col] = chunk[col].where(chunk[col].notna(), numpy.nan)
+                yield chunk
+        return
+
+    with pandas.read_csv(path, chunksize=chunksize, **read_csv_kwargs) as reader:
+        yield from reader
+
+
+def clean_chunks(raw_chunks: Iterable[pandas.DataFrame], vectorized: bool = True,
+                 ledger: RejectionLedger | None = None, workers: int = 1) -> Iterator[pandas.DataFrame]:
+    """
+    Cleans and casts raw chunks one at a time
+    :param raw_chunks: chunks of raw listings, e.g. from read_chunks
+    :param vectorized: engine for clean(); the output is identical either way
+    :param ledger: collects the rejections of every chunk, by row position in the whole input
+    :param workers: processes to clean each chunk in, as clean(workers=...)
+    :return: cleaned and cast chunks
+    """
+    if ledger is None:
+        ledger = RejectionLedger()
+
+    offset = 0
+    for number, raw in enumerate(raw_chunks):
+        cleaned, chunk_ledger = wrangling_utils.clean(raw, vectorized=vectorized, ledger=ledger.child(number),
+                                                      workers=workers)
+        ledger.merge(chunk_ledger, offset=offset)
+        offset += len(raw)
+        yield wrangling_utils.cast(cleaned, copy=False)
+
+
+def write_parquet(chunks: Iterable[pandas.DataFrame], directory) -> int:
+    """
+    Writes each chunk to its own numbered Parquet file in a directory
+    :param chunks: cleaned chunks, e.g. from clean_chunks
+    :param directory: directory to create the files in, once the first chunk is read; must not hold files of an
+    earlier run
+    :return: rows written
+    """
+    directory = Path(directory)
+    if any(directory.glob('part-*.parquet')):
+        raise FileExistsError(f'{directory} already holds Parquet parts')
+
+    rows = 0
+    with duckdb.connect() as connection:
+        for number, chunk in enumerate(chunks):
+            # an input that can't be read leaves no empty directory behind
+            directory.mkdir(parents=True, exist_ok=True)
+            connection.register('chunk', chunk)
+            part = directory / f'part-{number:05d}.parquet'
+            connection.execute(f'COPY chunk TO {_sql_string(part)} (FORMAT PARQUET)')
+            connection.unregister('chunk')
+            rows += len(chunk)
+    return rows
+
+
+def write_duckdb(chunks: Iterable[pandas.DataFrame], database, table: str = 'cleaned_listings') -> int:
+    """
+    Appends chunks to a DuckDB table, creating it from the first chunk's schema. All chunks go in one transaction.
+    :param chunks: cleaned chunks, e.g. from clean_chunks
+    :param database: DuckDB database file
+    :param table: table to append to
+    :return: rows written
+    """
+    rows = 0
+    with duckdb.connect(str(database)) as connection:
+        connection.execute('BEGIN TRANSACTION')
+        for chunk in chunks:
+            connection.register('chunk', chunk)
+            connection.execute(f'CREATE TABLE IF NOT EXISTS {_sql_identifier(table)} AS SELECT * FROM chunk LIMIT 0')
+            connection.execute(f'INSERT INTO {_sql_identifier(table)} BY NAME SELECT * FROM chunk')
+            connection.unregister('chunk')
+            rows += len(chunk)
+        connection.execute('COMMIT')
+    return rows
+
+
+def stream_clean(path, destination, chunksize: int = 100_000, vectorized: bool = True,
+                 ledger: RejectionLedger | None = None, table: str = 'cleaned_listings', workers: int = 1,
+                 **read_csv_kwargs) -> int:
+    """
+    Cleans and casts a raw CSV or Parquet file into Parquet parts or a DuckDB table, holding one chunk in memory at a
+    time
+    :param path: raw CSV or Parquet file
+    :param destination: DuckDB database (.duckdb or .db) or a directory for Parquet parts
+    :param chunksize: rows per chunk
+    :param vectorized: engine for clean(); the output is identical either way
+    :param ledger: collects the rejections, by row position in the whole input
+    :param table: table to append to when writing to DuckDB
+    :param workers: processes to clean each chunk in
+    :param read_csv_kwargs: passed on to pandas.read_csv
+    :return: rows written
+    """
+    chunks = clean_chunks(read_chunks(path, chunksize, **read_csv_kwargs), vectorized, ledger, workers)
+    if Path(destination).suffix in {'.duckdb', '.db'}:
+        return write_duckdb(chunks, destination, table)
+    return write_parquet(chunks, destination)
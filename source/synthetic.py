@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import numpy
+import pandas
+
+from source import wrangling_utils
+
+# (city, state, latitude, longitude) the synthetic listings are spread around
+CITIES = [
+    ('Houston', 'TX', 29.7604, -95.3698), ('Dallas', 'TX', 32.7767, -96.7970), ('Austin', 'TX', 30.2672, -97.7431),
+    ('Ft Worth', 'TX', 32.7555, -97.3308), ('San Antonio', 'TX', 29.4241, -98.4936),
+    ('Los Angeles', 'CA', 34.0522, -118.2437), ('San Diego', 'CA', 32.7157, -117.1611),
+    ('San Jose', 'CA', 37.3382, -121.8863), ('Sacramento', 'CA', 38.5816, -121.4944),
+    ('Denver', 'CO', 39.7392, -104.9903), ('Colorado Springs', 'CO', 38.8339, -104.8214),
+    ('Atlanta', 'GA', 33.7490, -84.3880), ('Fulton County', 'GA', 33.7900, -84.4700),
+    ('Chicago', 'IL', 41.8781, -87.6298), ('St Louis', 'MO', 38.6270, -90.1994), ('O Fallon', 'MO', 38.8106, -90.6998),
+    ('Kansas City', 'MO', 39.0997, -94.5786), ('Mc Kees Rocks', 'PA', 40.4656, -80.0656),
+    ('Pittsburgh', 'PA', 40.4406, -79.9959), ('Philadelphia', 'PA', 39.9526, -75.1652),
+    ('New York', 'NY', 40.7128, -74.0060), ('Brooklyn', 'NY', 40.6782, -73.9442), ('Seattle', 'WA', 47.6062, -122.3321),
+    ('Portland', 'OR', 45.5152, -122.6784), ('Phoenix', 'AZ', 33.4484, -112.0740), ('Tucson', 'AZ', 32.2226, -110.9747),
+    ('Las Vegas', 'NV', 36.1699, -115.1398), ('Charlotte', 'NC', 35.2271, -80.8431),
+    ('Raleigh', 'NC', 35.7796, -78.6382),
+    ('Nashville', 'TN', 36.1627, -86.7816), ('Memphis', 'TN', 35.1495, -90.0490), ('Miami', 'FL', 25.7617, -80.1918),
+    ('Orlando', 'FL', 28.5383, -81.3792), ('Tampa', 'FL', 27.9506, -82.4572), ('Columbus', 'OH', 39.9612, -82.9988),
+    ('Cincinnati', 'OH', 39.1031, -84.5120), ('Minneapolis', 'MN', 44.9778, -93.2650),
+    ('Mt Pleasant', 'SC', 32.7941, -79.8626), ('Washington', 'DC', 38.9072, -77.0369),
+    ('Baltimore', 'MD', 39.2904, -76.6122), ('Boston', 'MA', 42.3601, -71.0589),
+    ('Salt Lake City', 'UT', 40.7608, -111.8910), ('Omaha', 'NE', 41.2565, -95.9345),
+]
+
+AMENITIES = [
+    'AC', 'Alarm', 'Basketball', 'Cable or Satellite', 'Clubhouse', 'Dishwasher', 'Doorman', 'Elevator', 'Fireplace',
+    'Garbage Disposal', 'Gated', 'Golf', 'Gym', 'Hot Tub', 'Internet Access', 'Luxury', 'Parking', 'Patio/Deck',
+    'Playground', 'Pool', 'Refrigerator', 'Storage', 'TV', 'Tennis', 'View', 'Washer Dryer', 'Wood Floors',
+]
+
+SOURCES = [
+    'RentLingo', 'RentDigs.com', 'ListedBuy', 'RealRentals', 'GoSection8', 'Listanza', 'RENTOCULAR', 'tenantcloud',
+    'Home Rentals', 'rentbits', 'Real Estate Agent', 'RENTCafé',
+]
+
+STREETS = ['Main St', 'Oak Ave', 'Maple Dr', 'Cedar Ln', 'Park Blvd', 'Elm St', 'Lake Rd', 'Hill Ct', 'Pine Way']
+
+# Dirty values of each column, as the cleaners meet them in the UCI data: missing values, and fields shifted into the
+# wrong column ("Thumbnail" in bathrooms, "Cats,Dogs" in bedrooms, coordinates in cityname, ...)
+DIRTY_VALUES = {
+    'category': ['ousing/rent/apartment', 'ing/rent/apartment', 'housing/rent/2', numpy.nan],
+    'amenities': [numpy.nan, 'nan', 'Gym,nan'],
+    'bathrooms': ['Thumbnail', 'No', numpy.nan],
+    'bedrooms': ['Cats,Dogs', 'Thumbnail', 'No', numpy.nan],
+    'currency': ['No', 'Thumbnail', numpy.nan],
+    'fee': ['USD', 'Thumbnail', numpy.nan],
+    'has_photo': ['Cats,Dogs', 'None', numpy.nan],
+    'pets_allowed': ['1200', '950', numpy.nan],
+    'price': ['Monthly', '$1,200', numpy.nan],
+    'price_display': ['Monthly', None, numpy.nan, '$'],
+    'price_type': ['$1,200', 'Monthly|Weekly', numpy.nan],
+    'square_feet': ['$1,200', 'Monthly', numpy.nan],
+    'address': ['40.2659 -77.4948', 'Main Street', '1200 sq ft', 'None', numpy.nan],
+    'cityname': ['40.7128,-74.0060', '33.7490, -84.3880', 'www.rentals.com', '30301', 'California', 'null', numpy.nan],
+    'state': ['XX', '1200', numpy.nan],
+    'latitude': [95.0, -91.0, numpy.nan],
+    'longitude': [-190.0, 181.0, numpy.nan],
+}
+
+
+def _pick(rng: numpy.random.Generator, pool, rows: int) -> numpy.ndarray:
+    pool = numpy.asarray(pool, dtype=object)
+    return pool[rng.integers(len(pool), size=rows)]
+
+
+def make_listings(rows: int = 10_000, seed: int = 0, dirty: float = 0.1) -> pandas.DataFrame:
+    """
+    Synthesizes raw apartment listings shaped like UcIrvineAPI.fetch_dataset().data.original, for benchmarking
+    offline. Values come from small pools, so text columns repeat about as much as the real ones do.
+    :param rows: listings to make
+    :param seed: random seed; the same seed and size give the same frame
+    :param dirty: share of each cleaned column's values replaced by one of its DIRTY_VALUES
+    :return: raw dataframe with the columns of wrangling_utils.ROW_CLEANERS
+    """
+    rng = numpy.random.default_rng(seed)
+    cities = pandas.DataFrame(CITIES, columns=['cityname', 'state', 'latitude', 'longitude'])
+    city = rng.integers(len(cities), size=rows)
+
+    # pools of the columns with many distinct values
+    amenity_sets = [
+        ','.join(sorted(rng.choice(AMENITIES, size=rng.integers(1, 8), replace=False)))
+        for _ in range(2_000)
+    ]
+    numbers, streets = rng.integers(1, 9_999, 5_000), _pick(rng, STREETS, 5_000)
+    addresses = [f'{number} {street}' for number, street in zip(numbers, streets)]
+    prices = numpy.round(rng.lognormal(7.1, 0.45, 5_000), -1)
+    price_displays = [f'${price:,.0f}' for price in prices]
+    price_displays += [f'${low:,.0f}-${low + 200:,.0f}' for low in prices[:500]]
+    price_displays += [f'${price / 4:,.0f} Weekly' for price in prices[:100]]
+    price_displays += [f'Monthly | ${price:,.0f}' for price in prices[:100]]
+
+    columns = {
+        'id': 5_668_600_000 + rng.permutation(rows * 2)[:rows],
+        'category': _pick(rng, ['housing/rent/apartment'] * 20 + ['housing/rent/home', 'housing/rent/short_term',
+                                                                   'housing/rent/condo', 'housing/rent/other'], rows),
+        'title': numpy.asarray([f'{name} apartment for rent' for name in cities['cityname']], dtype=object)[city],
+        'body': _pick(rng, [f'Listing {number}. Call today, this unit will not last.' for number in range(1_000)],
+                      rows),
+        'amenities': _pick(rng, amenity_sets, rows),
+        'bathrooms': _pick(rng, ['1.0', '1.0', '1.5', '2.0', '2.0', '2.5', '3.0'], rows),
+        'bedrooms': _pick(rng, ['0.0', '1.0', '1.0', '2.0', '2.0', '3.0', '4.0'], rows),
+        'currency': numpy.full(rows, 'USD', dtype=object),
+        'fee': _pick(rng, ['No'] * 50 + ['Yes'], rows),
+        'has_photo': _pick(rng, ['Thumbnail', 'Thumbnail', 'Yes', 'No'], rows),
+        'pets_allowed': _pick(rng, ['Cats,Dogs', 'Cats,Dogs', 'Cats', 'Dogs', 'None'], rows),
+        'price': prices[rng.integers(len(prices), size=rows)],
+        'price_display': _pick(rng, price_displays, rows),
+        'price_type': _pick(rng, ['Monthly'] * 50 + ['Weekly', 'Monthly|Weekly'], rows),
+        'square_feet': _pick(rng, [str(size) for size in range(400, 3_000, 5)], rows),
+        'address': _pick(rng, addresses, rows),
+        'cityname': cities['cityname'].to_numpy(dtype=object)[city],
+        'state': cities['state'].to_numpy(dtype=object)[city],
+        'latitude': cities['latitude'].to_numpy()[city] + rng.normal(0, 0.08, rows),
+        'longitude': cities['longitude'].to_numpy()[city] + rng.normal(0, 0.08, rows),
+        'source': _pick(rng, SOURCES, rows),
+        'time': rng.integers(1_568_000_000, 1_577_000_000, rows),
+    }
+
+    for col, pool in DIRTY_VALUES.items():
+        values = columns[col]
+        replaced = numpy.flatnonzero(rng.random(rows) < dirty)
+        if values.dtype != object and any(isinstance(value, str) for value in pool):
+            values = values.astype(object)
+        values = values.copy()
+        values[replaced] = _pick(rng, pool, len(replaced))
+        columns[col] = values
+
+    return pandas.DataFrame(columns, columns=list(wrangling_utils.ROW_CLEANERS))
+
+
+def _words(rng: numpy.random.Generator, count: int) -> numpy.ndarray:
+    # pronounceable made-up words, so listings share as little text as real ones by different people do
+    syllables = numpy.array([c + v for c in 'bcdfghklmnprstvz' for v in 'aeiou'], dtype=object)
+    parts = syllables[rng.integers(len(syllables), size=(count, 3))]
+    return numpy.unique(parts[:, 0] + parts[:, 1] + parts[:, 2])
+
+
+def make_reposts(rows: int = 10_000, share: float = 0.2, seed: int = 0, edits: int = 2,
+                 dirty: float = 0.1) -> tuple[pandas.DataFrame, numpy.ndarray]:
+    """
+    Synthesizes raw listings where some are reposts of others: the same apartment with a new id, a price a few percent
+    off, and a few words of the title and body changed. Titles, bodies and addresses are otherwise distinct, so the
+    reposts are the only near-duplicates. For measuring deduplication.
+    :param rows: listings to make, reposts included
+    :param share: share of the listings that are reposts of another one
+    :param seed: random seed; the same seed and size give the same frame
+    :param edits: words changed in the body of a repost; the title has one word changed half of the time
+    :param dirty: share of dirty values, as for make_listings()
+    :return: raw dataframe as make_listings() makes it, and the row position of each listing's original (its own
+    position for originals)
+    """
+    rng = numpy.random.default_rng(seed)
+    uci_df = make_listings(rows, seed=seed, dirty=dirty)
+    words = _words(rng, 20_000)
+
+    title_words = rng.integers(len(words), size=(rows, 6))
+    body_words = rng.integers(len(words), size=(rows, 40))
+    addresses = [f'{number} {street}' for number, street in
+                 zip(rng.integers(1, 99_999, rows), _pick(rng, STREETS, rows))]
+
+    # reposts copy an earlier original, so each repost's original comes first
+    originals = numpy.arange(rows)
+    reposts = numpy.sort(rng.choice(numpy.arange(1, rows), size=int(rows * share), replace=False))
+    is_repost = numpy.zeros(rows, dtype=bool)
+    is_repost[reposts] = True
+    # row 0 is never a repost, so every repost has an original before it
+    firsts = numpy.flatnonzero(~is_repost)
+    before = numpy.searchsorted(firsts, reposts)
+    source = firsts[(rng.random(len(reposts)) * before).astype('int64')]
+    originals[reposts] = source
+
+    title_words[reposts] = title_words[source]
+    retitled = reposts[rng.random(len(reposts)) < 0.5]
+    title_words[retitled, rng.integers(6, size=len(retitled))] = rng.integers(len(words), size=len(retitled))
+    body_words[reposts] = body_words[source]
+    for _ in range(edits):
+        body_words[reposts, rng.integers(40, size=len(reposts))] = rng.integers(len(words), size=len(reposts))
+
+    uci_df['title'] = [' '.join(title) for title in words[title_words]]
+    uci_df['body'] = [' '.join(body) for body in words[body_words]]
+    uci_df['address'] = numpy.asarray(addresses, dtype=object)
+    for col in ('address', 'cityname', 'state', 'latitude', 'longitude', 'bedrooms', 'bathrooms', 'square_feet'):
+        values = uci_df[col].to_numpy(copy=True)
+        values[reposts] = values[source]
+        uci_df[col] = values
+    price = pandas.to_numeric(uci_df['price'], errors='coerce').to_numpy()
+    uci_df.loc[reposts, 'price'] = numpy.round(price[source] * rng.uniform(0.95, 1.05, len(reposts)), -1)
+    return uci_df, originals
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy
+import pandas
+import scipy.sparse
+
+from source import streaming, wrangling_utils
+
+# Free text turned into features
+FEATURE_COLUMNS = ('title', 'body')
+# Words of two or more letters or digits, as scikit-learn's vectorizers tokenize
+TOKEN_PATTERN = r'(?u)\b\w\w+\b'
+DEFAULT_N_FEATURES = 2 ** 20
+
+
+def _hash_key(col: str) -> str:
+    # pandas hashes with a 16-byte key; one per column keeps "pool" in a title apart from "pool" in a body
+    return hashlib.md5(col.encode()).hexdigest()[:16]
+
+
+def hash_features(clean_uci_df: pandas.DataFrame, columns=FEATURE_COLUMNS, n_features: int = DEFAULT_N_FEATURES,
+                  alternate_sign: bool = True, norm: str | None = 'l2') -> scipy.sparse.csr_matrix:
+    """
+    Token counts of the text columns as a sparse matrix of a fixed width, with no vocabulary: a token's column is its
+    hash modulo n_features. The hash is the same in every process and session, so matrices of separate chunks line up
+    and can be stacked.
+    :param clean_uci_df: dataframe from clean() or cast()
+    :param columns: text columns; each hashes its tokens apart from the others'
+    :param n_features: columns of the matrix
+    :param alternate_sign: give half the tokens a count of -1 instead of 1, so colliding tokens cancel out on average
+    rather than add up
+    :param norm: 'l2' to scale each row to unit length, None to keep counts
+    :return: CSR matrix of shape (len(clean_uci_df), n_features)
+    """
+    if norm not in {'l2', None}:
+        raise ValueError(f"norm must be 'l2' or None, not {norm!r}")
+    n = len(clean_uci_df)
+    rows, hashes = [], []
+    for col in columns:
+        text = clean_uci_df[col].astype(object).where(clean_uci_df[col].notna(), '').astype(str)
+        tokens = text.str.lower().str.findall(TOKEN_PATTERN)
+        counts = tokens.str.len().to_numpy(dtype='int64')
+        flat = numpy.fromiter(chain.from_iterable(tokens), dtype=object, count=counts.sum())
+        rows.append(numpy.repeat(numpy.arange(n), counts))
+        hashes.append(pandas.util.hash_array(flat, hash_key=_hash_key(col)))
+
+    rows = numpy.concatenate(rows) if rows else numpy.empty(0, dtype='int64')
+    hashes = numpy.concatenate(hashes) if hashes else numpy.empty(0, dtype='uint64')
+    indices = (hashes % numpy.uint64(n_features)).astype('int64')
+    values = numpy.ones(len(hashes))
+    if alternate_sign:
+        values[(hashes >> numpy.uint64(63)).astype(bool)] = -1.0
+
+    # duplicate (row, column) entries are summed into counts
+    features = scipy.sparse.csr_matrix((values, (rows, indices)), shape=(n, n_features))
+    features.sum_duplicates()
+    if norm == 'l2':
+        lengths = numpy.sqrt(numpy.asarray(features.multiply(features).sum(axis=1)).ravel())
+        lengths[lengths == 0] = 1.0
+        features = scipy.sparse.csr_matrix(scipy.sparse.diags(1 / lengths) @ features)
+    return features
+
+
+def _raw_chunk_features(raw: pandas.DataFrame, vectorized: bool, columns: list[str],
+                        kwargs: dict) -> scipy.sparse.csr_matrix:
+    # runs in a worker process: cleans only the text columns of a raw chunk, then hashes them
+    cleaned, _ = wrangling_utils.clean(raw, vectorized=vectorized, columns=columns)
+    return hash_features(cleaned, columns, **kwargs)
+
+
+def feature_chunks(raw_chunks: Iterable[pandas.DataFrame], workers: int = 1, vectorized: bool = True,
+                   columns=FEATURE_COLUMNS, **kwargs) -> Iterator[scipy.sparse.csr_matrix]:
+    """
+    Cleans and hashes raw chunks into feature matrices one at a time, in the order of the chunks
+    :param raw_chunks: chunks of raw listings, e.g. from streaming.read_chunks
+    :param workers: processes to featurize in; at most two chunks per worker are in flight, so memory stays flat
+    however long the input is
+    :param vectorized: engine for clean()
+    :param columns: text columns
+    :param kwargs: further arguments of hash_features()
+    :return: feature matrix per chunk
+    """
+    columns = list(columns)
+    if workers <= 1:
+        for raw in raw_chunks:
+            yield _raw_chunk_features(raw, vectorized, columns, kwargs)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for raw in raw_chunks:
+            pending.append(executor.submit(_raw_chunk_features, raw, vectorized, columns, kwargs))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_features(chunks: Iterable[scipy.sparse.csr_matrix], directory) -> int:
+    """
+    Writes each feature matrix to its own numbered .npz file in a directory
+    :param chunks: feature matrices, e.g. from feature_chunks
+    :param directory: directory to create the files in; must not hold files of an earlier run
+    :return: rows written
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if any(directory.glob('part-*.npz')):
+        raise FileExistsError(f'{directory} already holds feature parts')
+    rows = 0
+    for number, chunk in enumerate(chunks):
+        scipy.sparse.save_npz(directory / f'part-{number:05d}.npz', chunk)
+        rows += chunk.shape[0]
+    return rows
+
+
+def read_features(directory) -> scipy.sparse.csr_matrix:
+    """
+    :param directory: directory written by write_features()
+    :return: the parts stacked in order, one row per listing
+    """
+    parts = sorted(Path(directory).glob('part-*.npz'))
+    if not parts:
+        raise FileNotFoundError(f'no feature parts in {directory}')
+    return scipy.sparse.vstack([scipy.sparse.load_npz(part) for part in parts], format='csr')
+
+
+def stream_features(path, directory, chunksize: int = 100_000, workers: int = 1, vectorized: bool = True,
+                    columns=FEATURE_COLUMNS, n_features: int = DEFAULT_N_FEATURES, alternate_sign: bool = True,
+                    norm: str | None = 'l2', **read_csv_kwargs) -> int:
+    """
+    Featurizes the text of a raw CSV or Parquet file into .npz parts, holding a few chunks in memory at a time
+    :param path: raw CSV or Parquet file
+    :param directory: directory for the parts, read back with read_features()
+    :param chunksize: rows per chunk
+    :param workers: processes to featurize in
+    :param vectorized: engine for clean()
+    :param columns: text columns
+    :param n_features: columns of the matrices
+    :param alternate_sign: as for hash_features()
+    :param norm: as for hash_features()
+    :param read_csv_kwargs: passed on to pandas.read_csv
+    :return: rows written
+    """
+    chunks = feature_chunks(streaming.read_chunks(path, chunksize, **read_csv_kwargs), workers, vectorized, columns,
+                            n_features=n_features, alternate_sign=alternate_sign, norm=norm)
+    return write_features(chunks, directory)
@@ -1,7 +1,20 @@
 from __future__ import annotations
 
+import importlib.util
+import math
+import numpy
 import pandas
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import ContextVar
+from itertools import repeat
+
+from source.amenities import AmenityIndex, word_columns
+from source.city_lookup import CityLookup
+from source.normalizer_cache import NormalizerCache
+from source.numeric import parse_floats, to_float, to_int
+from source.profiling import CleanProfile, unmeasured
+from source.rejections import RejectionLedger
 
 # Dictionary of U.S. states
 STATE_MAP = {
@@ -35,37 +48,91 @@ def state_full_name(abbrev: str) -> str | None:
     return None
 
 
+# Rejection reasons recorded in the RejectionLedger
+MISSING = 'missing'
+INVALID = 'invalid'
+UNPARSEABLE = 'unparseable'
+OUT_OF_RANGE = 'out of range'
+REASONS = (MISSING, INVALID, UNPARSEABLE, OUT_OF_RANGE)
+
+
 class BadDataException(ValueError, TypeError):
-    """Raised when int(x) fails; behaves like both ValueError and TypeError."""
+    """Raised by the row-wise cleaners to reject a value; behaves like both ValueError and TypeError."""
 
     def __init__(self, value, message=None):
         self.value = value
+        self.reason = message or INVALID
         super().__init__(message)
 
-BAD_DATA = {
-    "id": [],
-    "category": [],
-    "title": [],
-    "body": [],
-    "amenities": [],
-    "bathrooms": [],
-    "bedrooms": [],
-    "currency": [],
-    "fee": [],
-    "has_photo": [],
-    "pets_allowed": [],
-    "price": [],
-    "price_display": [],
-    "price_type": [],
-    "square_feet": [],
-    "address": [],
-    "cityname": [],
-    "state": [],
-    "latitude": [],
-    "longitude": [],
-    "source": [],
-    "time": []
-}
+
+class _RowRejections:
+    """
+    Rejections of the column clean() is currently applying a row-wise cleaner to
+    """
+
+    def __init__(self):
+        self.position = -1
+        self.positions = []
+        self.values = []
+        self.reasons = []
+
+    def track(self, cleaner):
+        def tracked(x):
+            self.position += 1
+            return cleaner(x)
+
+        return tracked
+
+
+# Context-local, so concurrent clean() calls in other threads never see each other's rejections
+_ROW_REJECTIONS: ContextVar[_RowRejections | None] = ContextVar('row_rejections', default=None)
+
+
+def _reject(value, reason: str) -> None:
+    # Cleaners called outside of clean() have nowhere to record rejections
+    rejections = _ROW_REJECTIONS.get()
+    if rejections is not None:
+        rejections.positions.append(rejections.position)
+        rejections.values.append(value)
+        rejections.reasons.append(reason)
+
+
+def _memoized(cleaner, cache: NormalizerCache):
+    """
+    Wraps a row-wise cleaner whose result only depends on str(x) (and x being None) so each distinct raw value is
+    cleaned once. The rejection of a cached value is replayed for every row it appears in.
+    :param cleaner: row-wise cleaner
+    :param cache: cache of (result, rejection) entries
+    :return: memoized cleaner
+    """
+
+    def memoized(x):
+        try:
+            key = None if x is None else str(x)
+        except Exception:
+            return cleaner(x)
+
+        entry = cache.get(key)
+        if entry is None:
+            rejections = _RowRejections()
+            token = _ROW_REJECTIONS.set(rejections)
+            try:
+                result = cleaner(x)
+            finally:
+                _ROW_REJECTIONS.reset(token)
+            # a replayed value may be a different object with the same str(), which is all the ledger keeps
+            rejection = (rejections.values[0], rejections.reasons[0]) if rejections.values else None
+            entry = (result, rejection)
+            cache.put(key, entry)
+
+        result, rejection = entry
+        if rejection is not None:
+            _reject(*rejection)
+        # every row gets its own list of amenities
+        return list(result) if isinstance(result, list) else result
+
+    return memoized
+
 
 # Common state/territory abbreviations to exclude when they appear alone as the "city"
 US_STATE_ABBR = {
@@ -107,11 +174,33 @@ ABBREV_MAP = {
     "slc": "salt lake city"  # common leftover
 }
 
+# The three tables above, compiled; the city cleaners go by this, see use_city_lookup()
+CITY_LOOKUP = CityLookup(COUNTY_TO_CITY, ABBREV_MAP, US_STATE_NAMES)
+
 # Patterns we consider invalid for a city field
 URL_PAT = re.compile(r"(https?://|www\.|\.(com|net|org|edu|gov|io|co|us)\b)", re.I)
 COORD_PAIR = re.compile(r"^\s*-?\d+(?:\.\d+)?\s*[, ]\s*-?\d+(?:\.\d+)?\s*$")  # "40.7, -73.9" or "40.7 -73.9"
 NUM_ONLY = re.compile(r"^\s*-?\d+(?:\.\d+)?\s*$")
 ALLOWED_CHARS = re.compile(r"^[A-Za-z .'\-]+$")
+O_PREFIX = re.compile(r"\bO\s+([A-Za-z])")
+MC_PREFIX = re.compile(r"\bMc\s+([A-Za-z])")
+WHITESPACE = re.compile(r"\s+")
+LETTER = re.compile(r"[A-Za-z]")
+
+# Prices and price ranges, once $ and thousands separators are gone
+PRICE_NUMBER = re.compile(r"[\d.]+")
+
+# An address needs both a number and a letter, in either order
+ADDRESS_DIGIT_AND_LETTER = re.compile(r"\d.*[A-Za-z]|[A-Za-z].*\d", re.S)
+
+# Category parts that lost the start of "housing"
+TRUNCATED_HOUSING = re.compile(r"^(ousing|ing)")
+
+# Separators of the pets_allowed tokens
+PETS_SEPARATOR = re.compile(r"[,/]")
+
+# Square feet as digits with an optional decimal part
+SQUARE_FEET_NUMBER = re.compile(r"\d+(?:\.\d+)?")
 
 
 def _expand_leading_abbrev(s: str) -> str:
@@ -120,31 +209,27 @@ def _expand_leading_abbrev(s: str) -> str:
     if not tokens:
         return s
     first = tokens[0].lower().strip(".,")
-    if first in ABBREV_MAP:
-        tokens[0] = ABBREV_MAP[first]
+    if first in CITY_LOOKUP.abbreviations:
+        tokens[0] = CITY_LOOKUP.abbreviations[first]
     return " ".join(tokens)
 
 
 def _fix_prefix_patterns(s: str) -> str:
     # "O Fallon" -> "O'Fallon" (only when O is a standalone leading token)
-    s = re.sub(r"\bO\s+([A-Za-z])", r"O'\1", s)
+    if "O" in s:
+        s = O_PREFIX.sub(r"O'\1", s)
     # "Mc Kees" -> "McKees", "Mc Donald" -> "McDonald"
-    s = re.sub(r"\bMc\s+([A-Za-z])", r"Mc\1", s)
+    if "Mc" in s:
+        s = MC_PREFIX.sub(r"Mc\1", s)
     return s
 
 
 def clean_id(x):
-    try:
-        try:
-            return int(x)
-        except Exception:
-            raise BadDataException(x)
-    except BadDataException as e:
-        BAD_DATA["id"].append(e.value)
-        return None
-    except Exception:
-        BAD_DATA["id"].append(x)
-        return None
+    # the numeric cleaners check values instead of catching what int() and float() raise, as dirty feeds reject a lot
+    id_ = to_int(x)
+    if id_ is None:
+        _reject(x, UNPARSEABLE)
+    return id_
 
 
 def clean_category(x):
@@ -153,7 +238,7 @@ def clean_category(x):
         parts = x.split('/')
 
         cleaned_parts = [
-            re.sub(r'^(ousing|ing)', 'housing', p.strip())
+            TRUNCATED_HOUSING.sub('housing', p.strip())
             for p in parts
         ]
 
@@ -162,10 +247,10 @@ def clean_category(x):
         return ','.join(cleaned_parts)
 
     except BadDataException as e:
-        BAD_DATA["category"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["category"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -173,10 +258,10 @@ def clean_title(x):
     try:
         return str(x)
     except BadDataException as e:
-        BAD_DATA["title"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["title"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -184,7 +269,7 @@ def clean_body(x):
     try:
         return str(x)
     except BadDataException as e:
-        BAD_DATA["body"].append(e.value)
+        _reject(e.value, e.reason)
         return None
 
 
@@ -202,16 +287,25 @@ def clean_amenities(x):
         cleaned_parts = [p.strip() for p in raw_parts if p.strip()]
 
         if any(p == 'nan' for p in cleaned_parts):
-            raise BadDataException(cleaned_parts, 'nan')
+            raise BadDataException(cleaned_parts, MISSING)
 
         return cleaned_parts
 
     except BadDataException as e:
-        BAD_DATA["amenities"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["amenities"].append(x)
+        _reject(x, UNPARSEABLE)
+        return None
+
+
+def _count(x, val: str):
+    # int(float(val)), rejecting x where it would raise
+    number = to_float(val)
+    if number is None or not math.isfinite(number):
+        _reject(x, UNPARSEABLE)
         return None
+    return int(number)
 
 
 def clean_bathrooms(x):
@@ -219,18 +313,16 @@ def clean_bathrooms(x):
         # Normalize to lowercase string
         val = str(x).strip().lower()
 
-        # If the value is invalid, raise your custom exception
+        # Reject invalid values
         if val in {"nan", "no", "thumbnail"}:
-            raise BadDataException(x)
+            _reject(x, MISSING if val == "nan" else INVALID)
+            return None
 
-        # Try converting to integer
-        return int(float(val))  # handles '2.0' etc.
+        # Convert to integer, handles '2.0' etc.
+        return _count(x, val)
 
-    except BadDataException as e:
-        BAD_DATA["bathrooms"].append(e.value)
-        return None
     except Exception:
-        BAD_DATA["bathrooms"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -239,18 +331,16 @@ def clean_bedrooms(x):
         # Normalize value to lowercase string
         val = str(x).strip().lower()
 
-        # Raise custom exception for clearly invalid values
+        # Reject clearly invalid values
         if val in {"nan", "no", "thumbnail", "cats,dogs"}:
-            raise BadDataException(x)
+            _reject(x, MISSING if val == "nan" else INVALID)
+            return None
 
-        # Attempt numeric conversion (handles "2.0" etc.)
-        return int(float(val))
+        # Numeric conversion (handles "2.0" etc.)
+        return _count(x, val)
 
-    except BadDataException as e:
-        BAD_DATA["bedrooms"].append(e.value)
-        return None
     except Exception:
-        BAD_DATA["bedrooms"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -269,10 +359,10 @@ def clean_currency(x):
         return val
 
     except BadDataException as e:
-        BAD_DATA["currency"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["currency"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -290,11 +380,11 @@ def clean_fee(x):
         raise BadDataException(x)
 
     except BadDataException as e:
-        BAD_DATA["fee"].append(e.value)
+        _reject(e.value, e.reason)
         return None
 
     except Exception:
-        BAD_DATA["fee"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -313,10 +403,10 @@ def clean_has_photo(x):
         raise BadDataException(x)
 
     except BadDataException as e:
-        BAD_DATA["has_photo"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["has_photo"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -326,10 +416,10 @@ def clean_pets_allowed(x):
 
         # Handle truly missing or numeric data (bad)
         if val == "nan" or val.isnumeric():
-            raise BadDataException(x)
+            raise BadDataException(x, MISSING if val == "nan" else INVALID)
 
         # Split on commas or slashes
-        tokens = [t.strip() for t in re.split(r"[,/]", val) if t.strip()]
+        tokens = [t.strip() for t in PETS_SEPARATOR.split(val) if t.strip()]
 
         has_cats = any(t == "cats" for t in tokens)
         has_dogs = any(t == "dogs" for t in tokens)
@@ -347,45 +437,31 @@ def clean_pets_allowed(x):
 
 
     except BadDataException as e:
-        BAD_DATA["pets_allowed"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["pets_allowed"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
 def clean_price(x):
-    try:
-        return float(x)
-    except BadDataException as e:
-        BAD_DATA["price"].append(e.value)
-        return None
-    except Exception:
-        BAD_DATA["price"].append(x)
-        return None
+    price = to_float(x)
+    if price is None:
+        _reject(x, UNPARSEABLE)
+    return price
 
 
 def clean_price_display(x):
     try:
         if x is None:
-            print(f"found None {x}")
-            raise BadDataException(x)
-
-        val = str(x).strip()
+            # print(f"found None {x}")
+            raise BadDataException(x, MISSING)
 
-        # --- Detect "Weekly" / "Monthly" and print ---
-        if re.search(r'\b(weekly|monthly)\b', val, flags=re.IGNORECASE):
-            pass
-            # print(f"found recurring term {x}")
-
-        # --- Remove $ signs, commas, and spaces ---
-        val = val.replace("$", "").replace(",", "").strip()
-
-        # --- Extract numeric parts ---
-        range_match = re.findall(r"[\d.]+", val)
+        # --- Remove $ signs and commas, then extract the numeric parts in one scan ---
+        range_match = PRICE_NUMBER.findall(str(x).replace("$", "").replace(",", ""))
         if len(range_match) == 0:
             # print(f"found non numeric term {x}")
-            raise BadDataException(x)
+            raise BadDataException(x, UNPARSEABLE)
         elif len(range_match) == 1:
             return float(range_match[0])
         else:
@@ -394,10 +470,10 @@ def clean_price_display(x):
             return sum(nums) / len(nums)
 
     except BadDataException as e:
-        BAD_DATA["price_display"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["price_display"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -412,13 +488,13 @@ def clean_price_type(x):
             return "weekly"
 
         # print(f"found {x}")
-        raise BadDataException(x, " i cant intepret")
+        raise BadDataException(x, INVALID)  # i cant intepret
 
     except BadDataException as e:
-        BAD_DATA["price_type"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["price_type"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -426,12 +502,12 @@ def clean_square_feet(x):
     try:
         # Treat None and float('nan') as invalid
         if x is None:
-            raise BadDataException(x)
+            raise BadDataException(x, MISSING)
 
         val = str(x).strip()
 
         # Detect values that contain only numbers or a decimal
-        match = re.fullmatch(r"\d+(?:\.\d+)?", val)
+        match = SQUARE_FEET_NUMBER.fullmatch(val)
         if match:
             return float(val)
 
@@ -439,10 +515,10 @@ def clean_square_feet(x):
         raise BadDataException(x)
 
     except BadDataException as e:
-        BAD_DATA["square_feet"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["square_feet"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -450,49 +526,43 @@ def clean_address(x):
     try:
         # --- Handle missing / NaN values ---
         if x is None:
-            raise BadDataException(x)
+            raise BadDataException(x, MISSING)
 
         val = str(x).strip()
+        lower = val.lower()
 
         # --- Handle explicit invalid tokens ---
-        if val.lower() in {"", "none", "nan"}:
-            raise BadDataException(val)
-
-        # --- Reject coordinate-like values (e.g., "40.2659 -77.4948") ---
-        if re.fullmatch(r"^-?\d+(\.\d+)?\s*[,\s]\s*-?\d+(\.\d+)?$", val):
-            raise BadDataException(val)
-
-        # --- Reject numeric-only or "square feet" type values ---
-        if re.fullmatch(r"[\d., ]+$", val) or "square" in val.lower() or "sq" in val.lower():
-            raise BadDataException(val)
+        if lower in {"", "none", "nan"}:
+            raise BadDataException(val, MISSING)
 
-        # --- Basic address sanity check: must contain both a number and a letter ---
-        if not (re.search(r"\d", val) and re.search(r"[A-Za-z]", val)):
+        # --- Reject "square feet" type values, and anything without both a number and a letter, which covers
+        # coordinate-like (e.g., "40.2659 -77.4948") and numeric-only values ---
+        if "sq" in lower or not ADDRESS_DIGIT_AND_LETTER.search(val):
             raise BadDataException(val)
 
         # --- Normalize whitespace and punctuation ---
-        cleaned = re.sub(r"\s+", " ", val).strip(" ,.;-")
+        cleaned = WHITESPACE.sub(" ", val).strip(" ,.;-")
 
         return cleaned
 
     except BadDataException as e:
-        BAD_DATA["address"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["address"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
 def clean_city_name(x):
     try:
         if x is None:
-            raise BadDataException(x)
+            raise BadDataException(x, MISSING)
 
         raw = str(x).strip()
         if raw == "" or raw.lower() in {"nan", "none", "null", "n/a"}:
             return None
 
-        s = re.sub(r"\s+", " ", raw)
+        s = WHITESPACE.sub(" ", raw)
 
         # handle URLs, coordinates, numeric-only
         if URL_PAT.search(s) or COORD_PAIR.match(s) or NUM_ONLY.match(s):
@@ -504,30 +574,30 @@ def clean_city_name(x):
 
         s = _expand_leading_abbrev(s)
         s = _fix_prefix_patterns(s)
-        s = re.sub(r"\s+", " ", s).strip(" ,.;-")
+        s = WHITESPACE.sub(" ", s).strip(" ,.;-")
         s_lower = s.lower()
 
         # map counties to their city equivalents
-        for county, city in COUNTY_TO_CITY.items():
-            if county in s_lower:
-                return city
+        city = CITY_LOOKUP.county_city(s_lower)
+        if city is not None:
+            return city
 
         # reject pure state names
-        if s_lower in US_STATE_NAMES:
+        if s_lower in CITY_LOOKUP.state_names:
             raise BadDataException(raw)
 
         # normalize capitalization
         s = " ".join(t.capitalize() if not (t.isupper() and len(t) <= 3) else t for t in s.split())
-        if not re.search(r"[A-Za-z]", s):
+        if not LETTER.search(s):
             raise BadDataException(raw)
 
         return s
 
     except BadDataException as e:
-        BAD_DATA["cityname"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["cityname"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -535,59 +605,53 @@ def clean_state(x):
     try:
         state_abbrev = str(x).strip().upper()
         if state_abbrev not in STATE_MAP:
-            raise BadDataException(x, 'not a valid state')
+            raise BadDataException(x, INVALID)  # not a valid state
 
         return STATE_MAP[state_abbrev]
     except BadDataException as e:
-        BAD_DATA["state"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["state"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
 def clean_latitude(x):
-    try:
-        latitude = float(x)
-        out_of_range = latitude < -90.0 or latitude > 90.0
-
-        if out_of_range:
-            raise BadDataException(x, 'is out of range. Latitude values must be between -90 and 90 degrees.')
-
-        return latitude
-    except BadDataException as e:
-        BAD_DATA["latitude"].append(e.value)
-        return None
-    except Exception:
-        BAD_DATA["latitude"].append(x)
+    latitude = to_float(x)
+    if latitude is None:
+        _reject(x, UNPARSEABLE)
         return None
 
+    # Latitude values must be between -90 and 90 degrees
+    if latitude < -90.0 or latitude > 90.0:
+        _reject(x, OUT_OF_RANGE)
+        return None
 
-def clean_longitude(x):
-    try:
-        longitude = float(x)
-        out_of_range = longitude < -180.0 or longitude > 180.0
+    return latitude
 
-        if out_of_range:
-            raise BadDataException(x, 'is out of range. Longitude values must be between -180 and 180 degrees.')
 
-        return float(x)
-    except BadDataException as e:
-        BAD_DATA["longitude"].append(e.value)
+def clean_longitude(x):
+    longitude = to_float(x)
+    if longitude is None:
+        _reject(x, UNPARSEABLE)
         return None
-    except Exception:
-        BAD_DATA["longitude"].append(x)
+
+    # Longitude values must be between -180 and 180 degrees
+    if longitude < -180.0 or longitude > 180.0:
+        _reject(x, OUT_OF_RANGE)
         return None
 
+    return longitude
+
 
 def clean_source(x):
     try:
         return str(x).strip().lower()
     except BadDataException as e:
-        BAD_DATA["source"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["source"].append(x)
+        _reject(x, UNPARSEABLE)
         return None
 
 
@@ -595,67 +659,731 @@ def clean_time(x):
     try:
         return str(x)
     except BadDataException as e:
-        BAD_DATA["time"].append(e.value)
+        _reject(e.value, e.reason)
         return None
     except Exception:
-        BAD_DATA["time"].append(x)
-        return None
-
-
-def clean(uci_df) -> pandas.DataFrame:
-    for col in uci_df.columns:
-       BAD_DATA[col] = []
-
-    cleaned_uci_df = pandas.DataFrame()
-    cleaned_uci_df['id'] = uci_df['id'].apply(clean_id)
-    cleaned_uci_df['category'] = uci_df['category'].apply(clean_category)
-    cleaned_uci_df['title'] = uci_df['title']  # .apply(clean_title)
-    cleaned_uci_df['body'] = uci_df['body']  # .apply(clean_body)
-    cleaned_uci_df['amenities'] = uci_df['amenities'].apply(clean_amenities)
-    cleaned_uci_df['bathrooms'] = uci_df['bathrooms'].apply(clean_bathrooms)
-    cleaned_uci_df['bedrooms'] = uci_df['bedrooms'].apply(clean_bedrooms)
-    cleaned_uci_df['currency'] = uci_df['currency'].apply(clean_currency)
-    cleaned_uci_df['fee'] = uci_df['fee'].apply(clean_fee)
-    cleaned_uci_df['has_photo'] = uci_df['has_photo'].apply(clean_has_photo)
-    cleaned_uci_df['pets_allowed'] = uci_df['pets_allowed'].apply(clean_pets_allowed)
-    cleaned_uci_df['price'] = uci_df['price'].apply(clean_price)
-    cleaned_uci_df['price_display'] = uci_df['price_display'].apply(clean_price_display)
-    cleaned_uci_df['price_type'] = uci_df['price_type'].apply(clean_price_type)
-    cleaned_uci_df['square_feet'] = uci_df['square_feet'].apply(clean_square_feet)
-    cleaned_uci_df['address'] = uci_df['address'].apply(clean_address)
-    cleaned_uci_df['cityname'] = uci_df['cityname'].apply(clean_city_name)
-    cleaned_uci_df['state'] = uci_df['state'].apply(clean_state)
-    cleaned_uci_df['latitude'] = uci_df['latitude'].apply(clean_latitude)
-    cleaned_uci_df['longitude'] = uci_df['longitude'].apply(clean_longitude)
-    cleaned_uci_df['source'] = uci_df['source'].apply(clean_source)
-    cleaned_uci_df['time'] = uci_df['time'].apply(clean_time)
-    return cleaned_uci_df
-
-def cast(clean_uci_df):
-    dtypes = {
-        'id': 'Int64',
-        'category': 'string',
-        'title': 'string',
-        'body': 'string',
-        'amenities': 'string',
-        'bathrooms': 'Int64',
-        'bedrooms': 'Int64',
-        'currency': 'string',
-        'fee': 'boolean',
-        'has_photo': 'boolean',
-        'pets_allowed': 'string',
-        'price': 'Float64',
-        'price_display': 'Float64',
-        'price_type': 'string',
-        'square_feet': 'Float64',
-        'address': 'string',
-        'cityname': 'string',
-        'state': 'string',
-        'latitude': 'Float64',
-        'longitude': 'Float64',
-        'source': 'string',
-        'time': 'Float64',
-    }
-    casted_df = clean_uci_df.astype(dtypes, copy=True)
-
-    return casted_df
\ No newline at end of file
+        _reject(x, UNPARSEABLE)
+        return None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Vectorized cleaners
+#
+# Each clean_*_column function applies the same rule as its row-wise clean_* counterpart to a whole column and returns
+# (cleaned values, rejections). The rejections hold the value and reason the row-wise cleaner would have rejected,
+# indexed by the rows they came from, in row order.
+#
+# Raw columns are mostly low-cardinality text, and pandas string methods on object columns still loop in Python, so
+# text rules run once per distinct str(x) and are broadcast back to the rows with the factorized codes.
+# ----------------------------------------------------------------------------------------------------------------------
+
+def _as_str(values: pandas.Series) -> pandas.Series:
+    # str(x) for every cell, exactly as the row-wise cleaners see it (NaN -> 'nan', None -> 'None')
+    return values.astype(object).astype(str)
+
+
+def _factorize(strings: pandas.Series) -> tuple[numpy.ndarray, pandas.Series]:
+    """
+    Splits a column of strings into its distinct values
+    :param strings: str(x) of a column
+    :return: codes mapping each row to its distinct value, and the distinct values
+    """
+    codes, uniques = pandas.factorize(strings)
+    return codes, pandas.Series(uniques, dtype=object)
+
+
+def _rejections(bad: pandas.Series, reasons) -> pandas.DataFrame:
+    """
+    :param bad: rejected values, indexed by the rows they came from
+    :param reasons: reason for each rejected value, or one reason for all of them
+    :return: rejections as returned by the clean_*_column functions
+    """
+    return pandas.DataFrame({'value': bad, 'reason': reasons}, index=bad.index)
+
+
+def _is_none(values: pandas.Series, strings: pandas.Series) -> numpy.ndarray:
+    return (values.isna() & (strings == 'None')).to_numpy()
+
+
+def _int_column(numbers: numpy.ndarray, rejected: numpy.ndarray, index: pandas.Index) -> pandas.Series:
+    # int(float(x)) per cell; like Series.apply, ints with missing values come back as float64 and nothing but missing
+    # values as object
+    truncated = numpy.trunc(numbers) + 0.0
+    if rejected.all():
+        return pandas.Series(numpy.full(len(index), None, dtype=object), index=index)
+    if rejected.any():
+        return pandas.Series(numpy.where(rejected, numpy.nan, truncated), index=index)
+    return pandas.Series(truncated.astype('int64'), index=index)
+
+
+def _float_column(numbers: numpy.ndarray, rejected: numpy.ndarray, index: pandas.Index) -> pandas.Series:
+    if rejected.all():
+        return pandas.Series(numpy.full(len(index), None, dtype=object), index=index)
+    return pandas.Series(numpy.where(rejected, numpy.nan, numbers), index=index)
+
+
+def _bool_column(truth: numpy.ndarray, rejected: numpy.ndarray, index: pandas.Index) -> pandas.Series:
+    # like Series.apply, booleans with missing values stay object
+    if rejected.any():
+        out = truth.astype(object)
+        out[rejected] = None
+        return pandas.Series(out, index=index)
+    return pandas.Series(truth, index=index)
+
+
+def _object_column(values: numpy.ndarray, rejected: numpy.ndarray, index: pandas.Index) -> pandas.Series:
+    out = values.astype(object)
+    out[rejected] = None
+    return pandas.Series(out, index=index)
+
+
+def clean_id_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    if values.dtype.kind in 'biu':
+        return values.astype('int64'), _rejections(values.iloc[:0], UNPARSEABLE)
+    if values.dtype.kind == 'f':
+        numbers = values.to_numpy()
+        rejected = ~numpy.isfinite(numbers)
+        return _int_column(numbers, rejected, values.index), _rejections(values[rejected], UNPARSEABLE)
+
+    # object ids are unique per row and int(x) has no exact vectorized equivalent
+    cleaned = values.map(to_int)
+    return cleaned, _rejections(values[cleaned.isna().to_numpy()], UNPARSEABLE)
+
+
+def clean_category_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    val = val.str.lower().str.strip()
+    NORMALIZER_CACHES['category'].count(len(values) - len(val), len(val))
+    val = val.str.replace(r'\s*/\s*', '/', regex=True)
+    val = val.str.replace(r'(^|/)(ousing|ing)', r'\1housing', regex=True)
+
+    rejected = val.str.contains(r'(?:^|/)2(?:/|$)', regex=True).to_numpy()[codes]
+    categories = val.str.replace('/', ',', regex=False).to_numpy()[codes]
+    parts = val.str.split('/').to_numpy()[codes]
+    bad = pandas.Series(parts, index=values.index)[rejected]
+    return _object_column(categories, rejected, values.index), _rejections(bad, INVALID)
+
+
+def clean_amenities_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    NORMALIZER_CACHES['amenities'].count(len(values) - len(val), len(val))
+    val = val.str.lower().str.strip()
+    # every '/' or ',' separated piece, stripped, skipping the empty ones
+    parts = val.str.findall(r'[^/,\s](?:[^/,]*[^/,\s])?')
+    rejected = val.str.contains(r'(?:^|[/,])\s*nan\s*(?:[/,]|$)', regex=True).to_numpy()
+
+    # each row gets its own list, as with the row-wise cleaner
+    amenities = numpy.empty(len(values), dtype=object)
+    amenities[:] = [None if rejected[code] else list(parts.iat[code]) for code in codes]
+    bad = pandas.Series(parts.to_numpy()[codes], index=values.index)
+    return pandas.Series(amenities, index=values.index), _rejections(bad[rejected[codes]], MISSING)
+
+
+def _clean_count_column(values: pandas.Series, invalid_tokens: set[str]) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    val = val.str.strip().str.lower()
+    numbers, _ = parse_floats(val)
+    numbers = numbers[codes]
+
+    # invalid tokens, unparseable and infinite values all end up non-finite
+    rejected = ~numpy.isfinite(numbers)
+    reasons = numpy.select(
+        [(val == 'nan').to_numpy()[codes], val.isin(invalid_tokens).to_numpy()[codes]],
+        [MISSING, INVALID],
+        default=UNPARSEABLE,
+    )
+    return _int_column(numbers, rejected, values.index), _rejections(values[rejected], reasons[rejected])
+
+
+def clean_bathrooms_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    return _clean_count_column(values, {"no", "thumbnail"})
+
+
+def clean_bedrooms_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    return _clean_count_column(values, {"no", "thumbnail", "cats,dogs"})
+
+
+def clean_currency_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    val = val.str.strip().str.upper()
+
+    rejected = (val != 'USD').to_numpy()[codes]
+    return _object_column(val.to_numpy()[codes], rejected, values.index), _rejections(values[rejected], INVALID)
+
+
+def _clean_yes_no_column(values: pandas.Series, yes_values: set[str]) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    val = val.str.strip().str.lower()
+    yes = val.isin(yes_values).to_numpy()[codes]
+
+    rejected = ~(yes | (val == 'no').to_numpy()[codes])
+    return _bool_column(yes, rejected, values.index), _rejections(values[rejected], INVALID)
+
+
+def clean_fee_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    return _clean_yes_no_column(values, {'yes'})
+
+
+def clean_has_photo_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    return _clean_yes_no_column(values, {'yes', 'thumbnail'})
+
+
+def clean_pets_allowed_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    val = val.str.strip().str.lower()
+
+    def has_token(token: str) -> numpy.ndarray:
+        return val.str.contains(rf'(?:^|[,/])\s*{token}\s*(?:[,/]|$)', regex=True).to_numpy()
+
+    has_cats, has_dogs, has_none = has_token('cats'), has_token('dogs'), has_token('none')
+    pets = numpy.select(
+        [has_cats & has_dogs, has_cats, has_dogs, has_none],
+        ['Cats&Dogs', 'Cats', 'Dogs', 'X'],
+        default=None,
+    ).astype(object)
+
+    missing = (val == 'nan').to_numpy()[codes]
+    rejected = missing | val.str.isnumeric().to_numpy()[codes]
+    reasons = numpy.where(missing, MISSING, INVALID)
+    return _object_column(pets[codes], rejected, values.index), _rejections(values[rejected], reasons[rejected])
+
+
+def clean_price_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    numbers, rejected = parse_floats(values)
+    return _float_column(numbers, rejected, values.index), _rejections(values[rejected], UNPARSEABLE)
+
+
+def clean_price_display_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    strings = _as_str(values)
+    codes, val = _factorize(strings)
+    val = val.str.strip()
+    val = val.str.replace('$', '', regex=False).str.replace(',', '', regex=False).str.strip()
+    runs = val.str.findall(r'[\d.]+')
+    counts = runs.str.len().to_numpy()
+
+    numbers = numpy.full(len(val), numpy.nan)
+    # None has no digits, so it is rejected with the non-numeric values
+    rejected = counts == 0
+
+    single = counts == 1
+    numbers[single], rejected[single] = parse_floats(runs[single].str[0])
+
+    # price ranges; average them exactly the way the row-wise cleaner does
+    for i in numpy.flatnonzero(counts > 1):
+        try:
+            nums = [float(v) for v in runs.iat[i]]
+            numbers[i] = sum(nums) / len(nums)
+        except Exception:
+            rejected[i] = True
+
+    rejected = rejected[codes]
+    reasons = numpy.where(_is_none(values, strings), MISSING, UNPARSEABLE)
+    return _float_column(numbers[codes], rejected, values.index), _rejections(values[rejected], reasons[rejected])
+
+
+def clean_price_type_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    val = val.str.strip().str.lower()
+    monthly = val.str.contains('monthly', regex=False).to_numpy()
+    weekly = val.str.contains('weekly', regex=False).to_numpy()
+    price_type = numpy.select([monthly, weekly], ['monthly', 'weekly'], default=None).astype(object)
+
+    rejected = ~(monthly | weekly)[codes]
+    return _object_column(price_type[codes], rejected, values.index), _rejections(values[rejected], INVALID)
+
+
+def clean_square_feet_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    strings = _as_str(values)
+    codes, val = _factorize(strings)
+    val = val.str.strip()
+    # None fails the match as 'None'
+    matched = val.str.fullmatch(r'\d+(?:\.\d+)?').to_numpy()
+
+    numbers = numpy.full(len(val), numpy.nan)
+    numbers[matched], _ = parse_floats(val[matched])
+
+    rejected = ~matched[codes]
+    reasons = numpy.where(_is_none(values, strings), MISSING, INVALID)
+    return _float_column(numbers[codes], rejected, values.index), _rejections(values[rejected], reasons[rejected])
+
+
+def clean_address_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    strings = _as_str(values)
+    codes, val = _factorize(strings)
+    val = val.str.strip()
+    lower = val.str.lower()
+
+    missing = lower.isin({'', 'none', 'nan'}).to_numpy()
+    # coordinate-like and numeric-only values have no letters
+    rejected = missing[codes] | (
+            lower.str.contains('sq', regex=False)  # also covers "square"
+            | ~val.str.contains(ADDRESS_DIGIT_AND_LETTER)
+    ).to_numpy()[codes]
+    cleaned = val.str.replace(WHITESPACE, ' ', regex=True).str.strip(' ,.;-')
+
+    # None is rejected as itself, everything else as its stripped string
+    bad = pandas.Series(val.to_numpy()[codes], index=values.index)
+    bad[_is_none(values, strings)] = None
+    reasons = numpy.where(missing[codes], MISSING, INVALID)
+    cleaned = _object_column(cleaned.to_numpy()[codes], rejected, values.index)
+    return cleaned, _rejections(bad[rejected], reasons[rejected])
+
+
+def _capitalize_city_tokens(cities: pandas.Series) -> numpy.ndarray:
+    # " ".join(t.capitalize() if not (t.isupper() and len(t) <= 3) else t for t in s.split())
+    words = cities.str.split(' ')
+    tokens = pandas.Series([t for w in words for t in w], dtype=object)
+    keep = tokens.str.isupper() & (tokens.str.len() <= 3)
+    tokens = tokens.where(keep, tokens.str.capitalize())
+
+    rows = numpy.repeat(numpy.arange(len(words)), words.str.len().to_numpy())
+    return tokens.groupby(rows, sort=False).agg(' '.join).to_numpy(dtype=object)
+
+
+def _city_names(raw: pandas.Series, lookup: CityLookup) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    clean_city_name's rules over distinct, stripped, non-None values
+    :param raw: stripped str(x) values
+    :param lookup: tables to go by
+    :return: city names (None where missing or rejected) and a rejected mask
+    """
+    cities = numpy.full(len(raw), None, dtype=object)
+    missing = ((raw == '') | raw.str.lower().isin({'nan', 'none', 'null', 'n/a'})).to_numpy()
+
+    # handle URLs, coordinates, numeric-only and disallowed characters
+    s = raw.str.replace(r'\s+', ' ', regex=True)
+    rejected = ~missing & (
+            s.str.count(URL_PAT).gt(0)
+            | s.str.match(COORD_PAIR)
+            | s.str.match(NUM_ONLY)
+            | ~s.str.match(ALLOWED_CHARS)
+    ).to_numpy()
+
+    candidates = numpy.flatnonzero(~(rejected | missing))
+    if not len(candidates):
+        # str.partition of an empty Series has no columns to take apart
+        return cities, rejected
+    s = s.iloc[candidates]
+
+    # _expand_leading_abbrev
+    parts = s.str.partition(' ')
+    expanded = parts[0].str.lower().str.strip('.,').map(lookup.abbreviations)
+    s = s.where(expanded.isna(), expanded + parts[1] + parts[2])
+
+    # _fix_prefix_patterns
+    s = s.str.replace(r"\bO\s+([A-Za-z])", r"O'\1", regex=True)
+    s = s.str.replace(r"\bMc\s+([A-Za-z])", r"Mc\1", regex=True)
+    s = s.str.replace(r'\s+', ' ', regex=True).str.strip(' ,.;-')
+    s_lower = s.str.lower()
+
+    # map counties to their city equivalents, first match wins
+    county_city = numpy.array([lookup.county_city(name) for name in s_lower], dtype=object)
+    is_county = pandas.notna(county_city)
+    cities[candidates[is_county]] = county_city[is_county]
+
+    # reject pure state names
+    is_state = ~is_county & s_lower.isin(lookup.state_names).to_numpy()
+    rejected[candidates[is_state]] = True
+
+    # normalize capitalization
+    remaining = ~(is_county | is_state)
+    capitalized = _capitalize_city_tokens(s[remaining])
+    no_letters = ~pandas.Series(capitalized, dtype=object).str.contains(r'[A-Za-z]', regex=True).to_numpy(dtype=bool)
+    rejected[candidates[remaining][no_letters]] = True
+    cities[candidates[remaining][~no_letters]] = capitalized[~no_letters]
+
+    return cities, rejected
+
+
+def clean_city_name_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    strings = _as_str(values)
+    codes, raw = _factorize(strings)
+    NORMALIZER_CACHES['cityname'].count(len(values) - len(raw), len(raw))
+    raw = raw.str.strip()
+    lookup = CITY_LOOKUP
+    cities, rejected = lookup.normalize(raw, lambda unknown: _city_names(unknown, lookup))
+    cities, rejected = cities[codes], rejected[codes]
+
+    # None is rejected as itself; the string 'None' is just missing
+    is_none = _is_none(values, strings)
+    cities[is_none] = None
+    rejected[is_none] = True
+    bad = pandas.Series(raw.to_numpy()[codes], index=values.index)
+    bad[is_none] = None
+    reasons = numpy.where(is_none, MISSING, INVALID)
+    return pandas.Series(cities, index=values.index), _rejections(bad[rejected], reasons[rejected])
+
+
+def clean_state_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    NORMALIZER_CACHES['state'].count(len(values) - len(val), len(val))
+    states = val.str.strip().str.upper().map(STATE_MAP).to_numpy(dtype=object)[codes]
+
+    rejected = pandas.isna(states)
+    return _object_column(states, rejected, values.index), _rejections(values[rejected], INVALID)
+
+
+def clean_latitude_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    numbers, failed = parse_floats(values)
+
+    rejected = failed | (numbers < -90.0) | (numbers > 90.0)
+    reasons = numpy.where(failed, UNPARSEABLE, OUT_OF_RANGE)
+    return _float_column(numbers, rejected, values.index), _rejections(values[rejected], reasons[rejected])
+
+
+def clean_longitude_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    numbers, failed = parse_floats(values)
+
+    rejected = failed | (numbers < -180.0) | (numbers > 180.0)
+    reasons = numpy.where(failed, UNPARSEABLE, OUT_OF_RANGE)
+    return _float_column(numbers, rejected, values.index), _rejections(values[rejected], reasons[rejected])
+
+
+def clean_source_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    codes, val = _factorize(_as_str(values))
+    cleaned = pandas.Series(val.str.strip().str.lower().to_numpy()[codes], index=values.index)
+    return cleaned, _rejections(values.iloc[:0], UNPARSEABLE)
+
+
+def clean_time_column(values: pandas.Series) -> tuple[pandas.Series, pandas.DataFrame]:
+    return _as_str(values), _rejections(values.iloc[:0], UNPARSEABLE)
+
+
+# Version of the cleaning rules; bump it with any change to what a cleaner returns or rejects, so results kept from
+# earlier runs (incremental.clean_incremental's state store) are cleaned again
+CLEANER_VERSION = 1
+
+# Row-wise and vectorized cleaner for each column; None passes the column through untouched
+ROW_CLEANERS = {
+    'id': clean_id,
+    'category': clean_category,
+    'title': None,  # clean_title
+    'body': None,  # clean_body
+    'amenities': clean_amenities,
+    'bathrooms': clean_bathrooms,
+    'bedrooms': clean_bedrooms,
+    'currency': clean_currency,
+    'fee': clean_fee,
+    'has_photo': clean_has_photo,
+    'pets_allowed': clean_pets_allowed,
+    'price': clean_price,
+    'price_display': clean_price_display,
+    'price_type': clean_price_type,
+    'square_feet': clean_square_feet,
+    'address': clean_address,
+    'cityname': clean_city_name,
+    'state': clean_state,
+    'latitude': clean_latitude,
+    'longitude': clean_longitude,
+    'source': clean_source,
+    'time': clean_time,
+}
+
+COLUMN_CLEANERS = {
+    'id': clean_id_column,
+    'category': clean_category_column,
+    'title': None,
+    'body': None,
+    'amenities': clean_amenities_column,
+    'bathrooms': clean_bathrooms_column,
+    'bedrooms': clean_bedrooms_column,
+    'currency': clean_currency_column,
+    'fee': clean_fee_column,
+    'has_photo': clean_has_photo_column,
+    'pets_allowed': clean_pets_allowed_column,
+    'price': clean_price_column,
+    'price_display': clean_price_display_column,
+    'price_type': clean_price_type_column,
+    'square_feet': clean_square_feet_column,
+    'address': clean_address_column,
+    'cityname': clean_city_name_column,
+    'state': clean_state_column,
+    'latitude': clean_latitude_column,
+    'longitude': clean_longitude_column,
+    'source': clean_source_column,
+    'time': clean_time_column,
+}
+
+# Text columns with few distinct values; the row-wise cleaners run once per distinct value, kept across clean() calls.
+# Each worker process of clean(workers=N) has caches of its own.
+NORMALIZER_CACHES = {
+    'category': NormalizerCache(),
+    'amenities': NormalizerCache(),
+    'cityname': NormalizerCache(),
+    'state': NormalizerCache(),
+}
+
+
+def use_city_lookup(lookup: CityLookup) -> None:
+    """
+    Makes the city cleaners go by another CityLookup, e.g. one with more counties or CityLookup.load() of a saved one.
+    Worker processes of clean(workers=N) that are started afterwards get it too where processes are forked.
+    :param lookup: tables and canonical-city dictionary to use from now on
+    """
+    global CITY_LOOKUP
+    CITY_LOOKUP = lookup
+    NORMALIZER_CACHES['cityname'].clear()
+
+
+def normalizer_cache_stats() -> pandas.DataFrame:
+    """
+    :return: lookups, hits, misses, hit rate and cached entries per column, for this process
+    """
+    return pandas.DataFrame([
+        {
+            'column': col,
+            'lookups': cache.hits + cache.misses,
+            'hits': cache.hits,
+            'misses': cache.misses,
+            'hit_rate': cache.hit_rate,
+            'size': len(cache),
+        }
+        for col, cache in NORMALIZER_CACHES.items()
+    ])
+
+
+def _projection(columns) -> list[str]:
+    if columns is None:
+        return list(ROW_CLEANERS)
+    columns = list(columns)
+    unknown = [col for col in columns if col not in ROW_CLEANERS]
+    if unknown:
+        raise KeyError(f'no cleaner for columns {unknown}')
+    return [col for col in ROW_CLEANERS if col in columns]
+
+
+def _clean_column(values: pandas.Series, col: str, vectorized: bool, ledger: RejectionLedger,
+                  measure) -> pandas.Series:
+    # values are indexed by row position, which is what the ledger records
+    # Series.apply has its own dtype rules for empty input; not worth reproducing
+    if vectorized and len(values):
+        cleaner = COLUMN_CLEANERS[col]
+        if cleaner is None:
+            return values
+        with measure(col, len(values), NORMALIZER_CACHES.get(col)) as measurement:
+            cleaned, rejections = cleaner(values)
+            measurement['rejected'] = len(rejections)
+        ledger.extend(col, rejections.index, rejections['value'], rejections['reason'])
+        return cleaned
+
+    cleaner = ROW_CLEANERS[col]
+    if cleaner is None:
+        return values
+    if col in NORMALIZER_CACHES:
+        cleaner = _memoized(cleaner, NORMALIZER_CACHES[col])
+
+    rejections = _RowRejections()
+    token = _ROW_REJECTIONS.set(rejections)
+    try:
+        with measure(col, len(values), NORMALIZER_CACHES.get(col)) as measurement:
+            cleaned = values.apply(rejections.track(cleaner))
+            measurement['rejected'] = len(rejections.positions)
+    finally:
+        _ROW_REJECTIONS.reset(token)
+    ledger.extend(col, rejections.positions, rejections.values, rejections.reasons)
+    return cleaned
+
+
+def clean(uci_df, vectorized: bool = False, ledger: RejectionLedger | None = None, workers: int = 1,
+          chunksize: int | None = None, profile: CleanProfile | None = None,
+          columns=None) -> tuple[pandas.DataFrame, RejectionLedger]:
+    """
+    Cleans the raw UCI apartment listings
+    :param uci_df: raw dataframe from UcIrvineAPI.fetch_dataset
+    :param vectorized: clean whole columns at once with the clean_*_column functions instead of row by row.
+    The output and rejections are identical either way.
+    :param ledger: where to record rejected values; a new RejectionLedger by default
+    :param workers: processes to clean chunks of rows in. The output and rejections are identical to a single process,
+    but for the rejections a ledger with sample=True keeps: each chunk samples with a seed of its own, so the sample
+    varies with the chunks, and with workers unless chunksize is given. The totals per column and reason don't.
+    :param chunksize: rows per chunk when workers > 1; by default each worker gets about four chunks
+    :param profile: where to record the time, throughput, memory, rejections and cache hits of each cleaner
+    :param columns: clean only these columns, e.g. ['price', 'state']; uci_df needs no others. All by default.
+    :return: cleaned dataframe and the rejections of this run, by row position in uci_df
+    """
+    if ledger is None:
+        ledger = RejectionLedger()
+    measure = unmeasured if profile is None else profile.measure
+    columns = _projection(columns)
+
+    if workers > 1 and len(uci_df):
+        return _clean_chunks(uci_df, vectorized, ledger, workers, chunksize, profile, columns)
+
+    cleaned_uci_df = pandas.DataFrame({
+        col: _clean_column(uci_df[col].reset_index(drop=True), col, vectorized, ledger, measure) for col in columns
+    })
+    cleaned_uci_df.index = uci_df.index
+    return cleaned_uci_df, ledger
+
+
+def _clean_chunk(uci_df, vectorized: bool, ledger: RejectionLedger, profile: CleanProfile | None,
+                 columns: list[str]) -> tuple[pandas.DataFrame, RejectionLedger, CleanProfile | None]:
+    # runs in a worker process; the profile comes back with the results to be merged
+    cleaned_uci_df, ledger = clean(uci_df, vectorized, ledger, profile=profile, columns=columns)
+    return cleaned_uci_df, ledger, profile
+
+
+def _clean_chunks(uci_df, vectorized: bool, ledger: RejectionLedger, workers: int, chunksize: int | None,
+                  profile: CleanProfile | None = None,
+                  columns: list[str] | None = None) -> tuple[pandas.DataFrame, RejectionLedger]:
+    if chunksize is None:
+        chunksize = -(-len(uci_df) // (workers * 4))
+    starts = range(0, len(uci_df), chunksize)
+    chunks = (uci_df.iloc[start:start + chunksize] for start in starts)
+    chunk_ledgers = (ledger.child(number) for number in range(len(starts)))
+    chunk_profiles = (None if profile is None else profile.child() for _ in starts)
+
+    frames = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map yields in submission order, so chunks are merged in row order however the workers finish
+        results = executor.map(_clean_chunk, chunks, repeat(vectorized), chunk_ledgers, chunk_profiles,
+                               repeat(_projection(columns)))
+        for start, (frame, chunk_ledger, chunk_profile) in zip(starts, results):
+            frames.append(frame)
+            ledger.merge(chunk_ledger, offset=start)
+            if profile is not None:
+                profile.merge(chunk_profile)
+
+    # a chunk where a column was rejected entirely comes back as object; infer those columns over all chunks like
+    # Series.apply does over the whole frame
+    mixed = {col: object for col in frames[0].columns if len({frame[col].dtype for frame in frames}) > 1}
+    cleaned_uci_df = pandas.concat([frame.astype(mixed) for frame in frames])
+    for col in mixed:
+        cleaned_uci_df[col] = cleaned_uci_df[col].infer_objects()
+    return cleaned_uci_df, ledger
+
+
+# dtype of each column after cast()
+CAST_DTYPES = {
+    'id': 'Int64',
+    'category': 'string',
+    'title': 'string',
+    'body': 'string',
+    'amenities': 'string',
+    'bathrooms': 'Int64',
+    'bedrooms': 'Int64',
+    'currency': 'string',
+    'fee': 'boolean',
+    'has_photo': 'boolean',
+    'pets_allowed': 'string',
+    'price': 'Float64',
+    'price_display': 'Float64',
+    'price_type': 'string',
+    'square_feet': 'Float64',
+    'address': 'string',
+    'cityname': 'string',
+    'state': 'string',
+    'latitude': 'Float64',
+    'longitude': 'Float64',
+    'source': 'string',
+    'time': 'Float64',
+}
+
+
+def cast(clean_uci_df, copy: bool = True, compact: bool = False):
+    """
+    Casts a cleaned dataframe to nullable dtypes
+    :param clean_uci_df: dataframe from clean(), with all of its columns or some
+    :param copy: copy columns even where the dtype is unchanged
+    :param compact: use the dtypes from compact_dtypes() and an amenities bitmask instead, with a column more per 64
+    amenities past the first 64 (amenities_bitmask()); see dtype_report()
+    :return: cast dataframe
+    """
+    if compact:
+        return _compact_cast(clean_uci_df)
+
+    dtypes = {col: dtype for col, dtype in CAST_DTYPES.items() if col in clean_uci_df.columns}
+    casted_df = clean_uci_df.astype(dtypes, copy=copy)
+
+    return casted_df
+
+
+# Arrow-backed strings take a fraction of the memory of Python str objects, when pyarrow is installed
+TEXT_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else 'string'
+
+# Columns with a few hundred distinct values at most
+CATEGORY_COLUMNS = ['category', 'currency', 'pets_allowed', 'price_type', 'cityname', 'state', 'source']
+TEXT_COLUMNS = ['title', 'body', 'address']
+INT_COLUMNS = ['id', 'bathrooms', 'bedrooms']
+FLOAT_COLUMNS = ['price', 'price_display', 'square_feet', 'latitude', 'longitude', 'time']
+BOOL_COLUMNS = ['fee', 'has_photo']
+
+
+def _smallest_int_dtype(values: pandas.Series) -> str:
+    numbers = values.astype('Int64')
+    if numbers.isna().all():
+        return 'Int8'
+    low, high = numbers.min(), numbers.max()
+    for dtype in ('Int8', 'Int16', 'Int32'):
+        info = numpy.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+    return 'Int64'
+
+
+def _float_dtype(values: pandas.Series) -> str:
+    # Float32 only when every value survives the round trip, e.g. whole dollar prices but not coordinates
+    numbers = values.astype('Float64').to_numpy(dtype='float64', na_value=numpy.nan)
+    narrowed = numbers.astype('float32').astype('float64')
+    return 'Float32' if numpy.array_equal(narrowed, numbers, equal_nan=True) else 'Float64'
+
+
+def compact_dtypes(clean_uci_df) -> dict[str, str]:
+    """
+    Picks the narrowest dtype that holds every value of each column
+    :param clean_uci_df: dataframe from clean(), with all of its columns or some
+    :return: dtype per column, amenities excluded
+    """
+    present = set(clean_uci_df.columns)
+    dtypes = {}
+    dtypes.update({col: 'category' for col in CATEGORY_COLUMNS if col in present})
+    dtypes.update({col: TEXT_DTYPE for col in TEXT_COLUMNS if col in present})
+    dtypes.update({col: _smallest_int_dtype(clean_uci_df[col]) for col in INT_COLUMNS if col in present})
+    dtypes.update({col: _float_dtype(clean_uci_df[col]) for col in FLOAT_COLUMNS if col in present})
+    dtypes.update({col: 'boolean' for col in BOOL_COLUMNS if col in present})
+    return dtypes
+
+
+def amenities_bitmask(amenities: pandas.Series) -> tuple[pandas.DataFrame, list[str]]:
+    """
+    Encodes lists of amenities as bitmasks over their vocabulary; the order of a list and repeats in it are not kept
+    :param amenities: amenities column from clean(), a list per row or None
+    :return: UInt64 bitmask per row, <NA> where None, as one column per 64 amenities (word_columns(): amenities,
+    amenities_1, ...), and the vocabulary, bit i % 64 of word i // 64 for vocabulary[i]; see AmenityIndex
+    """
+    index = AmenityIndex.from_lists(amenities)
+    missing = ~index.present
+    return pandas.DataFrame({col: pandas.arrays.IntegerArray(index.bits[:, i], missing)
+                             for i, col in enumerate(word_columns(index.words))},
+                            index=amenities.index), index.vocabulary
+
+
+def _compact_cast(clean_uci_df) -> pandas.DataFrame:
+    casted_df = clean_uci_df.astype(compact_dtypes(clean_uci_df))
+    if 'amenities' in clean_uci_df.columns:
+        bitmask, vocabulary = amenities_bitmask(clean_uci_df['amenities'])
+        casted_df['amenities'] = bitmask['amenities']
+        # the words past the first follow it
+        at = casted_df.columns.get_loc('amenities')
+        for i, col in enumerate(bitmask.columns[1:], start=1):
+            casted_df.insert(at + i, col, bitmask[col])
+        casted_df.attrs['amenities'] = vocabulary
+    return casted_df
+
+
+def dtype_report(before, after) -> pandas.DataFrame:
+    """
+    Compares the memory of two versions of a dataframe, e.g. cast() and cast(compact=True)
+    :param before: dataframe
+    :param after: dataframe with the same columns
+    :return: dtype and bytes per column before and after, and the ratio, with a total row
+    """
+    report = pandas.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(index=False, deep=True),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['total'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report['ratio'] = report['bytes_before'] / report['bytes_after']
+    return report
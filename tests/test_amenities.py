@@ -0,0 +1,86 @@
+import numpy
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.amenities import AmenityIndex, word_columns
+from source.synthetic import make_listings
+
+# more amenities than fit in one 64-bit word
+NAMES = [f'amenity {chr(97 + i // 26)}{chr(97 + i % 26)}' for i in range(100)]
+
+
+@pytest.fixture(scope='module')
+def cleaned():
+    rng = numpy.random.default_rng(9)
+    raw = make_listings(1_000, seed=9)
+    raw['amenities'] = [','.join(rng.choice(NAMES, rng.integers(1, 12), replace=False)) for _ in range(len(raw))]
+    raw.loc[::17, 'amenities'] = numpy.nan
+    # a None is the text 'None' to clean_amenities(), an amenity of its own
+    raw.loc[::29, 'amenities'] = None
+    return wrangling_utils.clean(raw, columns=['amenities'])[0]
+
+
+QUERIES = [
+    {},
+    {'all_of': ['amenity aa']},
+    {'all_of': ['amenity ab', 'amenity dv']},
+    {'any_of': ['amenity cz', 'amenity dv', 'amenity ba']},
+    {'none_of': ['amenity aa', 'amenity cx']},
+    {'any_of': ['none', 'amenity da']},
+    {'all_of': ['amenity cw'], 'any_of': ['amenity ac', 'amenity dt'], 'none_of': ['amenity bk']},
+    {'all_of': ['amenity aa', 'sauna']},
+    {'any_of': ['sauna', 'amenity dr']},
+    {'none_of': ['sauna']},
+]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_mask_matches_set_checks(cleaned, query):
+    index = AmenityIndex.from_lists(cleaned['amenities'])
+    assert set(NAMES) <= set(index.vocabulary) and index.words == 2
+
+    def matches(items) -> bool:
+        if items is None:
+            return False
+        items = set(items)
+        return (all(a in items for a in query.get('all_of', ()))
+                and (not query.get('any_of') or any(a in items for a in query['any_of']))
+                and not any(a in items for a in query.get('none_of', ())))
+
+    expected = numpy.array([matches(items) for items in cleaned['amenities']])
+    assert cleaned['amenities'].isna().any() and (expected.any() or 'sauna' in query.get('all_of', ()))
+    numpy.testing.assert_array_equal(index.mask(**query), expected)
+    pandas.testing.assert_frame_equal(index.filter(cleaned, **query), cleaned[expected])
+
+
+def test_multi_hot_and_frequencies(cleaned):
+    index = AmenityIndex.from_lists(cleaned['amenities'])
+    dense = index.multi_hot(sparse=False)
+    expected = numpy.array([[items is not None and name in items for name in index.vocabulary]
+                            for items in cleaned['amenities']], dtype='uint8')
+    numpy.testing.assert_array_equal(dense, expected)
+    assert (index.multi_hot().toarray() == dense).all()
+    assert index.frequencies().to_dict() == dict(zip(index.vocabulary, expected.sum(axis=0).tolist()))
+
+
+def test_compact_cast_past_64_amenities(cleaned):
+    compact = wrangling_utils.cast(cleaned, compact=True)
+    assert list(compact.columns) == word_columns(2) == ['amenities', 'amenities_1']
+    assert (compact.dtypes == 'UInt64').all()
+
+    index = AmenityIndex.from_bitmask(compact[word_columns(2)], compact.attrs['amenities'])
+    expected = AmenityIndex.from_lists(cleaned['amenities'])
+    assert index.vocabulary == expected.vocabulary
+    numpy.testing.assert_array_equal(index.bits, expected.bits)
+    numpy.testing.assert_array_equal(index.present, expected.present)
+    for query in QUERIES:
+        numpy.testing.assert_array_equal(index.mask(**query), expected.mask(**query))
+
+
+def test_compact_cast_within_64_amenities():
+    cleaned, _ = wrangling_utils.clean(make_listings(500, seed=4))
+    compact = wrangling_utils.cast(cleaned, compact=True)
+    assert list(compact.columns) == list(cleaned.columns) and compact['amenities'].dtype == 'UInt64'
+    index = AmenityIndex.from_bitmask(compact['amenities'], compact.attrs['amenities'])
+    numpy.testing.assert_array_equal(index.bits, AmenityIndex.from_lists(cleaned['amenities']).bits)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas
+import pytest
+
+from source import async_fetch
+from source.async_fetch import DatasetNotFoundError, fetch_datasets
+from source.dataset_cache import DatasetCache
+
+CSVS = {
+    1: 'id,price,state\n1,1200,CA\n2,950,TX\n',
+    2: 'id,price,state\n3,800,NY\n',
+}
+
+
+class StandIn:
+    """
+    Local stand-in for the UCI API: /api/dataset?id= answers metadata, /data/<id>.csv the data file. Ids in fail_once
+    get a 503 on their first metadata request; ids in stall hold their data file until released.
+    """
+
+    def __init__(self, fail_once=(), stall=()):
+        self.requests = Counter()
+        self.fail_once = set(fail_once)
+        self.stall = set(stall)
+        self.released = threading.Event()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body: bytes, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                stand_in.requests[url.path + '?' + url.query] += 1
+                if url.path == '/api/dataset':
+                    repo_id = int(parse_qs(url.query)['id'][0])
+                    if repo_id in stand_in.fail_once:
+                        stand_in.fail_once.discard(repo_id)
+                        return self._send(503, b'{}')
+                    if repo_id not in CSVS:
+                        return self._send(200, json.dumps({'status': 404, 'message': 'not found'}).encode())
+                    metadata = {'name': f'dataset {repo_id}', 'data_url': f'{stand_in.url}/data/{repo_id}.csv',
+                                'variables': [{'name': name, 'role': 'ID' if name == 'id' else 'Feature'}
+                                              for name in ('id', 'price', 'state')]}
+                    return self._send(200, json.dumps({'status': 200, 'data': metadata}).encode())
+                repo_id = int(url.path.rsplit('/', 1)[1].split('.')[0])
+                if repo_id in stand_in.stall:
+                    stand_in.released.wait(10)
+                self._send(200, CSVS[repo_id].encode(), 'text/csv')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.api_url = f'{self.url}/api/dataset'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.released.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(StandIn(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _fetch(server, repo_ids, **kwargs):
+    kwargs.setdefault('cache', False)
+    return asyncio.run(fetch_datasets(repo_ids, api_url=server.api_url, backoff=0.01, **kwargs))
+
+
+def test_fetches_each_dataset(stand_in, tmp_path, monkeypatch):
+    server = stand_in()
+    # downloads go to the directory given, with no temporary directory made
+    monkeypatch.setattr(async_fetch.tempfile, 'TemporaryDirectory', None)
+    datasets = _fetch(server, [2, 1, 2], download_directory=tmp_path)
+    assert list(datasets) == [2, 1]
+    for repo_id, dataset in datasets.items():
+        pandas.testing.assert_frame_equal(dataset.data.original, pandas.read_csv(tmp_path / f'{repo_id}.csv'))
+        assert dataset.data.ids.columns.tolist() == ['id']
+        assert dataset.metadata['name'] == f'dataset {repo_id}'
+
+
+def test_retries_a_503(stand_in):
+    server = stand_in(fail_once=[1])
+    assert _fetch(server, [1])[1].data.original['price'].tolist() == [1200, 950]
+    assert server.requests['/api/dataset?id=1'] == 2
+
+    server = stand_in(fail_once=[1])
+    with pytest.raises(ConnectionError, match='HTTP 503'):
+        _fetch(server, [1], retries=0)
+
+
+def test_unknown_id_cancels_the_others(stand_in, tmp_path):
+    server = stand_in(stall=[1])
+    start = time.perf_counter()
+    with pytest.raises(DatasetNotFoundError):
+        _fetch(server, [1, 404], download_directory=tmp_path)
+    # the stalled download was cancelled rather than waited on, and left no partial file
+    assert time.perf_counter() - start < 5
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_reuses_the_cache(stand_in, tmp_path):
+    server = stand_in()
+    cache = DatasetCache(tmp_path / 'cache')
+    first = _fetch(server, [1, 2], cache=cache)
+    fetched = sum(server.requests.values())
+    assert fetched == 4
+
+    second = _fetch(server, [1, 2], cache=cache)
+    assert sum(server.requests.values()) == fetched
+    for repo_id in (1, 2):
+        pandas.testing.assert_frame_equal(second[repo_id].data.original, first[repo_id].data.original)
+
+    # a dataset new to the cache is the only one fetched
+    CSVS[3] = CSVS[2]
+    try:
+        _fetch(server, [1, 3], cache=cache)
+    finally:
+        del CSVS[3]
+    assert sum(server.requests.values()) == fetched + 2
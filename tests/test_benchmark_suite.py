@@ -0,0 +1,66 @@
+import platform
+
+import pandas
+import pytest
+
+from source import benchmark_suite
+from source.benchmark_suite import append_history, compare, load_history
+
+
+def _results(seconds: float, benchmark: str = 'clean', rows: int = 1_000) -> pandas.DataFrame:
+    return pandas.DataFrame([{'benchmark': benchmark, 'rows': rows, 'seconds': seconds,
+                              'rows_per_second': rows / seconds}])
+
+
+def test_history_round_trip(tmp_path):
+    path = tmp_path / 'history' / 'benchmarks.jsonl'
+    assert load_history(path).empty
+
+    append_history(_results(1.0), path)
+    append_history(pandas.concat([_results(2.0), _results(0.5, 'cast')]), path)
+    history = load_history(path)
+    assert history['seconds'].tolist() == [1.0, 2.0, 0.5]
+    assert history['benchmark'].tolist() == ['clean', 'clean', 'cast']
+    assert (history['host'] == platform.node()).all()
+    assert (history['python'] == platform.python_version()).all()
+    assert history['run_at'].notna().all()
+
+
+def test_empty_history_is_no_regression(tmp_path):
+    compared = compare(_results(1.0), load_history(tmp_path / 'missing.jsonl'))
+    assert compared['baseline_seconds'].isna().all()
+    assert not compared['regressed'].any()
+
+
+@pytest.mark.parametrize('seconds, regressed', [(1.2, False), (1.3, True), (0.5, False)])
+def test_slowdown_over_the_threshold_regresses(tmp_path, seconds, regressed):
+    path = tmp_path / 'history.jsonl'
+    for baseline in [0.9, 1.0, 1.1]:
+        append_history(_results(baseline), path)
+
+    compared = compare(_results(seconds), load_history(path), threshold=0.25)
+    assert compared['baseline_seconds'].tolist() == [1.0]
+    assert compared['ratio'].tolist() == [pytest.approx(seconds)]
+    assert compared['regressed'].tolist() == [regressed]
+
+
+def test_baseline_is_the_median_of_the_recent_runs(tmp_path):
+    path = tmp_path / 'history.jsonl'
+    for baseline in [9.0, 9.0, 9.0, 1.0, 1.0, 1.0]:
+        append_history(_results(baseline), path)
+    assert compare(_results(1.0), load_history(path), window=3)['baseline_seconds'].tolist() == [1.0]
+    assert compare(_results(1.0), load_history(path), window=6)['baseline_seconds'].tolist() == [5.0]
+
+
+def test_other_hosts_and_sizes_are_not_compared(tmp_path, monkeypatch):
+    path = tmp_path / 'history.jsonl'
+    append_history(_results(1.0), path)
+    append_history(_results(0.1, rows=10_000), path)
+    monkeypatch.setattr(benchmark_suite.platform, 'node', lambda: 'slower-laptop')
+    append_history(_results(10.0), path)
+
+    # on the slower host only its own run is the baseline
+    assert compare(_results(10.0), load_history(path))['regressed'].tolist() == [False]
+    monkeypatch.undo()
+    compared = compare(pandas.concat([_results(10.0), _results(0.1, 'cast')], ignore_index=True), load_history(path))
+    assert compared['baseline_seconds'].tolist()[0] == 1.0 and compared['regressed'].tolist() == [True, False]
@@ -0,0 +1,89 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.city_lookup import CityLookup
+from source.synthetic import make_listings
+
+
+@pytest.fixture
+def small_lookup():
+    lookup = CityLookup(wrangling_utils.COUNTY_TO_CITY, wrangling_utils.ABBREV_MAP, wrangling_utils.US_STATE_NAMES,
+                        maxsize=5)
+    default = wrangling_utils.CITY_LOOKUP
+    wrangling_utils.use_city_lookup(lookup)
+    yield lookup
+    wrangling_utils.use_city_lookup(default)
+
+
+def test_canonical_dictionary_is_bounded(small_lookup):
+    raw = make_listings(500, seed=2, dirty=0.3)
+    expected, _ = wrangling_utils.clean(raw)
+    for start in range(0, len(raw), 100):
+        chunk = raw.iloc[start:start + 100]
+        cleaned, _ = wrangling_utils.clean(chunk, vectorized=True)
+        assert cleaned['cityname'].tolist() == expected['cityname'].iloc[start:start + 100].tolist()
+        assert len(small_lookup) <= 5
+
+
+def test_later_batch_with_only_known_or_rejected_names(small_lookup):
+    raw = make_listings(50, seed=3)
+    wrangling_utils.clean(raw, vectorized=True)
+    later = raw.copy()
+    later['cityname'] = [raw['cityname'].iloc[0], None, 'www.example.com', '12345', 'Texas'] * 10
+    expected, expected_ledger = wrangling_utils.clean(later)
+    cleaned, ledger = wrangling_utils.clean(later, vectorized=True)
+    assert cleaned['cityname'].tolist() == expected['cityname'].tolist()
+    assert ledger.to_frame().equals(expected_ledger.to_frame())
+
+
+def test_threads_share_the_canonical_dictionary():
+    lookup = CityLookup({}, {}, [], maxsize=5)
+    # a few more names than the dictionary holds, so threads keep looking up names that others evict
+    names = [f'city {i}' for i in range(8)]
+
+    def upper(raw):
+        return raw.str.upper().to_numpy(dtype=object), numpy.zeros(len(raw), dtype=bool)
+
+    def run(offset):
+        batch = pandas.Series([names[(offset + i) % len(names)] for i in range(6)], dtype=object)
+        for _ in range(300):
+            cities, rejected = lookup.normalize(batch, upper)
+            assert cities.tolist() == batch.str.upper().tolist() and not rejected.any()
+
+    # switch threads often so unguarded updates of the dictionary would interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(run, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+    assert len(lookup) == 5
+
+
+def test_save_and_load_keep_the_most_recent_names(tmp_path):
+    lookup = CityLookup({}, {}, [], {'a': ('A', False), 'b': ('B', False), 'c': (None, True)})
+    lookup.save(tmp_path / 'lookup.json')
+    loaded = CityLookup.load(tmp_path / 'lookup.json', maxsize=2)
+    assert dict(loaded.canonical) == {'b': ('B', False), 'c': (None, True)}
+
+
+@pytest.mark.parametrize('size', [10, 300, 3_000])
+def test_county_city_matches_a_scan_of_the_table(size):
+    # the first county of the table a name contains wins, as benchmark_city_lookup() times against the scan
+    table = dict(wrangling_utils.COUNTY_TO_CITY)
+    for i in range(size - len(table)):
+        table[f'county {i} county'] = f'City {i}'
+    lookup = CityLookup(table, wrangling_utils.ABBREV_MAP, wrangling_utils.US_STATE_NAMES)
+
+    raw = make_listings(1_000, seed=5, dirty=0.3)['cityname']
+    names = wrangling_utils._as_str(raw).str.strip().str.lower().drop_duplicates().tolist()
+    names += ['county 7 county', 'north county 12 county', 'cook county dallas county', f'county {size} county',
+              'dallas county county 3 county', 'fulton count']
+    for name in names:
+        assert lookup.county_city(name) == next((city for county, city in table.items() if county in name), None)
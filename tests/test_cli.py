@@ -0,0 +1,90 @@
+import duckdb
+import pandas
+import pytest
+
+from source import cli, wrangling_utils
+from source.duckdb_loader import LISTINGS_TABLE
+from source.snapshots import read_snapshot
+from source.synthetic import make_listings
+
+ROWS = 600
+
+
+@pytest.fixture
+def raw_file(tmp_path):
+    path = tmp_path / 'raw.csv'
+    make_listings(ROWS, seed=11, dirty=0.3).to_csv(path, index=False)
+    return path
+
+
+def _expected(raw_file) -> tuple[pandas.DataFrame, pandas.DataFrame]:
+    cleaned, ledger = wrangling_utils.clean(pandas.read_csv(raw_file), vectorized=True)
+    return wrangling_utils.cast(cleaned), ledger.to_frame()
+
+
+def _read(output) -> pandas.DataFrame:
+    if output.suffix in {'.duckdb', '.db'}:
+        with duckdb.connect(str(output)) as connection:
+            return connection.execute(f'SELECT * FROM {LISTINGS_TABLE} ORDER BY id').df()
+    if output.suffix == '.parquet':
+        return pandas.read_parquet(output)
+    if output.suffix == '.csv':
+        return pandas.read_csv(output)
+    return read_snapshot(output)
+
+
+@pytest.mark.parametrize('output', ['listings.duckdb', 'listings.db', 'listings.parquet', 'listings.csv', 'snapshot'])
+def test_each_output_format(raw_file, tmp_path, output, capsys):
+    assert cli.main([str(raw_file), str(tmp_path / output)]) == 0
+    assert str(tmp_path / output) in capsys.readouterr().out
+
+    written, (expected, _) = _read(tmp_path / output), _expected(raw_file)
+    assert len(written) == len(expected)
+    assert sorted(written['id'].tolist()) == sorted(expected['id'].tolist())
+    assert written['price'].sum() == pytest.approx(expected['price'].sum())
+
+
+def test_workers_and_rejections(raw_file, tmp_path):
+    assert cli.main([str(raw_file), str(tmp_path / 'one.parquet'), '--rejections', str(tmp_path / 'one.rej')]) == 0
+    assert cli.main([str(raw_file), str(tmp_path / 'two.parquet'), '--workers', '2',
+                     '--rejections', str(tmp_path / 'two.rej')]) == 0
+
+    expected, expected_rejections = _expected(raw_file)
+    pandas.testing.assert_frame_equal(pandas.read_parquet(tmp_path / 'two.parquet'),
+                                      pandas.read_parquet(tmp_path / 'one.parquet'))
+    for name in ['one.rej', 'two.rej']:
+        rejections = pandas.read_parquet(tmp_path / name)
+        assert len(rejections) == len(expected_rejections)
+        assert rejections['row'].tolist() == expected_rejections['row'].tolist()
+
+
+@pytest.mark.parametrize('output', ['parts', 'cleaned.duckdb'])
+def test_stream(raw_file, tmp_path, output):
+    assert cli.main([str(raw_file), str(tmp_path / output), '--stream', '250', '--workers', '2',
+                     '--rejections', str(tmp_path / 'rejections.parquet')]) == 0
+
+    if output == 'parts':
+        assert len(list((tmp_path / output).glob('part-*.parquet'))) == 3
+        with duckdb.connect() as connection:
+            written = connection.execute(f"SELECT * FROM read_parquet('{tmp_path / output}/part-*.parquet')").df()
+    else:
+        with duckdb.connect(str(tmp_path / output)) as connection:
+            written = connection.execute('SELECT * FROM cleaned_listings').df()
+    expected, expected_rejections = _expected(raw_file)
+    assert sorted(written['id'].tolist()) == sorted(expected['id'].tolist())
+    rejections = pandas.read_parquet(tmp_path / 'rejections.parquet')
+    assert rejections['row'].tolist() == expected_rejections['row'].tolist()
+
+
+@pytest.mark.parametrize('output', ['listings.parquet', 'listings.csv'])
+def test_stream_rejects_single_file_outputs(raw_file, tmp_path, output, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main([str(raw_file), str(tmp_path / output), '--stream', '250'])
+    assert exit_info.value.code == 2 and '--stream' in capsys.readouterr().err
+    assert not (tmp_path / output).exists()
+
+
+def test_stream_from_a_missing_file_creates_no_directory(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        cli.main([str(tmp_path / 'missing.csv'), str(tmp_path / 'parts'), '--stream', '250'])
+    assert not (tmp_path / 'parts').exists()
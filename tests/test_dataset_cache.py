@@ -0,0 +1,89 @@
+import json
+
+import pandas
+import pytest
+
+from source.dataset_cache import DatasetCache, DatasetCacheMiss, _dataset
+from source.synthetic import make_listings
+
+REPO_ID = 555
+
+
+class Fetcher:
+    """Local stand-in for ucimlrepo.fetch_ucirepo that counts its calls"""
+
+    def __init__(self):
+        self.raw = make_listings(200, seed=6, dirty=0.3)
+        self.calls = 0
+
+    def __call__(self, id):
+        self.calls += 1
+        variables = pandas.DataFrame({'name': self.raw.columns, 'role': ['ID'] + ['Feature'] * 21})
+        return _dataset(self.raw.copy(), {'uci_id': id, 'name': 'Apartment for Rent Classified'}, variables)
+
+
+@pytest.fixture
+def fetcher():
+    return Fetcher()
+
+
+def test_store_and_load_round_trip(tmp_path, fetcher):
+    cache = DatasetCache(tmp_path, fetcher=fetcher)
+    fetched = cache.fetch(REPO_ID)
+    loaded = DatasetCache(tmp_path, fetcher=fetcher).fetch(REPO_ID)
+
+    assert fetcher.calls == 1
+    for dataset in (fetched, loaded):
+        pandas.testing.assert_frame_equal(dataset.data.original, fetcher.raw)
+        assert dataset.metadata.uci_id == REPO_ID
+        assert dataset.data.ids.columns.tolist() == ['id']
+    # object columns keep the exact Python values, e.g. numbers read_csv left in a text column
+    assert fetcher.raw['price'].map(type).equals(loaded.data.original['price'].map(type))
+
+
+def test_refetch_after_corruption(tmp_path, fetcher):
+    cache = DatasetCache(tmp_path, fetcher=fetcher)
+    cache.fetch(REPO_ID)
+    data_file, = (tmp_path / str(REPO_ID)).glob('*.parquet')
+    data_file.write_bytes(data_file.read_bytes()[:-100] + b'\0' * 100)
+
+    assert cache.load(REPO_ID) is None
+    pandas.testing.assert_frame_equal(cache.fetch(REPO_ID).data.original, fetcher.raw)
+    assert fetcher.calls == 2
+    assert cache.load(REPO_ID) is not None
+
+
+def test_refetch_after_ttl(tmp_path, fetcher):
+    cache = DatasetCache(tmp_path, ttl=3600, fetcher=fetcher)
+    cache.fetch(REPO_ID)
+    cache.fetch(REPO_ID)
+    assert fetcher.calls == 1
+
+    manifest_path = tmp_path / str(REPO_ID) / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text())
+    manifest['fetched_at'] -= 7200
+    manifest_path.write_text(json.dumps(manifest))
+    assert not cache.is_fresh(REPO_ID)
+    cache.fetch(REPO_ID)
+    assert fetcher.calls == 2
+    assert cache.is_fresh(REPO_ID)
+
+
+def test_offline(tmp_path, fetcher):
+    offline = DatasetCache(tmp_path, offline=True, fetcher=fetcher)
+    with pytest.raises(DatasetCacheMiss):
+        offline.fetch(REPO_ID)
+    assert fetcher.calls == 0
+
+    # offline mode loads even a stale entry rather than fetching
+    DatasetCache(tmp_path, fetcher=fetcher).fetch(REPO_ID)
+    offline.ttl = 0
+    pandas.testing.assert_frame_equal(offline.fetch(REPO_ID).data.original, fetcher.raw)
+    assert fetcher.calls == 1
+
+
+def test_offline_from_environment(tmp_path, fetcher, monkeypatch):
+    monkeypatch.setenv('UCI_OFFLINE', '1')
+    with pytest.raises(DatasetCacheMiss):
+        DatasetCache(tmp_path, fetcher=fetcher).fetch(REPO_ID)
+    assert fetcher.calls == 0
@@ -0,0 +1,41 @@
+import numpy
+import pandas
+
+from source import wrangling_utils
+from source.dedup import find_duplicates, lsh_candidate_pairs
+from source.synthetic import make_reposts
+
+
+def test_empty_texts_are_not_duplicates():
+    df = pandas.DataFrame({'title': [None, '', '!!'], 'body': ['', None, ' ']})
+    assert find_duplicates(df).tolist() == [0, 1, 2]
+
+
+def test_empty_texts_among_duplicates():
+    df = pandas.DataFrame({'title': ['sunny 2br near the park', None, 'sunny 2br near the park', '', 'studio'],
+                           'body': ['', None, '', '', None]})
+    assert find_duplicates(df).tolist() == [0, 1, 0, 3, 4]
+
+
+def test_reposts_are_clustered():
+    raw, originals = make_reposts(2_000, seed=4)
+    clean_uci_df, _ = wrangling_utils.clean(raw)
+    clean_uci_df.loc[::50, ['title', 'body', 'address', 'cityname']] = None
+    clusters = find_duplicates(clean_uci_df).to_numpy()
+
+    no_text = numpy.zeros(len(raw), dtype=bool)
+    no_text[::50] = True
+    assert (clusters[no_text] == numpy.flatnonzero(no_text)).all()
+    assert not numpy.isin(numpy.flatnonzero(no_text), clusters[~no_text]).any()
+    # nearly every repost with text is found next to its original
+    found = clusters == clusters[originals]
+    keep = ~no_text & ~no_text[originals]
+    assert found[keep].mean() > 0.95
+
+
+def test_bucket_pairs_reach_past_rows_between():
+    # row 1 shares only the first band with rows 0 and 2, and sorts between them
+    signatures = numpy.array([[1, 1, 2, 3, 4, 5, 6, 7], [1, 1, 9, 9, 9, 9, 9, 9], [1, 1, 2, 0, 4, 0, 6, 0]],
+                             dtype='uint32')
+    first, second = lsh_candidate_pairs(signatures, bands=4)
+    assert (0, 2) in set(zip(first.tolist(), second.tolist()))
@@ -0,0 +1,35 @@
+import pandas
+
+from source import wrangling_utils
+from source.duckdb_loader import load_listings, read_listings
+from source.synthetic import make_listings
+
+
+def _stored(df: pandas.DataFrame) -> pandas.DataFrame:
+    # what read_listings() gives back: one listing per id, ordered by id
+    df = df[df['id'].notna()].drop_duplicates('id', keep='last')
+    return df.sort_values('id').reset_index(drop=True)
+
+
+def test_second_load_upserts_changes(tmp_path):
+    database = tmp_path / 'listings.duckdb'
+    raw = make_listings(600, seed=7, dirty=0.3)
+    listings = wrangling_utils.cast(wrangling_utils.clean(raw)[0])
+    first, new = listings.iloc[:500], listings.iloc[500:501]
+
+    counts = load_listings(first, database)
+    stored = _stored(first)
+    assert counts == {'inserted': len(stored), 'updated': 0, 'unchanged': 0, 'skipped': len(first) - len(stored)}
+    pandas.testing.assert_frame_equal(read_listings(database), stored)
+
+    changed = first.copy()
+    row = changed.index[changed['id'].notna()][3]
+    changed.loc[row, ['price', 'cityname']] = [changed.loc[row, 'price'] + 100, 'Elsewhere']
+    second = pandas.concat([changed, new])
+    counts = load_listings(second, database)
+    assert counts == {'inserted': 1, 'updated': 1, 'unchanged': len(stored) - 1,
+                      'skipped': len(second) - len(stored) - 1}
+    pandas.testing.assert_frame_equal(read_listings(database), _stored(second))
+
+    # loading the same listings again writes nothing
+    assert load_listings(second, database)['unchanged'] == len(stored) + 1
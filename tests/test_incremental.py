@@ -0,0 +1,75 @@
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.city_lookup import CityLookup
+from source.incremental import clean_incremental
+from source.synthetic import make_listings
+
+
+@pytest.fixture
+def raw():
+    raw = make_listings(300, seed=8, dirty=0.3)
+    raw.loc[:9, 'cityname'] = 'Travis County'
+    return raw
+
+
+def _assert_same_as_clean(raw, cleaned, ledger):
+    expected, expected_ledger = wrangling_utils.clean(raw)
+    pandas.testing.assert_frame_equal(cleaned, wrangling_utils.cast(expected))
+    pandas.testing.assert_frame_equal(ledger.to_frame(), expected_ledger.to_frame())
+
+
+def test_second_run_is_cached(tmp_path, raw):
+    state = tmp_path / 'state'
+    _, _, first = clean_incremental(raw, state)
+    cleaned, ledger, second = clean_incremental(raw, state)
+    assert first['cleaned'] == second['cached'] == len(raw)
+    assert second['cleaned'] == second['stale'] == 0
+    _assert_same_as_clean(raw, cleaned, ledger)
+
+
+def test_new_city_lookup_discards_the_state(tmp_path, raw):
+    state = tmp_path / 'state'
+    clean_incremental(raw, state)
+    default = wrangling_utils.CITY_LOOKUP
+    wrangling_utils.use_city_lookup(CityLookup({**wrangling_utils.COUNTY_TO_CITY, 'travis county': 'Austin'},
+                                               wrangling_utils.ABBREV_MAP, wrangling_utils.US_STATE_NAMES))
+    try:
+        cleaned, ledger, counts = clean_incremental(raw, state)
+        assert counts['stale'] == len(raw) and counts['cached'] == 0
+        assert (cleaned['cityname'].iloc[:10] == 'Austin').all()
+        _assert_same_as_clean(raw, cleaned, ledger)
+    finally:
+        wrangling_utils.use_city_lookup(default)
+
+    # and back again
+    cleaned, ledger, counts = clean_incremental(raw, state)
+    assert counts['stale'] == len(raw)
+    _assert_same_as_clean(raw, cleaned, ledger)
+
+
+def test_cleaner_version_discards_the_state(tmp_path, raw, monkeypatch):
+    state = tmp_path / 'state'
+    clean_incremental(raw, state)
+    monkeypatch.setattr(wrangling_utils, 'CLEANER_VERSION', wrangling_utils.CLEANER_VERSION + 1)
+    cleaned, ledger, counts = clean_incremental(raw, state)
+    assert counts['stale'] == len(raw) and counts['cleaned'] == len(raw)
+    _assert_same_as_clean(raw, cleaned, ledger)
+    assert clean_incremental(raw, state)[2]['cached'] == len(raw)
+
+
+@pytest.mark.parametrize('prune', [True, False])
+def test_changed_and_repeated_rows(tmp_path, raw, prune):
+    state = tmp_path / 'state'
+    clean_incremental(raw, state)
+    changed = pandas.concat([raw, raw.iloc[20:40]], ignore_index=True)
+    changed.loc[:4, 'price'] = 'free'
+    changed.loc[5:9, 'bedrooms'] = 2
+    cleaned, ledger, counts = clean_incremental(changed, state, prune=prune)
+    assert counts == {'rows': len(changed), 'cached': len(raw) - 10, 'cleaned': 10, 'stale': 0}
+    _assert_same_as_clean(changed, cleaned, ledger)
+
+    # the rows changed away from are kept only without pruning
+    counts = clean_incremental(raw, state, prune=prune)[2]
+    assert counts['cleaned'] == (10 if prune else 0)
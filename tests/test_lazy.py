@@ -0,0 +1,38 @@
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.lazy import LazyCleanFrame
+from source.synthetic import make_listings
+
+RAW = make_listings(1_500, seed=13, dirty=0.3)
+RAW.index = RAW.index * 2 + 100
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_selected_and_filtered_match_cast_clean(vectorized):
+    expected = wrangling_utils.cast(wrangling_utils.clean(RAW)[0])
+    listings = LazyCleanFrame(RAW, vectorized=vectorized)
+
+    # a filter on one column and a selection of others only cleans those
+    cheap = (listings['price'] < 1_500).fillna(False)
+    columns = ['state', 'price', 'bedrooms', 'cityname']
+    selected = listings.cast(columns)[cheap]
+    assert sorted(listings.cleaned) == sorted(columns)
+    pandas.testing.assert_frame_equal(selected, expected.loc[(expected['price'] < 1_500).fillna(False),
+                                                             wrangling_utils._projection(columns)])
+
+    pandas.testing.assert_frame_equal(wrangling_utils.cast(listings[['cityname', 'price']]),
+                                      expected[['cityname', 'price']])
+    pandas.testing.assert_frame_equal(listings.cast(), expected)
+
+
+def test_columns_are_cleaned_once():
+    listings = LazyCleanFrame(RAW)
+    first = listings['amenities']
+    assert listings['amenities'] is first
+    listings.cast(['amenities', 'fee'])
+    expected = wrangling_utils.clean(RAW, columns=['amenities', 'fee'])[1]
+    pandas.testing.assert_frame_equal(listings.ledger.counts().sort_values(['column_name', 'reason'])
+                                      .reset_index(drop=True),
+                                      expected.counts().sort_values(['column_name', 'reason']).reset_index(drop=True))
@@ -0,0 +1,60 @@
+import numpy
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.native_clean import NATIVE_COLUMNS, clean_native, clean_native_frame
+from source.synthetic import make_listings
+
+RAW = make_listings(500, seed=6, dirty=0.3)
+
+
+def test_native_columns_have_cleaners():
+    assert [col for col in wrangling_utils.ROW_CLEANERS if col in NATIVE_COLUMNS] == list(NATIVE_COLUMNS)
+    assert clean_native_frame(RAW).columns.tolist() == list(NATIVE_COLUMNS)
+
+
+def test_column_projection():
+    columns = ['time', 'currency']
+    cleaned, _ = wrangling_utils.clean(RAW, columns=columns)
+    pandas.testing.assert_frame_equal(clean_native_frame(RAW, columns=columns), wrangling_utils.cast(cleaned))
+
+
+def test_column_without_sql(monkeypatch):
+    with pytest.raises(ValueError, match=r"\['cityname'\].*'time'"):
+        clean_native(RAW, columns=['currency', 'cityname'])
+    monkeypatch.setitem(wrangling_utils.ROW_CLEANERS, 'floor', wrangling_utils.clean_id)
+    with pytest.raises(ValueError, match='floor'):
+        clean_native(RAW.assign(floor='3'), columns=['fee', 'floor'])
+    with pytest.raises(KeyError):
+        clean_native(RAW, columns=['rooms'])
+
+
+def test_mixed_object_columns():
+    # object columns holding numbers, booleans and bytes besides text are read as their str(), as the cleaners do
+    mixed = [True, False, 950.0, 950, numpy.int64(12), numpy.float64(2.5), 1e16, 1.5e-7, ' USD ', 'Yes', 'no',
+             '1577000000', None, numpy.nan, b'USD', 'None']
+    raw = pandas.DataFrame({col: pandas.Series(mixed, dtype=object) for col in ['currency', 'fee', 'square_feet']})
+    # cast() reads clean_time()'s str(x) back as a number, so only numbers and their text make it through
+    raw['time'] = pandas.Series([1577000000, 1577000000.5, numpy.int64(1568000000), numpy.float32(1.5), 1e16,
+                                 '1577000000', ' 12 ', numpy.nan, 2 ** 70, -0.0, 'nan', 'inf', '1_000', numpy.int32(7), 8.25,
+                                 5], dtype=object)
+    cleaned, _ = wrangling_utils.clean(raw, columns=NATIVE_COLUMNS)
+    pandas.testing.assert_frame_equal(clean_native_frame(raw), wrangling_utils.cast(cleaned))
+
+
+def test_frame_scanned_in_place():
+    # object columns mixing text, floats, None and NaN, and columns already typed by pandas
+    raw = RAW.astype({'currency': 'string'})
+    raw['fee'] = pandas.Series(['Yes', None, numpy.nan, 'None', 'No'] * 100, dtype=object)
+    raw['square_feet'] = pandas.array([900, None, 1200, 750, 3000] * 100, dtype='Int64')
+    raw['time'] = pandas.Series([1577000000.0, numpy.nan] * 250)
+    raw.index = raw.index * 3 + 7
+    cleaned, _ = wrangling_utils.clean(raw, columns=NATIVE_COLUMNS)
+    pandas.testing.assert_frame_equal(clean_native_frame(raw), wrangling_utils.cast(cleaned).reset_index(drop=True))
+
+
+def test_csv_file(tmp_path):
+    RAW.to_csv(tmp_path / 'raw.csv', index=False)
+    cleaned, _ = wrangling_utils.clean(pandas.read_csv(tmp_path / 'raw.csv'), columns=NATIVE_COLUMNS)
+    pandas.testing.assert_frame_equal(clean_native_frame(tmp_path / 'raw.csv'), wrangling_utils.cast(cleaned))
@@ -0,0 +1,104 @@
+"""
+The price display, address and city prefix parsers against their implementations before they were precompiled
+"""
+import math
+import re
+
+import numpy
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.synthetic import make_listings
+from source.wrangling_utils import MISSING, UNPARSEABLE, BadDataException
+
+
+def baseline_price_display(x):
+    if x is None:
+        raise BadDataException(x, MISSING)
+    val = str(x).strip()
+    val = val.replace("$", "").replace(",", "").strip()
+    range_match = re.findall(r"[\d.]+", val)
+    if len(range_match) == 0:
+        raise BadDataException(x, UNPARSEABLE)
+    elif len(range_match) == 1:
+        return float(range_match[0])
+    nums = [float(v) for v in range_match]
+    return sum(nums) / len(nums)
+
+
+def baseline_address(x):
+    if x is None:
+        raise BadDataException(x, MISSING)
+    val = str(x).strip()
+    if val.lower() in {"", "none", "nan"}:
+        raise BadDataException(val, MISSING)
+    if re.fullmatch(r"^-?\d+(\.\d+)?\s*[,\s]\s*-?\d+(\.\d+)?$", val):
+        raise BadDataException(val)
+    if re.fullmatch(r"[\d., ]+$", val) or "square" in val.lower() or "sq" in val.lower():
+        raise BadDataException(val)
+    if not (re.search(r"\d", val) and re.search(r"[A-Za-z]", val)):
+        raise BadDataException(val)
+    return re.sub(r"\s+", " ", val).strip(" ,.;-")
+
+
+def baseline_fix_prefix_patterns(s):
+    s = re.sub(r"\bO\s+([A-Za-z])", r"O'\1", s)
+    s = re.sub(r"\bMc\s+([A-Za-z])", r"Mc\1", s)
+    return s
+
+
+BASELINES = {'price_display': baseline_price_display, 'address': baseline_address}
+
+# pieces the parsers treat specially, so the fuzzed values hit every branch
+PIECES = ['1', '25', '0.5', '.', '..', ',', '$', ' ', '  ', '\t', '\n', '\xa0', '-', '/', 'O', 'Mc', 'o', 'Sq', 'sq',
+          'square', 'ft', 'Main', 'St', 'weekly', 'Monthly', 'nan', 'None', '40.7', '-73.9', 'é', '٣']
+
+
+def fuzzed(count: int, seed: int = 0) -> list:
+    rng = numpy.random.default_rng(seed)
+    values = [''.join(rng.choice(PIECES, rng.integers(0, 8))) for _ in range(count)]
+    values += [None, math.nan, 0, 12, 1250.0, -3.5, True, '', ' ', 'None', 'nan']
+    raw = make_listings(1_000, seed=7, dirty=0.3)
+    return values + raw['price_display'].tolist() + raw['address'].tolist()
+
+
+def _expected(col: str, values: list) -> tuple[list, pandas.DataFrame]:
+    cleaned, rows, rejected, reasons = [], [], [], []
+    for row, x in enumerate(values):
+        try:
+            cleaned.append(BASELINES[col](x))
+        except BadDataException as e:
+            cleaned.append(None)
+            rows.append(row), rejected.append(e.value), reasons.append(e.reason)
+        except Exception:
+            cleaned.append(None)
+            rows.append(row), rejected.append(x), reasons.append(UNPARSEABLE)
+    return cleaned, pandas.DataFrame({
+        'row': pandas.Series(rows, dtype='int64'),
+        'value': pandas.Series([None if v is None else str(v) for v in rejected], dtype=object),
+        'reason': pandas.Series(reasons, dtype=object),
+    })
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+@pytest.mark.parametrize('col', BASELINES)
+def test_matches_baseline(col, vectorized):
+    values = fuzzed(4_000)
+    expected, expected_rejections = _expected(col, values)
+    raw = pandas.DataFrame({col: pandas.Series(values, dtype=object)})
+    cleaned, ledger = wrangling_utils.clean(raw, vectorized=vectorized, columns=[col])
+
+    assert [None if pandas.isna(v) else v for v in cleaned[col].astype(object)] == \
+           [None if v is None or v != v else v for v in expected]
+    rejections = ledger.to_frame()[['row', 'value', 'reason']].astype({'reason': object})
+    pandas.testing.assert_frame_equal(rejections, expected_rejections)
+
+
+def test_fix_prefix_patterns_matches_baseline():
+    rng = numpy.random.default_rng(1)
+    pieces = ['O', 'Mc', ' ', '  ', '\t', "'", 'o', 'Fallon', 'x', 'Kees', 'D', '-', '.', 'MC', 'OO']
+    values = [''.join(rng.choice(pieces, rng.integers(0, 7))) for _ in range(20_000)]
+    values += ['O Fallon', 'Mc Kees Rocks', 'O O x', 'Mc Mc Donald', 'Lake O  Pines']
+    assert [wrangling_utils._fix_prefix_patterns(s) for s in values] == \
+           [baseline_fix_prefix_patterns(s) for s in values]
@@ -0,0 +1,52 @@
+import pytest
+
+from source import wrangling_utils
+from source.profiling import CleanProfile
+from source.synthetic import make_listings
+
+RAW = make_listings(2_000, seed=11, dirty=0.3)
+# title and body are passed through, with no cleaner to profile
+CLEANED = [col for col, cleaner in wrangling_utils.ROW_CLEANERS.items() if cleaner is not None]
+
+
+@pytest.mark.parametrize('engine', [{}, {'vectorized': True}, {'vectorized': True, 'workers': 2}])
+def test_every_cleaned_column_is_profiled(engine):
+    profile = CleanProfile(memory=False)
+    _, ledger = wrangling_utils.clean(RAW, profile=profile, **engine)
+    report = profile.to_frame().set_index('column_name')
+
+    assert sorted(report.index) == sorted(CLEANED)
+    assert (report['rows'] == len(RAW)).all()
+    assert (report['seconds'] >= 0).all()
+    rejected = ledger.counts().groupby('column_name')['count'].sum()
+    assert report['rejected'].to_dict() == rejected.reindex(report.index, fill_value=0).to_dict()
+    # only the memoized cleaners count cache lookups
+    cached = report['cache_hits'].notna()
+    assert set(report.index[cached]) <= set(wrangling_utils.NORMALIZER_CACHES)
+
+
+def test_runs_add_up():
+    profile = CleanProfile()
+    for _ in range(2):
+        wrangling_utils.clean(RAW.iloc[:500], vectorized=True, profile=profile)
+    report = profile.to_frame()
+    assert (report['runs'] == 2).all() and (report['rows'] == 1_000).all()
+    assert (report['peak_memory_bytes'] > 0).any()
+
+
+def test_prometheus_exposition():
+    parser = pytest.importorskip('prometheus_client.parser')
+    from prometheus_client import generate_latest
+
+    profile = CleanProfile(memory=False)
+    wrangling_utils.clean(RAW, vectorized=True, profile=profile)
+    text = generate_latest(profile.to_prometheus(labels={'feed': 'synthetic'})).decode()
+
+    families = {family.name: family for family in parser.text_string_to_metric_families(text)}
+    rows = families['clean_column_rows']
+    assert rows.type == 'gauge'
+    assert {sample.labels['column_name'] for sample in rows.samples} == set(CLEANED)
+    assert all(sample.labels['feed'] == 'synthetic' and sample.value == len(RAW) for sample in rows.samples)
+    hits = {sample.labels['column_name'] for sample in families['clean_column_cache_hits'].samples}
+    assert hits and hits <= set(wrangling_utils.NORMALIZER_CACHES)
+
@@ -0,0 +1,78 @@
+import numpy
+import pandas
+import pytest
+
+from source.rejections import RejectionLedger
+
+REASONS = ['unparseable', 'out_of_range', 'unknown']
+
+
+def _record(ledger: RejectionLedger, rows: int, start: int = 0, column: str = 'price') -> None:
+    # rejections in batches, as clean() records them per column and chunk
+    for batch in range(start, start + rows, 700):
+        positions = numpy.arange(batch, min(batch + 700, start + rows))
+        ledger.extend(column, positions, [f'bad {i}' for i in positions], [REASONS[i % 3] for i in positions])
+
+
+def _counts(ledger: RejectionLedger) -> dict:
+    return {(column, reason): count for column, reason, count in ledger.counts().itertuples(index=False)}
+
+
+@pytest.mark.parametrize('sample', [False, True])
+def test_counts_are_exact_when_the_sample_is_capped(sample):
+    ledger = RejectionLedger(limit=50, sample=sample)
+    _record(ledger, 5_000)
+    _record(ledger, 30, column='state')
+    assert _counts(ledger) == {('price', reason): 5_000 // 3 + (i < 5_000 % 3) for i, reason in enumerate(REASONS)} \
+        | {('state', reason): 10 for reason in REASONS}
+    frame = ledger.to_frame()
+    assert (frame['column_name'] == 'price').sum() == 50
+    assert (frame['column_name'] == 'state').sum() == 30
+
+
+@pytest.mark.parametrize('rows', [0, 1, 49, 50, 51, 5_000])
+@pytest.mark.parametrize('limit', [None, 0, 50])
+def test_sample_size(rows, limit):
+    ledger = RejectionLedger(limit=limit, sample=True)
+    _record(ledger, rows)
+    assert len(ledger) == (rows if limit is None else min(limit, rows))
+    # a sample holds distinct rejections, each with its own value and reason
+    frame = ledger.to_frame()
+    assert frame['row'].is_unique
+    assert (frame['value'] == 'bad ' + frame['row'].astype(str)).all()
+    assert (frame['reason'].astype(str) == [REASONS[row % 3] for row in frame['row']]).all()
+
+
+@pytest.mark.parametrize('sample', [False, True])
+def test_merged_children_count_as_one_ledger(sample):
+    # chunks of a multiple of 3 rows, so the reasons of a chunk's local positions are those of the whole's
+    whole = RejectionLedger(limit=200, sample=sample)
+    _record(whole, 9_600)
+
+    merged = RejectionLedger(limit=200, sample=sample)
+    for number, start in enumerate(range(0, 9_600, 2_400)):
+        child = merged.child(number)
+        _record(child, 2_400)
+        merged.merge(child, offset=start)
+
+    assert _counts(merged) == _counts(whole)
+    rows = merged.to_frame()['row']
+    assert len(rows) == 200 and rows.is_unique and rows.between(0, 9_599).all()
+    if sample:
+        # the sample draws from every chunk, not only the first
+        assert (numpy.bincount(rows // 2_400, minlength=4) > 20).all()
+    else:
+        pandas.testing.assert_frame_equal(merged.to_frame(), whole.to_frame())
+
+def test_sample_is_reproducible_for_a_seed():
+    def sampled(seed):
+        ledger = RejectionLedger(limit=100, sample=True, seed=seed)
+        for number, start in enumerate(range(0, 4_000, 1_000)):
+            child = ledger.child(number)
+            _record(child, 1_000)
+            ledger.merge(child, offset=start)
+        _record(ledger, 3_000, start=4_000)
+        return ledger.to_frame()
+
+    pandas.testing.assert_frame_equal(sampled(7), sampled(7))
+    assert not sampled(7)['row'].equals(sampled(8)['row'])
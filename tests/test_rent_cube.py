@@ -0,0 +1,66 @@
+import numpy
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.rent_cube import QUANTILES, ROLLUPS, SKETCH_ACCURACY, read_rollup, update_cube
+from source.synthetic import make_listings
+
+LISTINGS = wrangling_utils.cast(wrangling_utils.clean(make_listings(3_000, seed=8))[0])
+
+
+def _rollups(cube) -> dict[str, pandas.DataFrame]:
+    return {name: read_rollup(name, cube) for name in ROLLUPS}
+
+
+def _assert_same_rollups(left: dict, right: dict) -> None:
+    for name in ROLLUPS:
+        # sums are added in a different order
+        pandas.testing.assert_frame_equal(left[name], right[name], check_exact=False, rtol=1e-9)
+
+
+def test_chunks_match_one_frame(tmp_path):
+    assert update_cube(LISTINGS, tmp_path / 'whole.duckdb')['added'] == len(LISTINGS)
+
+    chunked = tmp_path / 'chunked.duckdb'
+    update_cube(LISTINGS.iloc[:1_000], chunked)
+    # later chunks are added to the built cube, refreshing the groups they touch
+    update_cube((LISTINGS.iloc[start:start + 700] for start in range(1_000, len(LISTINGS), 700)), chunked)
+    _assert_same_rollups(_rollups(chunked), _rollups(tmp_path / 'whole.duckdb'))
+
+
+@pytest.mark.parametrize('name', ['national', 'state', 'state_bedrooms'])
+def test_quantiles_within_sketch_accuracy(tmp_path, name):
+    update_cube(LISTINGS, tmp_path / 'cube.duckdb')
+    rollup = read_rollup(name, tmp_path / 'cube.duckdb')
+    dims = list(ROLLUPS[name])
+
+    priced = LISTINGS[LISTINGS['price'] > 0]
+    groups = priced.groupby(dims, dropna=False)['price']
+    expected = pandas.DataFrame({f'price_{suffix}': groups.quantile(q, interpolation='lower')
+                                 for suffix, q in QUANTILES.items()}).reset_index()
+    rollup = rollup.dropna(subset=['price_median']).astype({col: LISTINGS[col].dtype for col in dims})
+    # merge pairs missing keys with each other, as GROUP BY does
+    both = rollup.merge(expected, on=dims, suffixes=('', '_exact'), validate='one_to_one')
+    assert len(both) == len(rollup) == len(expected)
+    for suffix in QUANTILES:
+        sketched = both[f'price_{suffix}'].astype('float64')
+        exact = both[f'price_{suffix}_exact'].astype('float64')
+        assert (numpy.abs(sketched - exact) <= SKETCH_ACCURACY * exact * (1 + 1e-9)).all()
+
+
+def test_seen_ids_are_not_counted_again(tmp_path):
+    cube = tmp_path / 'cube.duckdb'
+    update_cube(LISTINGS, cube)
+    before = _rollups(cube)
+
+    again = pandas.concat([LISTINGS.iloc[:500], LISTINGS.iloc[:500]])
+    assert update_cube(again.assign(price=again['price'] * 2), cube)['added'] == 0
+    _assert_same_rollups(_rollups(cube), before)
+
+
+def test_ids_repeated_in_a_chunk_are_counted_once(tmp_path):
+    update_cube(LISTINGS, tmp_path / 'once.duckdb')
+    twice = tmp_path / 'twice.duckdb'
+    assert update_cube(pandas.concat([LISTINGS, LISTINGS.iloc[:300]]), twice)['added'] == len(LISTINGS)
+    _assert_same_rollups(_rollups(twice), _rollups(tmp_path / 'once.duckdb'))
@@ -0,0 +1,164 @@
+import http.client
+import json
+import threading
+import time
+
+import numpy
+import pytest
+
+from source.rent_service import RentIndex, RentService, fixture_listings, make_server
+from source.snapshots import MANIFEST, write_snapshot
+
+LISTINGS = fixture_listings(2_000, seed=3)
+
+
+def _until(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def service():
+    service = RentService(RentIndex(LISTINGS, version='v1'), cache_size=100)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def client(service):
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+
+    def request(method, path, body=None):
+        connection.request(method, path, body=None if body is None else json.dumps(body))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    yield request
+    connection.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_city_query_against_brute_force(service):
+    priced = LISTINGS[LISTINGS['price'] > 0]
+    city, state = priced[['cityname', 'state']].value_counts().index[0]
+    answer = service.lookup({'city': city.upper(), 'state': state, 'k': 3})
+
+    expected = priced[(priced['cityname'].str.lower() == city.lower()) & (priced['state'] == state)]
+    assert answer['count'] == len(expected)
+    assert answer['price']['median'] == pytest.approx(numpy.median(expected['price']))
+    assert len(answer['comparables']) == min(3, len(expected))
+    assert {comparable['id'] for comparable in answer['comparables']} <= set(expected['id'])
+
+
+def test_point_query_stays_in_radius(service):
+    row = LISTINGS.dropna(subset=['latitude', 'longitude']).iloc[0]
+    answer = service.lookup({'latitude': row['latitude'], 'longitude': row['longitude'], 'radius_km': 20})
+    assert answer['count'] >= 1
+    assert all(comparable['distance_km'] <= 20 for comparable in answer['comparables'])
+
+
+def test_cache_and_reload(service):
+    query = {'city': LISTINGS['cityname'].dropna().iloc[0]}
+    first = service.lookup(query)
+    assert service.lookup(query) == first
+    assert service.cache.hits == 1
+
+    service.reload(RentIndex(LISTINGS.iloc[:500], version='v2'))
+    assert service.lookup(query)['version'] == 'v2'
+    assert service.cache.hits == 1
+
+
+def test_http_errors(service, client):
+    city = LISTINGS['cityname'].dropna().iloc[0]
+    status, answer = client('GET', f'/comparables?city={city}')
+    assert status == 200 and answer['version'] == 'v1'
+    assert client('GET', '/comparables?bedrooms=two')[0] == 400
+    assert client('POST', '/comparables', {'k': 3})[0] == 400
+    assert client('GET', '/nowhere')[0] == 404
+
+    def fail(queries):
+        raise RuntimeError('index is broken')
+
+    service.index.query_batch = fail
+    status, answer = client('POST', '/comparables', {'city': 'nowhere'})
+    assert status == 500 and 'index is broken' in answer['error']
+    # the same connection still answers
+    assert client('GET', '/health')[0] == 200
+
+
+def test_non_finite_numbers_are_bad_requests(service, client):
+    city = LISTINGS['cityname'].dropna().iloc[0]
+    assert client('GET', f'/comparables?city={city}&square_feet=inf')[0] == 400
+    assert client('GET', '/comparables?latitude=nan&longitude=-97.7')[0] == 400
+    # JSON bodies may spell NaN too
+    status, answers = client('POST', '/comparables', [{'city': city}, {'city': city, 'radius_km': float('nan')}])
+    assert status == 400 and 'finite' in answers['error']
+
+
+def test_failing_query_fails_only_its_own_lookup(service):
+    city = LISTINGS['cityname'].dropna().iloc[0]
+    query_batch, gate, sizes = service.index.query_batch, threading.Event(), []
+
+    def broken_city(queries):
+        sizes.append(len(queries))
+        gate.wait()
+        if any(dict(query).get('city') == 'broken' for query in queries):
+            raise RuntimeError('index is broken')
+        return query_batch(queries)
+
+    service.index.query_batch = broken_city
+    results = {}
+
+    def lookup(name, query):
+        try:
+            results[name] = service.lookup(query)
+        except RuntimeError as error:
+            results[name] = error
+
+    # the batcher waits on the first lookup while the next two queue up as one batch
+    threads = [threading.Thread(target=lookup, args=('first', {'city': city}))]
+    threads[0].start()
+    _until(lambda: sizes)
+    threads += [threading.Thread(target=lookup, args=(name, {'city': name}))
+                for name in ['broken', city.lower()]]
+    for thread in threads[1:]:
+        thread.start()
+    _until(lambda: service._queue.qsize() == 2)
+    gate.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert sizes[1] == 2
+    assert isinstance(results['broken'], RuntimeError)
+    assert results[city.lower()] == results['first']
+
+
+def test_reload_and_watch_survive_failures(service, client, tmp_path):
+    directory = tmp_path / 'listings'
+    write_snapshot(LISTINGS, directory)
+    stop = service.watch(directory, interval=0.02)
+    try:
+        # a broken snapshot is logged and the old index keeps answering
+        (directory / MANIFEST).write_text('not json')
+        _until(lambda: service.stats()['reload_error'] is not None)
+        assert service.index.version == 'v1'
+
+        broken = tmp_path / 'broken'
+        broken.mkdir()
+        (broken / MANIFEST).write_text('{}')
+        assert client('POST', '/reload', {'snapshot': str(broken)})[0] == 202
+        _until(lambda: str(broken) in (service.stats()['reload_error'] or ''))
+        assert client('POST', '/reload', {'snapshot': str(tmp_path / 'missing')})[0] == 400
+
+        # the watch goes on to load the next snapshot written
+        write_snapshot(LISTINGS.iloc[:500], directory, overwrite=True)
+        _until(lambda: service.index.version.startswith(str(directory)))
+        assert len(service.index) == (LISTINGS['price'].iloc[:500] > 0).sum()
+        assert service.stats()['reload_error'] is None
+    finally:
+        stop.set()
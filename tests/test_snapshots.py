@@ -0,0 +1,55 @@
+import pandas
+import pytest
+
+from source import snapshots, wrangling_utils
+from source.snapshots import read_snapshot, write_snapshot
+from source.synthetic import make_listings
+
+LISTINGS = wrangling_utils.cast(wrangling_utils.clean(make_listings(2_000, seed=6))[0]).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_image_round_trip(tmp_path, mmap):
+    write_snapshot(LISTINGS, tmp_path / 'listings')
+    pandas.testing.assert_frame_equal(read_snapshot(tmp_path / 'listings', mmap=mmap), LISTINGS, check_index_type=False)
+
+
+def test_parquet_round_trip(tmp_path):
+    write_snapshot(LISTINGS, tmp_path / 'listings', partition_by=('state', 'price_type'))
+    # a filter that holds everywhere still reads the Parquet files, partitions with missing values included
+    df = read_snapshot(tmp_path / 'listings', filters=[('state', 'not in', [])])
+    pandas.testing.assert_frame_equal(df, LISTINGS, check_index_type=False)
+
+
+def test_filtered_read_matches_pandas(tmp_path):
+    write_snapshot(LISTINGS, tmp_path / 'listings')
+    state = LISTINGS['state'].value_counts().index[0]
+    columns = ['id', 'price', 'bedrooms', 'state']
+    df = read_snapshot(tmp_path / 'listings', columns=columns,
+                       filters=[('state', '==', state), ('bedrooms', '>=', 2), ('price', '<', 2_000)])
+
+    expected = LISTINGS[((LISTINGS['state'] == state) & (LISTINGS['bedrooms'] >= 2)
+                         & (LISTINGS['price'] < 2_000)).fillna(False)][columns]
+    assert len(expected)
+    pandas.testing.assert_frame_equal(df, expected, check_index_type=False)
+
+
+def test_rewrite_keeps_the_old_snapshot_until_the_new_one_is_whole(tmp_path, monkeypatch):
+    directory = tmp_path / 'listings'
+    write_snapshot(LISTINGS, directory)
+    with pytest.raises(FileExistsError):
+        write_snapshot(LISTINGS.iloc[:10], directory)
+
+    def fail(df, directory):
+        raise OSError('disk full')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(snapshots, '_write_image', fail)
+        with pytest.raises(OSError, match='disk full'):
+            write_snapshot(LISTINGS.iloc[:10], directory, overwrite=True)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['listings']
+    pandas.testing.assert_frame_equal(read_snapshot(directory), LISTINGS, check_index_type=False)
+
+    write_snapshot(LISTINGS.iloc[:10], directory, overwrite=True)
+    pandas.testing.assert_frame_equal(read_snapshot(directory), LISTINGS.iloc[:10], check_index_type=False)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['listings']
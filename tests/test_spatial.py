@@ -0,0 +1,75 @@
+import pickle
+
+import numpy
+import pandas
+import pytest
+
+from source.spatial import SpatialIndex, haversine_km
+
+RNG = numpy.random.default_rng(12)
+LATITUDE = pandas.Series(RNG.uniform(25, 48, 800))
+LONGITUDE = pandas.Series(RNG.uniform(-124, -70, 800))
+LATITUDE[::37] = numpy.nan
+LONGITUDE[::41] = numpy.nan
+QUERIES = numpy.column_stack([RNG.uniform(25, 48, 20), RNG.uniform(-124, -70, 20)])
+
+
+def _brute_force(lat: float, lon: float) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # distance to every listing with coordinates, nearest first
+    distances = haversine_km(lat, lon, LATITUDE, LONGITUDE)
+    rows = numpy.flatnonzero(~numpy.isnan(distances))
+    order = numpy.argsort(distances[rows], kind='stable')
+    return distances[rows][order], rows[order]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return SpatialIndex(LATITUDE, LONGITUDE)
+
+
+def test_knn_matches_brute_force(index):
+    assert len(index) == (LATITUDE.notna() & LONGITUDE.notna()).sum()
+    distances, rows = index.knn(QUERIES[:, 0], QUERIES[:, 1], k=7)
+    for (lat, lon), found_distances, found_rows in zip(QUERIES, distances, rows):
+        expected_distances, expected_rows = _brute_force(lat, lon)
+        numpy.testing.assert_allclose(found_distances, expected_distances[:7], rtol=1e-9)
+        numpy.testing.assert_array_equal(found_rows, expected_rows[:7])
+
+    distance, row = index.knn(*QUERIES[0], k=3)
+    numpy.testing.assert_array_equal(row, rows[0, :3])
+
+
+def test_knn_past_the_listings():
+    index = SpatialIndex([40.0, numpy.nan, 41.0], [-74.0, -75.0, -74.0])
+    distances, rows = index.knn(40.0, -74.0, k=4)
+    numpy.testing.assert_array_equal(rows, [0, 2, -1, -1])
+    assert distances[0] == 0 and numpy.isinf(distances[2:]).all()
+
+
+@pytest.mark.parametrize('radius_km', [0.0, 150.0, 600.0])
+def test_radius_matches_brute_force(index, radius_km):
+    results = index.radius(QUERIES[:, 0], QUERIES[:, 1], radius_km)
+    for (lat, lon), (found_distances, found_rows) in zip(QUERIES, results):
+        expected_distances, expected_rows = _brute_force(lat, lon)
+        inside = expected_distances <= radius_km
+        numpy.testing.assert_allclose(found_distances, expected_distances[inside], rtol=1e-9)
+        numpy.testing.assert_array_equal(found_rows, expected_rows[inside])
+
+
+def test_bbox_matches_brute_force(index):
+    rows = index.bbox(30, 40, -100, -80)
+    inside = LATITUDE.between(30, 40) & LONGITUDE.between(-100, -80)
+    numpy.testing.assert_array_equal(rows, numpy.flatnonzero(inside))
+
+
+def test_save_and_load(index, tmp_path):
+    index.save(tmp_path / 'index.pickle')
+    loaded = SpatialIndex.load(tmp_path / 'index.pickle')
+    numpy.testing.assert_array_equal(loaded.rows, index.rows)
+    for expected, found in zip(index.knn(QUERIES[:, 0], QUERIES[:, 1], k=5),
+                               loaded.knn(QUERIES[:, 0], QUERIES[:, 1], k=5)):
+        numpy.testing.assert_array_equal(found, expected)
+
+    (tmp_path / 'other.pickle').write_bytes(pickle.dumps({'rows': []}))
+    with pytest.raises(TypeError):
+        SpatialIndex.load(tmp_path / 'other.pickle')
@@ -0,0 +1,69 @@
+import duckdb
+import numpy
+import pandas
+import pytest
+
+from source import streaming, wrangling_utils
+from source.rejections import RejectionLedger
+from source.synthetic import make_listings
+
+CHUNKSIZE = 2048
+
+
+@pytest.fixture(autouse=True)
+def cold_caches():
+    # the chunks have to normalize their cities themselves, not find them cached by an earlier clean()
+    for cache in wrangling_utils.NORMALIZER_CACHES.values():
+        cache.clear()
+    wrangling_utils.CITY_LOOKUP.canonical.clear()
+
+
+@pytest.fixture(params=['csv', 'parquet'])
+def raw_file(request, tmp_path):
+    # chunks after the first only hold cities seen in it, missing ones, or ones the cleaner rejects
+    raw = make_listings(3 * CHUNKSIZE, seed=4, dirty=0.3)
+    seen = raw['cityname'].iloc[:CHUNKSIZE].dropna().unique()[:3].tolist()
+    later = numpy.random.default_rng(4).choice(seen + [None, '', 'www.example.com', '40.7, -73.9', '12345'],
+                                               2 * CHUNKSIZE)
+    raw.loc[CHUNKSIZE:, 'cityname'] = later
+    path = tmp_path / f'raw.{request.param}'
+    if request.param == 'csv':
+        raw.to_csv(path, index=False)
+    else:
+        with duckdb.connect() as connection:
+            connection.register('raw', raw)
+            connection.execute(f"COPY raw TO '{path}' (FORMAT PARQUET)")
+    return path
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_chunks_match_one_clean(raw_file, vectorized, workers):
+    ledger = RejectionLedger()
+    chunks = list(streaming.clean_chunks(streaming.read_chunks(raw_file, CHUNKSIZE), vectorized, ledger, workers))
+    assert len(chunks) == 3
+
+    whole = pandas.concat(streaming.read_chunks(raw_file, chunksize=10 * CHUNKSIZE), ignore_index=True)
+    expected, expected_ledger = wrangling_utils.clean(whole, vectorized=vectorized)
+    expected = wrangling_utils.cast(expected)
+    pandas.testing.assert_frame_equal(pandas.concat(chunks, ignore_index=True), expected)
+    pandas.testing.assert_frame_equal(ledger.to_frame(), expected_ledger.to_frame())
+
+
+@pytest.mark.parametrize('destination', ['parts', 'cleaned.duckdb'])
+def test_stream_clean(raw_file, tmp_path, destination):
+    ledger = RejectionLedger()
+    rows = streaming.stream_clean(raw_file, tmp_path / destination, chunksize=CHUNKSIZE, ledger=ledger)
+    assert rows == 3 * CHUNKSIZE
+
+    if destination == 'parts':
+        query = f"SELECT cityname FROM read_parquet('{tmp_path / destination}/part-*.parquet')"
+        with duckdb.connect() as connection:
+            cities = connection.execute(query).df()['cityname']
+    else:
+        with duckdb.connect(str(tmp_path / destination)) as connection:
+            cities = connection.execute('SELECT cityname FROM cleaned_listings').df()['cityname']
+    whole = pandas.concat(streaming.read_chunks(raw_file, chunksize=10 * CHUNKSIZE), ignore_index=True)
+    expected, expected_ledger = wrangling_utils.clean(whole, vectorized=True)
+    assert sorted(cities.dropna()) == sorted(expected['cityname'].dropna())
+    pandas.testing.assert_frame_equal(ledger.to_frame(), expected_ledger.to_frame())
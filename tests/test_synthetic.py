@@ -0,0 +1,29 @@
+import pandas
+
+from source import wrangling_utils
+from source.synthetic import DIRTY_VALUES, make_listings
+
+
+def test_same_seed_same_listings():
+    pandas.testing.assert_frame_equal(make_listings(500, seed=3), make_listings(500, seed=3))
+    assert not make_listings(500, seed=3).equals(make_listings(500, seed=4))
+
+
+def test_columns_of_the_cleaners():
+    listings = make_listings(100)
+    assert list(listings.columns) == list(wrangling_utils.ROW_CLEANERS)
+    assert len(listings) == 100 and listings['id'].is_unique
+
+
+def test_each_dirty_value_occurs():
+    listings = make_listings(2_000, seed=5, dirty=0.3)
+    for col, pool in DIRTY_VALUES.items():
+        values = listings[col].tolist()
+        for dirty in pool:
+            if dirty is None:
+                assert any(value is None for value in values), col
+            elif pandas.isna(dirty):
+                assert any(isinstance(value, float) and pandas.isna(value) for value in values), col
+            else:
+                assert dirty in values, (col, dirty)
+
@@ -0,0 +1,42 @@
+import numpy
+import pytest
+import scipy.sparse
+
+from source import wrangling_utils
+from source.synthetic import make_listings
+from source.text_features import feature_chunks, hash_features, read_features, write_features
+
+RAW = make_listings(3_000, seed=10, dirty=0.3)
+CHUNKS = [RAW.iloc[start:start + 400] for start in range(0, len(RAW), 400)]
+
+
+def _assert_same_csr(left: scipy.sparse.csr_matrix, right: scipy.sparse.csr_matrix) -> None:
+    assert left.shape == right.shape
+    for attribute in ('indptr', 'indices', 'data'):
+        numpy.testing.assert_array_equal(getattr(left, attribute), getattr(right, attribute))
+
+
+def test_chunks_match_one_frame():
+    cleaned, _ = wrangling_utils.clean(RAW, vectorized=True)
+    expected = hash_features(cleaned, n_features=2 ** 12)
+    assert expected.nnz
+    _assert_same_csr(scipy.sparse.vstack(list(feature_chunks(CHUNKS, n_features=2 ** 12)), format='csr'), expected)
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_workers_match_one_process(workers):
+    single = list(feature_chunks(CHUNKS, workers=1, alternate_sign=False, norm=None))
+    parallel = list(feature_chunks(iter(CHUNKS), workers=workers, alternate_sign=False, norm=None))
+    assert len(parallel) == len(single) == len(CHUNKS)
+    for found, expected in zip(parallel, single):
+        _assert_same_csr(found, expected)
+
+
+def test_write_and_read(tmp_path):
+    chunks = list(feature_chunks(CHUNKS, n_features=2 ** 12))
+    assert write_features(chunks, tmp_path / 'features') == len(RAW)
+    _assert_same_csr(read_features(tmp_path / 'features'), scipy.sparse.vstack(chunks, format='csr'))
+    with pytest.raises(FileExistsError):
+        write_features(chunks, tmp_path / 'features')
+    with pytest.raises(FileNotFoundError):
+        read_features(tmp_path / 'nothing')
@@ -0,0 +1,176 @@
+import numpy
+import pandas
+import pytest
+
+from source import wrangling_utils
+from source.native_clean import NATIVE_COLUMNS, clean_native_frame
+from source.normalizer_cache import NormalizerCache
+from source.synthetic import make_listings
+
+
+def _assert_same_clean(raw: pandas.DataFrame, **kwargs) -> None:
+    expected, expected_ledger = wrangling_utils.clean(raw)
+    cleaned, ledger = wrangling_utils.clean(raw, **kwargs)
+    pandas.testing.assert_frame_equal(cleaned, expected)
+    pandas.testing.assert_frame_equal(ledger.to_frame(), expected_ledger.to_frame())
+
+
+@pytest.mark.parametrize('city', [numpy.nan, None, '', 'www.example.com', '40.7, -73.9', 'Texas'])
+def test_vectorized_city_with_no_names_left(city):
+    # every distinct city is missing or rejected, leaving nothing to normalize
+    raw = make_listings(20, seed=1)
+    raw['cityname'] = city
+    _assert_same_clean(raw, vectorized=True)
+    assert wrangling_utils.clean(raw, vectorized=True)[0]['cityname'].isna().all()
+
+
+DIRTY = make_listings(2_000, seed=5, dirty=0.3)
+
+
+def _edge_frames() -> dict[str, pandas.DataFrame]:
+    template = DIRTY.iloc[:50].reset_index(drop=True)
+    frames = {
+        'all_nan': pandas.DataFrame(numpy.nan, index=template.index, columns=template.columns),
+        'all_none': pandas.DataFrame(None, index=template.index, columns=template.columns, dtype=object),
+        'all_rejected': pandas.DataFrame('www.example.com ###', index=template.index, columns=template.columns),
+    }
+    # clean_time passes str(x) through, which cast() can't read back as a number; the timestamps stay real
+    for frame in frames.values():
+        frame['time'] = template['time']
+    return {'empty': template.iloc[:0], **frames}
+
+
+ENGINES = {
+    'vectorized': {'vectorized': True},
+    'row_wise_2_workers': {'workers': 2, 'chunksize': 333},
+    'vectorized_2_workers': {'vectorized': True, 'workers': 2, 'chunksize': 333},
+    'vectorized_3_workers': {'vectorized': True, 'workers': 3},
+}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_engines_match_row_wise(engine):
+    _assert_same_clean(DIRTY, **ENGINES[engine])
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('frame', ['empty', 'all_nan', 'all_none', 'all_rejected'])
+def test_engines_match_row_wise_on_edge_frames(engine, frame):
+    _assert_same_clean(_edge_frames()[frame], **ENGINES[engine])
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_workers_with_rejections_first_in_later_chunks(vectorized):
+    # columns and reasons come up in other orders in the chunks than over the whole frame
+    raw = make_listings(1_000, seed=7, dirty=0)
+    raw.loc[600:, 'latitude'] = 95.0
+    raw.loc[800:, 'price'] = 'Monthly'
+    raw.loc[900:, 'category'] = 'housing/rent/2'
+    _assert_same_clean(raw, vectorized=vectorized, workers=2, chunksize=250)
+    counts = wrangling_utils.clean(raw, vectorized=vectorized, workers=2, chunksize=250)[1].counts()
+    assert counts['column_name'].tolist() == ['category', 'price', 'cityname', 'state', 'latitude']
+
+
+@pytest.mark.parametrize('value', [numpy.nan, None])
+@pytest.mark.parametrize('col', DIRTY.columns)
+def test_vectorized_on_a_column_with_no_values(col, value):
+    raw = DIRTY.iloc[:50].copy()
+    raw[col] = pandas.Series([value] * len(raw), index=raw.index, dtype=object)
+    _assert_same_clean(raw, vectorized=True)
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_column_projection_matches_whole_clean(vectorized):
+    columns = ['price', 'cityname', 'state', 'amenities']
+    expected, expected_ledger = wrangling_utils.clean(DIRTY)
+    cleaned, ledger = wrangling_utils.clean(DIRTY[columns], vectorized=vectorized, columns=columns)
+    assert sorted(cleaned.columns) == sorted(columns)
+    pandas.testing.assert_frame_equal(cleaned, expected[cleaned.columns])
+
+    def ordered(rejections: pandas.DataFrame) -> pandas.DataFrame:
+        rejections = rejections[rejections['column_name'].isin(columns)].astype(object)
+        return rejections.sort_values(list(rejections.columns[:2])).reset_index(drop=True)
+
+    pandas.testing.assert_frame_equal(ordered(ledger.to_frame()), ordered(expected_ledger.to_frame()))
+
+
+@pytest.mark.parametrize('frame', [None, 'empty', 'all_nan', 'all_none', 'all_rejected'])
+def test_native_matches_cast_clean(frame):
+    raw = DIRTY if frame is None else _edge_frames()[frame]
+    expected = wrangling_utils.cast(wrangling_utils.clean(raw, columns=NATIVE_COLUMNS)[0])
+    pandas.testing.assert_frame_equal(clean_native_frame(raw), expected)
+
+
+def test_compact_cast_keeps_the_values():
+    cleaned, _ = wrangling_utils.clean(DIRTY, vectorized=True)
+    expected = wrangling_utils.cast(cleaned)
+    compact = wrangling_utils.cast(cleaned, compact=True)
+    assert list(compact.columns) == list(expected.columns)
+
+    assert wrangling_utils.dtype_report(expected, compact).loc['total', 'ratio'] > 1
+    for col in expected.columns.drop('amenities'):
+        pandas.testing.assert_series_equal(compact[col].astype(expected[col].dtype), expected[col])
+
+    vocabulary = compact.attrs['amenities']
+    decoded = [None if pandas.isna(bits) else {name for i, name in enumerate(vocabulary) if int(bits) >> i & 1}
+               for bits in compact['amenities']]
+    assert decoded == [None if items is None else set(items) for items in cleaned['amenities']]
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_cast_without_copy_leaves_the_input_alone(compact):
+    cleaned, _ = wrangling_utils.clean(DIRTY.iloc[:200], vectorized=True)
+    before = cleaned.copy(deep=True)
+    casted = wrangling_utils.cast(cleaned, copy=False, compact=compact)
+    casted.loc[casted.index[0], ['id', 'price', 'cityname', 'fee']] = pandas.NA
+    pandas.testing.assert_frame_equal(cleaned, before)
+
+
+MEMOIZED = list(wrangling_utils.NORMALIZER_CACHES)
+
+
+@pytest.mark.parametrize('maxsize', [100_000, 3])
+def test_memoized_cleaners_match_unmemoized(monkeypatch, maxsize):
+    raw = DIRTY[MEMOIZED]
+    with monkeypatch.context() as patch:
+        patch.setattr(wrangling_utils, 'NORMALIZER_CACHES', {})
+        expected, expected_ledger = wrangling_utils.clean(raw, columns=MEMOIZED)
+
+    caches = {col: NormalizerCache(maxsize) for col in MEMOIZED}
+    monkeypatch.setattr(wrangling_utils, 'NORMALIZER_CACHES', caches)
+    # the second run answers from the cache what fits in it
+    for _ in range(2):
+        cleaned, ledger = wrangling_utils.clean(raw, columns=MEMOIZED)
+        pandas.testing.assert_frame_equal(cleaned, expected)
+        pandas.testing.assert_frame_equal(ledger.to_frame(), expected_ledger.to_frame())
+
+    for col, cache in caches.items():
+        distinct = raw[col].map(lambda x: None if x is None else str(x)).nunique(dropna=False)
+        assert cache.hits + cache.misses == 2 * len(raw)
+        assert len(cache) == min(maxsize, distinct)
+        if maxsize >= distinct:
+            assert cache.misses == distinct
+    # a cached list of amenities is copied for every row it is returned to
+    lists = cleaned['amenities'].dropna()
+    repeated = lists[lists.map(tuple).duplicated(keep=False)]
+    assert len({id(items) for items in repeated}) == len(repeated) > 1
+
+
+def test_normalizer_cache_counts_and_evicts():
+    cache = NormalizerCache(maxsize=2)
+    cache.put('a', ('A', None))
+    cache.put('b', ('B', None))
+    assert cache.get('a') == ('A', None)
+    cache.put('c', ('C', None))
+    # b was the least recently used
+    assert cache.get('b') is None and cache.get('c') == ('C', None) and len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 1) and cache.hit_rate == pytest.approx(2 / 3)
+    cache.count(hits=5, misses=2)
+    assert (cache.hits, cache.misses) == (7, 3)
+
+    cache.clear()
+    assert (len(cache), cache.hits, cache.misses, cache.hit_rate) == (0, 0, 0, 0.0)
+
+    disabled = NormalizerCache(maxsize=0)
+    disabled.put('a', ('A', None))
+    assert disabled.get('a') is None and len(disabled) == 0 and disabled.misses == 1